@@ -0,0 +1,72 @@
+"""
+Compares round timings of concurrent games with and without pinning every game to cores of its own.
+
+Runs the same games twice with the same concurrency, the count of core sets that fit on the available cores:
+once free to migrate between all cores, once through a CorePool. Prints mean, standard deviation and
+percentiles of the round durations of each run. Pinning should narrow the spread on a machine with enough cores.
+
+Usage: python benchmarks/affinity_bench.py [--games 32] [--rounds 200] [--coresPerMatch 3]
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from core.logger import set_console_level  # noqa: E402
+from core.placement import CorePool, available_cores  # noqa: E402
+from core.results_store import percentile, round_durations  # noqa: E402
+from core.runtime import JudgerRuntime  # noqa: E402
+from leak_check import synthetic_spec  # noqa: E402
+
+
+async def play(output: Path, games: int, rounds: int, concurrency: int, cores: Optional[CorePool]) -> List[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    durations: List[float] = []
+
+    async def game(runtime: JudgerRuntime, index: int) -> None:
+        async with semaphore:
+            spec = synthetic_spec(f"g{index}", output, rounds)
+            if cores is None:
+                summary = await runtime.run(spec)
+            else:
+                async with cores.slot() as placement:
+                    summary = await runtime.run(spec, cpu_affinity=placement)
+            durations.extend(duration for _, duration in round_durations(summary))
+
+    async with JudgerRuntime() as runtime:
+        await asyncio.gather(*(game(runtime, index) for index in range(games)))
+    return durations
+
+
+def report(name: str, durations: List[float]) -> None:
+    values = sorted(1000 * d for d in durations)
+    print(f"{name:<10}{len(values):>8}{statistics.mean(values):>10.3f}{statistics.pstdev(values):>10.3f}"
+          f"{percentile(values, 50):>10.3f}{percentile(values, 90):>10.3f}{percentile(values, 99):>10.3f}"
+          f"{values[-1]:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--coresPerMatch", type=int, default=3, help="The logic and two AIs by default.")
+    args = parser.parse_args()
+    set_console_level(logging.CRITICAL)
+    per_match = min(args.coresPerMatch, len(available_cores()))
+    concurrency = CorePool(per_match).capacity
+    print(f"{len(available_cores())} cores, {per_match} per game, {concurrency} games at a time")
+    print(f"{'':<10}{'Rounds':>8}{'Mean':>10}{'Stdev':>10}{'P50':>10}{'P90':>10}{'P99':>10}{'Max':>10}   (ms)")
+    with tempfile.TemporaryDirectory() as output:
+        report("free", asyncio.run(play(Path(output) / "free", args.games, args.rounds, concurrency, None)))
+        report("pinned", asyncio.run(play(Path(output) / "pinned", args.games, args.rounds, concurrency,
+                                          CorePool(per_match))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Runs a coordinator and several worker processes on this host and checks that every match is finished,
+including those of a worker that is killed while it is running matches.
+
+Usage: python benchmarks/cluster_check.py [--workers 3] [--matches 12] [--rounds 300]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+import tempfile
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from cluster.coordinator import Coordinator  # noqa: E402
+from core.logger import set_console_level  # noqa: E402
+from core.summary import JudgeState  # noqa: E402
+from leak_check import synthetic_spec  # noqa: E402
+
+
+async def check(workers: int, matches: int, rounds: int, directory: Path) -> bool:
+    env = dict(os.environ, PYTHONPATH=str(SRC))
+    async with Coordinator("localhost", 0, heartbeat_timeout=10, token="cluster-check") as coordinator:
+        processes = [
+            await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "cluster", f"localhost:{coordinator.port}", "--dir",
+                str(directory / f"worker{i}"), "--slots", "2", "--name", f"worker{i}", "--noReconnect",
+                "--token", "cluster-check", env=env)
+            for i in range(workers)
+        ]
+        specs = [synthetic_spec(f"m{i}", directory / "results", rounds) for i in range(matches)]
+        tasks = [asyncio.create_task(coordinator.run(spec)) for spec in specs]
+
+        # Kill a worker as soon as it is busy
+        victim = None
+        while victim is None:
+            await asyncio.sleep(0.05)
+            victim = next((s for s in coordinator.sessions if s.name == "worker0" and len(s.jobs) > 0), None)
+        print(f"Killing worker0 while it runs {len(victim.jobs)} matches")
+        processes[0].send_signal(signal.SIGKILL)
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    for process in processes:
+        await process.wait()
+
+    ok = True
+    for spec, result in zip(specs, results):
+        output = Path(spec.output)
+        if isinstance(result, BaseException):
+            print(f"{spec.match_id}: {result!r}")
+            ok = False
+        elif result.final_state != JudgeState.GAME_OVER or not (output / "logic_stderr.txt").exists():
+            print(f"{spec.match_id}: {result.final_state.name}, artifacts {sorted(os.listdir(output))}")
+            ok = False
+    print(f"{sum(not isinstance(r, BaseException) for r in results)}/{matches} matches finished")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--matches", type=int, default=12)
+    parser.add_argument("--rounds", type=int, default=300)
+    args = parser.parse_args()
+    set_console_level(logging.WARNING)
+    with tempfile.TemporaryDirectory() as directory:
+        ok = asyncio.run(check(args.workers, args.matches, args.rounds, Path(directory)))
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Cost of decoding logic frames (size, target, payload) with StreamReader.readexactly() against FrameStream.
+
+A writer task sends --frames frames of --size bytes through a socket pair, the reader decodes them and
+counts the payload bytes. Reports frames per second and the awaits spent on reading.
+
+Usage: python benchmarks/framing_bench.py [--frames 200000] [--size 64]
+"""
+import argparse
+import asyncio
+import socket
+import struct
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from core.framing import FrameStream, LOGIC_HEADER  # noqa: E402
+from core.utils import bytes2int  # noqa: E402
+
+
+async def send_frames(sock: socket.socket, frames: int, size: int) -> None:
+    _, writer = await asyncio.open_connection(sock=sock)
+    frame = struct.pack(">ii", size, -1) + b"x" * size
+    batch = frame * 256
+    for _ in range(frames // 256):
+        writer.write(batch)
+        await writer.drain()
+    writer.close()
+
+
+async def read_stream_reader(sock: socket.socket) -> (int, int):
+    reader, _ = await asyncio.open_connection(sock=sock)
+    total = awaits = 0
+    try:
+        while True:
+            size = bytes2int(await reader.readexactly(4))
+            bytes2int(await reader.readexactly(4))
+            total += len(await reader.readexactly(size))
+            awaits += 3
+    except asyncio.IncompleteReadError:
+        return total, awaits
+
+
+async def read_frame_stream(sock: socket.socket) -> (int, int):
+    _, stream = await asyncio.get_running_loop().connect_accepted_socket(lambda: FrameStream(LOGIC_HEADER), sock)
+    total = awaits = 0
+    try:
+        while True:
+            frames = await stream.read_frames()
+            awaits += 1
+            for _, data in frames:
+                total += len(data)
+    except asyncio.IncompleteReadError:
+        return total, awaits
+
+
+async def measure(read, frames: int, size: int) -> (float, int, int):
+    source, sink = socket.socketpair()
+    begin = time.perf_counter()
+    _, (total, awaits) = await asyncio.gather(send_frames(source, frames, size), read(sink))
+    return time.perf_counter() - begin, total, awaits
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=200000)
+    parser.add_argument("--size", type=int, default=64)
+    args = parser.parse_args()
+    frames = args.frames // 256 * 256
+    print(f"{frames} frames of {args.size} bytes")
+    for name, read in (("StreamReader", read_stream_reader), ("FrameStream", read_frame_stream)):
+        seconds, total, awaits = asyncio.run(measure(read, frames, args.size))
+        assert total == frames * args.size
+        print(f"{name:<14}{frames / seconds:>12.0f} frames/s{awaits:>10} awaits")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+AI for the soak check that misbehaves at random. Usage: fuzz_ai.py SEED
+Every line it receives is answered with one of: a valid reply, a frame above the output limit, a negative size,
+random bytes, a truncated frame followed by exit, an exit without answer, or no answer at all.
+"""
+import os
+import random
+import struct
+import sys
+import time
+
+rng = random.Random(int(sys.argv[1]))
+out = sys.stdout.buffer
+
+
+def send(data: bytes) -> None:
+    out.write(data)
+    out.flush()
+
+
+for line in sys.stdin.buffer:
+    action = rng.choices(["reply", "oversize", "negative", "garbage", "truncate", "exit", "hang"],
+                         [80, 4, 3, 4, 3, 3, 3])[0]
+    if action == "reply":
+        reply = b"ok " + line.strip()[:rng.randrange(1, 64)]
+        send(struct.pack(">i", len(reply)) + reply)
+    elif action == "oversize":
+        send(struct.pack(">i", rng.choice([4096, 1 << 20, (1 << 31) - 1])) + os.urandom(rng.randrange(64)))
+    elif action == "negative":
+        send(struct.pack(">i", -rng.randrange(1, 1 << 31)))
+    elif action == "garbage":
+        send(os.urandom(rng.randrange(1, 64)))
+    elif action == "truncate":
+        send(struct.pack(">i", 100) + b"x" * rng.randrange(100))
+        os._exit(1)
+    elif action == "exit":
+        os._exit(rng.choice([0, 1, 139]))
+    else:
+        time.sleep(3600)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Game logic for the soak check, speaking protocol v1 and misbehaving at random.
+config["seed"] seeds the behaviour, config["rounds"] bounds the game. Besides valid rounds it sends malformed JSON,
+messages with missing keys or mismatched player and content counts, frames to unknown targets, direct frames to an
+AI, and may exit or crash before the end of the game. It stops at the first AI error.
+"""
+import json
+import os
+import random
+import struct
+import sys
+
+stdin = sys.stdin.buffer
+stdout = sys.stdout.buffer
+
+
+def read() -> dict:
+    header = stdin.read(4)
+    if len(header) < 4:
+        sys.exit(0)
+    return json.loads(stdin.read(struct.unpack(">i", header)[0]))
+
+
+def send_raw(data: bytes, target: int = -1) -> None:
+    stdout.write(struct.pack(">ii", len(data), target) + data)
+    stdout.flush()
+
+
+def send(message: dict) -> None:
+    send_raw(json.dumps(message).encode("utf-8"))
+
+
+def main():
+    init = read()
+    players = init["player_num"]
+    rng = random.Random(init["config"].get("seed", 0))
+    rounds = int(init["config"].get("rounds", 20))
+    send({"state": 0, "time": 3, "length": 2048})
+    score = [0] * players
+    for state in range(1, rounds + 1):
+        action = rng.choices(["round", "malformed", "missing", "mismatch", "target", "direct", "exit", "crash"],
+                             [85, 3, 2, 2, 2, 2, 2, 2])[0]
+        if action == "malformed":
+            send_raw(os.urandom(rng.randrange(1, 32)))
+        elif action == "missing":
+            send({"state": state, "player": [0]})
+        elif action == "mismatch":
+            send({"state": state, "listen": [], "player": [0, 1], "content": ["a"]})
+        elif action == "target":
+            send_raw(b"lost", rng.choice([players, 1000, -2]))
+        elif action == "direct":
+            send_raw(b"direct\n", rng.randrange(players))
+        elif action == "exit":
+            sys.exit(0)
+        elif action == "crash":
+            os._exit(3)
+        current = state % players
+        send({"state": state, "listen": [current], "player": list(range(players)),
+              "content": ["x" * rng.randrange(1, 256) + "\n" for _ in range(players)]})
+        reply = read()
+        if reply["player"] == -1:
+            break
+        score[current] += 1
+    send({"state": -1, "end_info": json.dumps({str(i): s for i, s in enumerate(score)})})
+
+
+if __name__ == "__main__":
+    main()
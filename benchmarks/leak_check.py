@@ -0,0 +1,102 @@
+"""
+Checks that running many games through JudgerRuntime leaks nothing.
+
+Runs a few warm-up games, records threads, logging handlers, open file descriptors and asyncio tasks,
+runs N more games (some of them concurrently) and fails when any of these grew.
+
+Usage: python benchmarks/leak_check.py [--games 50] [--concurrency 4]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from core.logger import LOG, set_console_level  # noqa: E402
+from core.match import MatchSpec  # noqa: E402
+from core.runtime import JudgerRuntime  # noqa: E402
+from core.summary import JudgeState  # noqa: E402
+
+HERE = Path(__file__).resolve().parent
+
+
+def synthetic_spec(match_id: str, output: Path, rounds: int = 10) -> MatchSpec:
+    ai = f"{sys.executable} {HERE / 'synthetic_ai.py'}"
+    return MatchSpec(match_id, str(HERE / "synthetic_logic.py"), 2, [ai, ai], str(output / match_id),
+                     {"rounds": rounds})
+
+
+def open_fds() -> int:
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return -1
+
+
+def snapshot(runtime: JudgerRuntime) -> dict:
+    # The shared pool starts its threads lazily, they are bounded by max_workers and checked separately
+    own = [t for t in threading.enumerate() if not t.name.startswith(runtime.name)]
+    return {
+        "threads": len(own),
+        "handlers": len(LOG.handlers) + len(logging.getLogger().handlers),
+        "loggers": len(logging.Logger.manager.loggerDict),
+        "fds": open_fds(),
+        "tasks": len(asyncio.all_tasks())
+    }
+
+
+async def run_games(runtime: JudgerRuntime, output: Path, prefix: str, games: int, concurrency: int) -> int:
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def play(index: int):
+        nonlocal failures
+        async with semaphore:
+            summary = await runtime.run(synthetic_spec(f"{prefix}{index}", output))
+            if summary.final_state != JudgeState.GAME_OVER:
+                failures += 1
+
+    await asyncio.gather(*(play(i) for i in range(games)))
+    return failures
+
+
+async def check(games: int, concurrency: int, output: Path) -> bool:
+    max_workers = 4
+    async with JudgerRuntime(max_workers) as runtime:
+        await run_games(runtime, output, "warmup", concurrency, concurrency)
+        before = snapshot(runtime)
+        failures = await run_games(runtime, output, "game", games, concurrency)
+        after_games = snapshot(runtime)
+        pool_threads = threading.active_count() - after_games["threads"]
+    after_close = snapshot(runtime)
+    ok = failures == 0 and pool_threads <= max_workers and threading.active_count() == after_close["threads"]
+    print(f"{games} games, {failures} not finished normally")
+    print(f"    pool: {pool_threads} threads of at most {max_workers}, "
+          f"{threading.active_count() - after_close['threads']} left after close")
+    for key in before:
+        grew = after_games[key] > before[key]
+        ok = ok and not grew
+        print(f"{key:>8}: {before[key]} -> {after_games[key]} (after close {after_close[key]})"
+              f"{'  LEAK' if grew else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    set_console_level(logging.WARNING)
+    with tempfile.TemporaryDirectory() as output:
+        ok = asyncio.run(check(args.games, args.concurrency, Path(output)))
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
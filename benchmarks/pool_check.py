@@ -0,0 +1,103 @@
+"""
+Compares how long matches take when their AIs are launched by a plain adapter and when they are attached from a
+warm adapter pool (python -m adapter --pool). The synthetic AI sleeps at startup to stand for a slow AI.
+Matches are hosted on a MatchServer and run one after another, every one of them must finish normally.
+
+Usage: python benchmarks/pool_check.py [--matches 5] [--startup 0.5]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from adapter.pool import request_attach  # noqa: E402
+from core.judger import Judger  # noqa: E402
+from core.logger import set_console_level  # noqa: E402
+from core.match_server import MatchServer  # noqa: E402
+from core.summary import JudgeState  # noqa: E402
+from leak_check import synthetic_spec  # noqa: E402
+
+HERE = Path(__file__).resolve().parent
+ENV = dict(os.environ, PYTHONPATH=str(SRC))
+
+
+async def play(server: MatchServer, output: Path, match_id: str, attach) -> float:
+    spec = synthetic_spec(match_id, output)
+    spec.ai_commands = []
+    Path(spec.output).mkdir(parents=True)
+    judger = Judger(**dict(spec.to_judger_config(), listen=False))
+    match = server.open_match(judger, match_id)
+    begin = time.perf_counter()
+    task = asyncio.create_task(server.run_match(match))
+    adapters = [await attach(match_id, token) for token in match.tokens]
+    summary = await task
+    elapsed = time.perf_counter() - begin
+    for adapter in adapters:
+        if adapter is not None:
+            await adapter.wait()
+    if summary.final_state != JudgeState.GAME_OVER:
+        raise RuntimeError(f"{match_id} ended with {summary.final_state.name}")
+    return elapsed
+
+
+async def check(matches: int, startup: float, output: Path) -> None:
+    ai = f"{sys.executable} {HERE / 'synthetic_ai.py'} {startup}"
+    server = MatchServer()
+    await server.start()
+    try:
+        async def cold(match_id: str, token: str):
+            return await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "adapter", "localhost", str(server.port), ai, "--match", match_id,
+                "--token", token, env=ENV, stdout=asyncio.subprocess.DEVNULL)
+
+        cold_times = [await play(server, output, f"cold{i}", cold) for i in range(matches)]
+
+        pool = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "adapter", "localhost", str(server.port), ai, "--pool", "2",
+            env=ENV, stdout=asyncio.subprocess.PIPE)
+        line = (await pool.stdout.readline()).decode()
+        pool_port = int(line.rsplit(":", 1)[1])
+        # The pool keeps logging to stdout
+        drain = asyncio.ensure_future(pool.stdout.read())
+        await asyncio.sleep(startup + 0.5)
+
+        async def warm(match_id: str, token: str):
+            await request_attach("localhost", pool_port, match=match_id, token=token)
+
+        try:
+            warm_times = []
+            for i in range(matches):
+                warm_times.append(await play(server, output, f"warm{i}", warm))
+                # Give the pool time to replenish, as between matches of a real tournament
+                await asyncio.sleep(startup + 0.5)
+        finally:
+            pool.terminate()
+            await pool.wait()
+            await drain
+    finally:
+        await server.close()
+    print(f"cold adapter: {sum(cold_times) / matches:.3f}s per match")
+    print(f"warm pool:    {sum(warm_times) / matches:.3f}s per match")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matches", type=int, default=5)
+    parser.add_argument("--startup", type=float, default=0.5)
+    args = parser.parse_args()
+    set_console_level(logging.WARNING)
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(check(args.matches, args.startup, Path(directory)))
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
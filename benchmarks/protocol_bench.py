@@ -0,0 +1,78 @@
+"""
+Per-round cost of the judger side of each protocol version.
+
+A round is: parse one round information package from the logic, encode the content for every player,
+and build one AI reply package for the logic.
+
+Usage: python benchmarks/protocol_bench.py [--players 8] [--size 4096] [--rounds 20000]
+"""
+import argparse
+import json
+import struct
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from core.protocol import Protocol, ProtocolV2  # noqa: E402
+
+
+def v1_round_package(players: int, content: str, broadcast: bool) -> bytes:
+    return json.dumps({
+        "state": 1,
+        "listen": [0],
+        "player": list(range(players)),
+        "content": content if broadcast else [content] * players
+    }).encode("utf-8")
+
+
+def v2_round_package(players: int, content: bytes, broadcast: bool) -> bytes:
+    header = struct.pack(">BiHiH", 2 if broadcast else 1, 1, 1, 0, players)
+    if broadcast:
+        return header + struct.pack(">%di" % players, *range(players)) + struct.pack(">I", len(content)) + content
+    return header + b"".join(struct.pack(">iI", i, len(content)) + content for i in range(players))
+
+
+def judge_round(protocol, package: bytes, reply: bytes) -> int:
+    message = protocol.from_logic_data(package)
+    encoded = {}
+    total = 0
+    for content in message.content:
+        data = encoded.get(content)
+        if data is None:
+            data = encoded[content] = content.encode("utf-8") if isinstance(content, str) else content
+        total += len(data)
+    return total + len(protocol.to_logic_ai_normal_message(0, reply, 12.5))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, default=8)
+    parser.add_argument("--size", type=int, default=4096, help="Content size in bytes")
+    parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+
+    # Game states are usually JSON themselves, which v1 has to escape again
+    state = json.dumps({"map": "x" * max(args.size - 12, 0)})[:args.size]
+    reply = b'{"move": [1, 2]}'
+    cases = [
+        ("v1 per-player", Protocol, v1_round_package(args.players, state, False)),
+        ("v1 broadcast", Protocol, v1_round_package(args.players, state, True)),
+        ("v2 per-player", ProtocolV2, v2_round_package(args.players, state.encode("utf-8"), False)),
+        ("v2 broadcast", ProtocolV2, v2_round_package(args.players, state.encode("utf-8"), True)),
+    ]
+
+    print(f"players={args.players} content={args.size}B rounds={args.rounds}")
+    print(f"{'case':<16}{'us/round':>10}{'logic->judger B':>18}{'judger->logic B':>18}")
+    baseline = None
+    for name, protocol, package in cases:
+        seconds = timeit.timeit(lambda: judge_round(protocol, package, reply), number=args.rounds)
+        per_round = seconds / args.rounds * 1e6
+        baseline = baseline or per_round
+        reply_size = len(protocol.to_logic_ai_normal_message(0, reply, 12.5))
+        print(f"{name:<16}{per_round:>10.2f}{len(package):>18}{reply_size:>18}   x{baseline / per_round:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark of the results store: fill a database with synthetic matches through concurrent add() calls,
+then time every query of judger_results. Fails when a query takes longer than --budget seconds.
+
+Usage: python benchmarks/results_bench.py [--matches 100000] [--rounds 40] [--budget 5]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from core.results_store import MatchRecord, ResultsStore  # noqa: E402
+from core.summary import JudgeSummary, ProcessUsage  # noqa: E402
+
+AIS = [f"ai-{i}" for i in range(8)]
+
+
+def synthetic_summary(rng: random.Random, rounds: int) -> JudgeSummary:
+    summary = JudgeSummary()
+    summary.start_time = now = rng.uniform(1.6e9, 1.7e9)
+    summary.event_list[0].time = now
+    for seat in range(2):
+        summary.appendAiConnected(seat)
+    summary.appendLogicBooted()
+    elapsed = 0
+    for state in range(rounds):
+        summary.appendNewRound(state, elapsed)
+        elapsed = rng.expovariate(50)
+        if rng.random() < 0.002:
+            (summary.appendAiRe if rng.random() < 0.5 else summary.appendAiTle)(state, rng.randrange(2))
+            break
+    if rng.random() < 0.01:
+        summary.appendLogicCrashed()
+    else:
+        summary.appendGameOver([rng.randrange(100), rng.randrange(100)])
+    # Spread the synthetic timeline over the rounds instead of the time it took to build it
+    for index, event in enumerate(summary.event_list):
+        event.time = now + index * 0.02
+    summary.total_time = summary.event_list[-1].time - now
+    summary.process_usage = [ProcessUsage(f"ai{seat}", 0, rng.randrange(10000, 50000), rng.random(), 0)
+                             for seat in range(2)]
+    return summary
+
+
+async def fill(store: ResultsStore, matches: int, rounds: int, games: int) -> None:
+    rng = random.Random(1)
+    summaries = [synthetic_summary(rng, rounds) for _ in range(256)]
+
+    async def game(index: int) -> None:
+        for number in range(index, matches, games):
+            await store.add(MatchRecord(f"m{number}", rng.sample(AIS, 2), summaries[number % len(summaries)],
+                                        f"tournament-{number % 4}", "logic"))
+            # Other games get their turn, as if this one was running
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(game(index) for index in range(games)))
+    await store.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matches", type=int, default=100000)
+    parser.add_argument("--rounds", type=int, default=40)
+    parser.add_argument("--games", type=int, default=64, help="Concurrent games adding their records.")
+    parser.add_argument("--budget", type=float, default=5, help="Seconds a query may take.")
+    args = parser.parse_args()
+    ok = True
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "results.db"
+        store = ResultsStore(path)
+        begin = time.perf_counter()
+        asyncio.run(fill(store, args.matches, args.rounds, args.games))
+        elapsed = time.perf_counter() - begin
+        print(f"Stored {args.matches} matches in {elapsed:.1f}s ({args.matches / elapsed:.0f}/s), "
+              f"{path.stat().st_size / 1024 / 1024:.0f} MiB")
+        store.close()
+
+        store = ResultsStore(path)
+        queries = [
+            ("ai", lambda: store.ai_stats()),
+            ("ai --source", lambda: store.ai_stats("tournament-1")),
+            ("scores", lambda: store.scores()),
+            ("rounds", lambda: store.round_stats()),
+            ("rounds --source", lambda: store.round_stats("tournament-1")),
+            ("timeline", lambda: store.timeline(f"m{args.matches // 2}")),
+        ]
+        for name, query in queries:
+            begin = time.perf_counter()
+            query()
+            elapsed = time.perf_counter() - begin
+            over = elapsed > args.budget
+            ok = ok and not over
+            print(f"{name:<20}{elapsed:8.3f}s{'  OVER BUDGET' if over else ''}")
+        store.close()
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
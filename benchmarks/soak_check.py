@@ -0,0 +1,253 @@
+"""
+Soak and fuzz check of the judger core.
+
+Runs games in epochs for --duration seconds. Logic and AIs misbehave at random (fuzz_logic.py, fuzz_ai.py):
+malformed frames, sizes above the output limit or negative, garbage, truncated frames, crashes, exits and hangs.
+Some games are played by in-process TCP clients through a MatchServer instead, which additionally send broken
+handshakes and drop their connections. Games that hang are cancelled after --gameTimeout seconds.
+
+After every epoch, with no game running, the check records the memory traced by tracemalloc, RSS, asyncio tasks,
+open file descriptors and threads other than executor workers. It fails when tasks, descriptors or threads are
+above their level after the warm-up epochs, or when traced memory keeps growing: the median of the last third of
+the samples is more than --memoryTolerance MiB above the median of the first third. The biggest allocation growths
+are then listed.
+
+Usage: python benchmarks/soak_check.py [--duration 60] [--games 40] [--concurrency 8] [--seed 1]
+       python benchmarks/soak_check.py --duration 14400    # a few hours
+"""
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from core.judger import Judger  # noqa: E402
+from core.logger import set_console_level  # noqa: E402
+from core.match import MatchSpec  # noqa: E402
+from core.match_server import MatchServer  # noqa: E402
+from core.protocol import handshake_frame  # noqa: E402
+from core.runtime import JudgerRuntime  # noqa: E402
+from core.utils import int2bytes  # noqa: E402
+from leak_check import open_fds  # noqa: E402
+
+HERE = Path(__file__).resolve().parent
+WARMUP_EPOCHS = 2
+
+
+def rss_kib() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+    except (OSError, StopIteration):
+        return -1
+
+
+def stray_threads(pools) -> int:
+    """
+    Threads outside the executors, which grow lazily up to their size and are expected to stay.
+    """
+    return sum(1 for thread in threading.enumerate() if not thread.name.startswith(pools))
+
+
+def sample(pools) -> Dict[str, int]:
+    gc.collect()
+    return {
+        "traced": tracemalloc.get_traced_memory()[0],
+        "rss": rss_kib(),
+        "tasks": len(asyncio.all_tasks()),
+        "fds": open_fds(),
+        "threads": stray_threads(pools),
+    }
+
+
+async def fuzz_client(port: int, match_id: str, token: str, rng: random.Random) -> None:
+    """
+    A TCP AI that may break the handshake, then answers like fuzz_ai.py.
+    """
+    reader, writer = await asyncio.open_connection("localhost", port)
+    try:
+        handshake = rng.choices(["valid", "size", "json", "token", "silent", "drop"], [85, 3, 3, 3, 3, 3])[0]
+        if handshake == "valid":
+            writer.write(handshake_frame(match_id, token))
+        elif handshake == "size":
+            writer.write(int2bytes(rng.choice([0, -1, 1 << 20])))
+        elif handshake == "json":
+            writer.write(int2bytes(5) + b"{nope")
+        elif handshake == "token":
+            writer.write(handshake_frame(match_id, "not-a-token"))
+        elif handshake == "drop":
+            return
+        answering = True
+        while True:
+            line = await reader.readline()
+            if len(line) == 0:
+                return
+            if not answering:
+                continue
+            action = rng.choices(["reply", "oversize", "negative", "garbage", "truncate", "close", "hang"],
+                                 [80, 4, 3, 4, 3, 3, 3])[0]
+            if action == "reply":
+                reply = b"ok " + line.strip()[:rng.randrange(1, 64)]
+                writer.write(int2bytes(len(reply)) + reply)
+            elif action == "oversize":
+                writer.write(int2bytes(rng.choice([4096, 1 << 20, (1 << 31) - 1])) + os.urandom(16))
+            elif action == "negative":
+                writer.write(int2bytes(-rng.randrange(1, 1 << 31)))
+            elif action == "garbage":
+                writer.write(os.urandom(rng.randrange(1, 64)))
+            elif action == "truncate":
+                writer.write(int2bytes(100) + b"x" * rng.randrange(100))
+                return
+            elif action == "close":
+                return
+            else:
+                answering = False
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+class Soak:
+    def __init__(self, runtime: JudgerRuntime, server: MatchServer, output: Path, seed: int, game_timeout: float):
+        self.runtime = runtime
+        self.server = server
+        self.output = output
+        self.rng = random.Random(seed)
+        self.game_timeout = game_timeout
+        self.outcomes: Dict[str, int] = {}
+        self.count = 0
+
+    def spec(self, tcp: bool) -> MatchSpec:
+        self.count += 1
+        match_id = f"g{self.count}"
+        ai = [f"{sys.executable} {HERE / 'fuzz_ai.py'} {self.rng.randrange(1 << 30)}" for _ in range(2)]
+        return MatchSpec(match_id, str(HERE / "fuzz_logic.py"), 2, [] if tcp else ai, str(self.output / match_id),
+                         {"seed": self.rng.randrange(1 << 30), "rounds": self.rng.randrange(1, 60)})
+
+    async def play_launched(self, spec: MatchSpec) -> str:
+        summary = await self.runtime.run(spec)
+        return summary.final_state.name
+
+    async def play_tcp(self, spec: MatchSpec) -> str:
+        Path(spec.output).mkdir(parents=True, exist_ok=True)
+        logger = self.runtime.match_logger(spec)
+        judger = Judger(**dict(spec.to_judger_config(), listen=False, executor=self.runtime.executor, logger=logger))
+        match = self.server.open_match(judger, spec.match_id)
+        clients = [asyncio.ensure_future(fuzz_client(self.server.port, spec.match_id, token,
+                                                     random.Random(self.rng.randrange(1 << 30))))
+                   for token in match.tokens]
+        try:
+            summary = await self.server.run_match(match)
+            return summary.final_state.name
+        finally:
+            for client in clients:
+                client.cancel()
+            await asyncio.gather(*clients, return_exceptions=True)
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+                handler.close()
+
+    async def play(self, semaphore: asyncio.Semaphore) -> None:
+        async with semaphore:
+            tcp = self.rng.random() < 0.3
+            spec = self.spec(tcp)
+            try:
+                coro = self.play_tcp(spec) if tcp else self.play_launched(spec)
+                outcome = await asyncio.wait_for(coro, self.game_timeout)
+            except asyncio.TimeoutError:
+                outcome = "TIMEOUT"
+            key = f"{'tcp' if tcp else 'launched'} {outcome}"
+            self.outcomes[key] = self.outcomes.get(key, 0) + 1
+            await asyncio.get_running_loop().run_in_executor(None, shutil.rmtree, spec.output, True)
+
+    async def epoch(self, games: int, concurrency: int) -> None:
+        semaphore = asyncio.Semaphore(concurrency)
+        await asyncio.gather(*(self.play(semaphore) for _ in range(games)))
+
+
+def evaluate(samples: List[Dict[str, int]], memory_tolerance: float) -> bool:
+    baseline = samples[WARMUP_EPOCHS - 1]
+    ok = True
+    for key in ("tasks", "fds", "threads"):
+        peak = max(s[key] for s in samples[WARMUP_EPOCHS:])
+        if peak > baseline[key]:
+            print(f"{key} grew from {baseline[key]} to {peak}")
+            ok = False
+    measured = samples[WARMUP_EPOCHS:]
+    third = max(len(measured) // 3, 1)
+    first = statistics.median(s["traced"] for s in measured[:third])
+    last = statistics.median(s["traced"] for s in measured[-third:])
+    growth = (last - first) / 1024 / 1024
+    print(f"traced memory: {first / 1024 / 1024:.2f} MiB -> {last / 1024 / 1024:.2f} MiB ({growth:+.2f} MiB), "
+          f"RSS {samples[WARMUP_EPOCHS - 1]['rss'] / 1024:.1f} MiB -> {samples[-1]['rss'] / 1024:.1f} MiB")
+    if growth > memory_tolerance:
+        ok = False
+    return ok
+
+
+async def soak(args, output: Path) -> bool:
+    tracemalloc.start(8)
+    samples = []
+    start_snapshot = None
+    async with JudgerRuntime(4) as runtime:
+        server = MatchServer(handshake_timeout=1, seat_timeout=3)
+        await server.start()
+        soak = Soak(runtime, server, output, args.seed, args.gameTimeout)
+        deadline = time.monotonic() + args.duration
+        epoch = 0
+        while epoch < WARMUP_EPOCHS + 3 or time.monotonic() < deadline:
+            begin = time.monotonic()
+            await soak.epoch(args.games, args.concurrency)
+            samples.append(sample((runtime.name, "asyncio_")))
+            if epoch == WARMUP_EPOCHS - 1:
+                start_snapshot = tracemalloc.take_snapshot()
+            s = samples[-1]
+            print(f"epoch {epoch:>4} {soak.count:>7} games {time.monotonic() - begin:6.1f}s  "
+                  f"traced {s['traced'] / 1024 / 1024:7.2f} MiB  rss {s['rss'] / 1024:7.1f} MiB  "
+                  f"tasks {s['tasks']}  fds {s['fds']}  threads {s['threads']}", flush=True)
+            epoch += 1
+        await server.close()
+    ok = evaluate(samples, args.memoryTolerance)
+    if not ok and start_snapshot is not None:
+        print("Biggest allocation growths:")
+        for stat in tracemalloc.take_snapshot().compare_to(start_snapshot, "traceback")[:8]:
+            print(f"  {stat.size_diff / 1024:+.1f} KiB, {stat.count_diff:+d} blocks")
+            for line in stat.traceback.format()[-6:]:
+                print(f"    {line}")
+    tracemalloc.stop()
+    print("Outcomes: " + ", ".join(f"{key} {count}" for key, count in sorted(soak.outcomes.items())))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=60, help="Seconds to run, at least 5 epochs are run.")
+    parser.add_argument("--games", type=int, default=40, help="Games per epoch.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--gameTimeout", type=float, default=8)
+    parser.add_argument("--memoryTolerance", type=float, default=1, help="Allowed traced memory growth in MiB.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    set_console_level(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as output:
+        ok = asyncio.run(soak(args, Path(output)))
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Startup cost of the command line entry points, with a regression budget.
+
+For every entry point the import time of its module is measured with -X importtime in fresh interpreters,
+on top of the standard modules any asyncio program loads anyway (PRELUDE), so the number is the cost added by
+this repository and whatever it pulls in. The best of --runs is compared with benchmarks/startup_budget.json.
+The run also fails when an entry point loads a module it must not load (GUI, or features only used on demand).
+The sources are byte-compiled first, like an installed package.
+
+Usage: python benchmarks/startup_bench.py [--runs 7] [--update]
+"""
+import argparse
+import compileall
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+SRC = HERE.parent / "src"
+BUDGET = HERE / "startup_budget.json"
+PRELUDE = "asyncio, argparse, logging, json, pathlib"
+ENTRY_POINTS = {
+    "judger_cli": "judger_cli.cli",
+    "adapter": "adapter.main",
+    "core": "core.match",
+}
+FORBIDDEN = ["PySide6", "gui", "tournament", "cluster", "multiprocessing", "gzip", "hashlib", "tempfile",
+             "sqlite3", "secrets", "core.postprocess", "core.result_cache", "core.spectator", "core.runtime"]
+# --update writes the measured cost times this factor, and at least this many milliseconds above it
+HEADROOM = 2
+MIN_HEADROOM = 5
+
+
+def run_python(code: str, *options: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=str(SRC))
+    return subprocess.run([sys.executable, *options, "-c", code], env=env, capture_output=True, text=True,
+                          check=True)
+
+
+def import_cost(module: str) -> float:
+    """
+    Cumulative import time of module in milliseconds, after the prelude.
+    """
+    stderr = run_python(f"import {PRELUDE}; import {module}", "-X", "importtime").stderr
+    for line in stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000
+    raise RuntimeError(f"{module} is not in the import time report")
+
+
+def loaded_modules(module: str) -> list:
+    code = f"import sys, json; import {module}; print(json.dumps(sorted(sys.modules)))"
+    return json.loads(run_python(code).stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--update", action="store_true", help="Write the budget from this measurement.")
+    args = parser.parse_args()
+    compileall.compile_dir(str(SRC), quiet=1)
+    budget = json.loads(BUDGET.read_text()) if BUDGET.exists() else {}
+
+    ok = True
+    measured = {}
+    for name, module in ENTRY_POINTS.items():
+        cost = min(import_cost(module) for _ in range(args.runs))
+        measured[name] = cost
+        limit = budget.get(name)
+        status = "" if limit is None else ("ok" if cost <= limit else "OVER BUDGET")
+        print(f"{name:<12}{cost:>8.1f} ms   budget {limit if limit is not None else '-':>6} ms   {status}")
+        if limit is not None and cost > limit:
+            ok = False
+        modules = loaded_modules(module)
+        leaked = [m for m in modules if any(m == f or m.startswith(f + ".") for f in FORBIDDEN)]
+        if len(leaked) > 0:
+            print(f"    loads {', '.join(leaked)}")
+            ok = False
+
+    if args.update:
+        BUDGET.write_text(json.dumps({name: round(max(cost * HEADROOM, cost + MIN_HEADROOM), 1)
+                                      for name, cost in measured.items()},
+                                     indent=2) + "\n")
+        print(f"Budget written to {BUDGET}")
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
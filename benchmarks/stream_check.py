@@ -0,0 +1,67 @@
+"""
+Checks that large AI answers are forwarded to the logic with bounded memory.
+
+Runs games whose AIs answer with --size bytes every round, the output limit being raised by the round config of
+the logic, once with the default stream threshold and once with streaming disabled. Reports the peak memory
+allocated by the judger (tracemalloc) in both cases and fails when the streamed games use more than --budget MiB.
+
+Usage: python benchmarks/stream_check.py [--size 8388608] [--concurrency 2] [--budget 4]
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from core.logger import set_console_level  # noqa: E402
+from core.match import MatchSpec, run_match  # noqa: E402
+from core.summary import JudgeState  # noqa: E402
+
+HERE = Path(__file__).resolve().parent
+
+
+async def run_games(output: Path, size: int, concurrency: int, **options) -> int:
+    ai = f"{sys.executable} {HERE / 'synthetic_ai.py'} 0 {size}"
+    specs = [MatchSpec(f"game{i}", str(HERE / "synthetic_logic.py"), 2, [ai, ai], str(output / f"game{i}"),
+                       {"rounds": 4, "length": size}) for i in range(concurrency)]
+    summaries = await asyncio.gather(*(run_match(spec, **options) for spec in specs))
+    return sum(summary.final_state != JudgeState.GAME_OVER for summary in summaries)
+
+
+def measure(output: Path, size: int, concurrency: int, **options) -> float:
+    tracemalloc.start()
+    try:
+        failures = asyncio.run(run_games(output, size, concurrency, **options))
+        peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+    if failures > 0:
+        raise RuntimeError(f"{failures} games did not finish normally")
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=8 * 1024 * 1024)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--budget", type=float, default=4)
+    args = parser.parse_args()
+    set_console_level(logging.WARNING)
+    with tempfile.TemporaryDirectory() as directory:
+        streamed = measure(Path(directory) / "streamed", args.size, args.concurrency)
+        buffered = measure(Path(directory) / "buffered", args.size, args.concurrency,
+                           stream_threshold=args.size + 1)
+    print(f"{args.concurrency} games answering {args.size} bytes per round")
+    print(f"    streamed: peak {streamed:.1f} MiB")
+    print(f"    buffered: peak {buffered:.1f} MiB")
+    ok = streamed <= args.budget
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+"""
+Minimal AI for benchmarks and checks. Reads line based content on stdin and answers every line at once.
+An optional first argument delays the start by that many seconds, like an AI loading a model,
+an optional second one sets the size of every answer in bytes.
+"""
+import struct
+import sys
+import time
+
+if len(sys.argv) > 1:
+    time.sleep(float(sys.argv[1]))
+
+size = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+for line in sys.stdin.buffer:
+    reply = b"ok " + line.strip()[:16] if size is None else b"y" * size
+    sys.stdout.buffer.write(struct.pack(">i", len(reply)) + reply)
+    sys.stdout.buffer.flush()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Minimal game logic for benchmarks and checks, speaking protocol v1.
+Plays config["rounds"] rounds, asking one player per round in turn, every answer scores one point.
+config["size"] sets the size of the round content in bytes, config["length"] the output limit of the AIs.
+Every round is recorded in the replay file.
+"""
+import json
+import struct
+import sys
+
+stdin = sys.stdin.buffer
+stdout = sys.stdout.buffer
+
+
+def read() -> dict:
+    header = stdin.read(4)
+    if len(header) < 4:
+        sys.exit(0)
+    return json.loads(stdin.read(struct.unpack(">i", header)[0]))
+
+
+def send(message: dict) -> None:
+    data = json.dumps(message).encode("utf-8")
+    stdout.write(struct.pack(">ii", len(data), -1) + data)
+    stdout.flush()
+
+
+def main():
+    init = read()
+    players = init["player_num"]
+    rounds = int(init["config"].get("rounds", 5))
+    content = "x" * int(init["config"].get("size", 8)) + "\n"
+    send({"state": 0, "time": 3, "length": int(init["config"].get("length", 2048))})
+    score = [0] * players
+    with open(init["replay"], "w") as replay:
+        for state in range(1, rounds + 1):
+            current = state % players
+            send({"state": state, "listen": [current], "player": [current], "content": [content]})
+            reply = read()
+            if reply["player"] == -1:
+                break
+            score[current] += 1
+            replay.write(json.dumps({"state": state, "player": current, "reply": reply["content"][:64],
+                                     "reply_size": len(reply["content"])}) + "\n")
+    send({"state": -1, "end_info": json.dumps({str(i): s for i, s in enumerate(score)})})
+
+
+if __name__ == "__main__":
+    main()
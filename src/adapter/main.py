@@ -2,22 +2,9 @@ import argparse
 import asyncio
 from pathlib import Path
 
-parser = argparse.ArgumentParser(prog="python -m adapter")
-parser.add_argument("judger_ip", type=str, help="IP address of local judger server")
-parser.add_argument("judger_port", type=int, help="Port of local judger server")
-parser.add_argument("ai_path", type=str, help="Path of to-be-adapted AI program")
-args = parser.parse_args()
-
-judger_ip = args.judger_ip
-judger_port = args.judger_port
-ai_path = args.ai_path
-
-
-async def bridge_stream(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
-    while True:
-        data = await reader.readexactly(1)
-        writer.write(data)
-        await writer.drain()
+from core.framing import ChildOutput
+from core.protocol import handshake_frame
+from .pool import AiPool, ai_command, bridge_stream, open_judger_connection, serve_requests
 
 
 async def wait_process(proc: asyncio.subprocess.Process):
@@ -25,23 +12,55 @@ async def wait_process(proc: asyncio.subprocess.Process):
     print("AI process exited: ", return_code)
 
 
-async def run():
+async def run(args: argparse.Namespace):
+    stdout = ChildOutput()
     ai_proc = await asyncio.create_subprocess_shell(
-        str(Path.cwd() / ai_path),
+        str(Path.cwd() / args.ai_path),
         stdin=asyncio.subprocess.PIPE,
-        stdout=asyncio.subprocess.PIPE,
+        stdout=stdout.fileno(),
         stderr=None,
     )
+    ai_stdout = await stdout.connect()
     print("Launched AI process")
-    (socket_reader, socket_writer) = await asyncio.open_connection(judger_ip, judger_port)
+    connection = await open_judger_connection(args.judger_ip, args.judger_port)
     print("Connected to local judger")
+    if args.match is not None:
+        connection.write(handshake_frame(args.match, args.token or ""))
     await asyncio.gather(
-        bridge_stream(ai_proc.stdout, socket_writer),
-        bridge_stream(socket_reader, ai_proc.stdin),
+        bridge_stream(ai_stdout, connection),
+        bridge_stream(connection, ai_proc.stdin),
         wait_process(ai_proc),
         return_exceptions=True
     )
 
 
+async def run_pool(args: argparse.Namespace):
+    async with AiPool(ai_command(args.ai_path), args.pool) as pool:
+        server = await serve_requests(pool, args.poolHost, args.poolPort, (args.judger_ip, args.judger_port))
+        port = server.sockets[0].getsockname()[1]
+        print(f"Pool of {args.pool} AI processes listening on {args.poolHost}:{port}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+
+
 def main():
-    asyncio.run(run())
+    parser = argparse.ArgumentParser(prog="python -m adapter")
+    parser.add_argument("judger_ip", type=str, help="IP address of local judger server")
+    parser.add_argument("judger_port", type=int, help="Port of local judger server")
+    parser.add_argument("ai_path", type=str, help="Path of to-be-adapted AI program")
+    parser.add_argument("--match", type=str, help="Match id, when connecting to a shared match server")
+    parser.add_argument("--token", type=str, help="Seat token, when connecting to a shared match server")
+    parser.add_argument("--pool", type=int, help="Keep this many AI processes warm and attach one to the judger on "
+                                                 "each request received on --poolPort")
+    parser.add_argument("--poolHost", type=str, default="127.0.0.1", help="Address of the pool request listener")
+    parser.add_argument("--poolPort", type=int, default=0, help="Port of the pool request listener")
+    args = parser.parse_args()
+    if args.pool is not None and args.pool < 1:
+        parser.error("--pool must be at least 1")
+    try:
+        asyncio.run(run(args) if args.pool is None else run_pool(args))
+    except KeyboardInterrupt:
+        pass
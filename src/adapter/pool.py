@@ -0,0 +1,241 @@
+import asyncio
+import collections
+import json
+import shlex
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Set, Tuple, Union
+
+from core.framing import ChildOutput, FrameStream
+from core.logger import LOG
+from core.protocol import handshake_frame
+
+Process = asyncio.subprocess.Process
+
+
+def ai_command(ai_path: str) -> List[str]:
+    """
+    Split the AI command line like a shell would, the program path being relative to the working directory.
+    """
+    command = shlex.split(ai_path)
+    if len(command) == 0:
+        raise ValueError("Empty AI command")
+    command[0] = str(Path.cwd() / command[0])
+    return command
+
+
+async def open_judger_connection(host: str, port: int) -> FrameStream:
+    loop = asyncio.get_running_loop()
+    _, stream = await loop.create_connection(FrameStream, host, port)
+    return stream
+
+
+async def bridge_stream(reader: FrameStream, writer: Union[FrameStream, asyncio.StreamWriter]) -> None:
+    while True:
+        data = await reader.read(65536)
+        if len(data) == 0:
+            writer.close()
+            return
+        writer.write(data)
+        await writer.drain()
+
+
+class AiPool:
+    """
+    AI processes spawned ahead of time, without a shell, and kept idle until they are attached to a judger
+    connection. Each process plays a single match and is killed afterwards, the pool spawns a replacement in the
+    background as soon as one is taken, so that `size` processes are warm whenever possible.
+    """
+    command: List[str]
+    size: int
+    # Delay before replacing a process that exited while idle, so that a crashing AI does not spin
+    respawn_delay: float = 1
+
+    def __init__(self, command: List[str], size: int):
+        self.command = command
+        self.size = size
+        self.idle: Deque[Process] = collections.deque()
+        self.outputs: Dict[Process, FrameStream] = {}
+        self.spawning = 0
+        self.closed = False
+        self.tasks: Set[asyncio.Task] = set()
+        self.available: Optional[asyncio.Condition] = None
+
+    async def start(self) -> None:
+        self.available = asyncio.Condition()
+        self.replenish()
+
+    def create_task(self, coro) -> asyncio.Task:
+        task = asyncio.ensure_future(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def replenish(self, delay: float = 0) -> None:
+        while not self.closed and len(self.idle) + self.spawning < self.size:
+            self.spawning += 1
+            self.create_task(self.spawn(delay))
+
+    async def spawn(self, delay: float) -> None:
+        try:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            stdout = ChildOutput()
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *self.command,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=stdout.fileno(),
+                    stderr=None,
+                )
+            except BaseException:
+                stdout.close()
+                raise
+        except OSError as e:
+            LOG.error("Failed to launch AI %s: %s", self.command, e)
+            self.spawning -= 1
+            self.replenish(self.respawn_delay)
+            return
+        self.outputs[proc] = await stdout.connect()
+        self.spawning -= 1
+        if self.closed:
+            await self.kill(proc)
+            return
+        LOG.debug("AI process %d is warm", proc.pid)
+        self.idle.append(proc)
+        async with self.available:
+            self.available.notify()
+        self.create_task(self.watch_idle(proc))
+
+    async def watch_idle(self, proc: Process) -> None:
+        await proc.wait()
+        if proc in self.idle:
+            self.idle.remove(proc)
+            LOG.warning("Idle AI process %d exited with %d", proc.pid, proc.returncode)
+            # Closes its output, a crashing AI is replaced again and again
+            await self.kill(proc)
+            self.replenish(self.respawn_delay)
+
+    async def acquire(self) -> Process:
+        """
+        Take a warm process out of the pool, waiting for one when all of them are in use.
+        """
+        dead = []
+        async with self.available:
+            await self.available.wait_for(lambda: any(p.returncode is None for p in self.idle))
+            proc = self.idle.popleft()
+            while proc.returncode is not None:
+                dead.append(proc)
+                proc = self.idle.popleft()
+        for exited in dead:
+            await self.kill(exited)
+        self.replenish()
+        return proc
+
+    async def attach(self, host: str, port: int, match: Optional[str] = None, token: Optional[str] = None) -> Process:
+        """
+        Connect a warm process to a judger and bridge it in the background until either side is done.
+        """
+        proc = await self.acquire()
+        try:
+            connection = await open_judger_connection(host, port)
+        except OSError:
+            # Untouched, it can serve the next request
+            async with self.available:
+                self.idle.appendleft(proc)
+                self.available.notify()
+            raise
+        if match is not None:
+            connection.write(handshake_frame(match, token or ""))
+        LOG.info("Attached AI process %d to %s:%d", proc.pid, host, port)
+        self.create_task(self.play(proc, connection))
+        return proc
+
+    async def play(self, proc: Process, connection: FrameStream) -> None:
+        bridges = [asyncio.ensure_future(bridge_stream(self.outputs[proc], connection)),
+                   asyncio.ensure_future(bridge_stream(connection, proc.stdin))]
+        try:
+            # Ends when the AI exits or the judger closes the connection
+            waiter = asyncio.ensure_future(proc.wait())
+            await asyncio.wait([waiter, bridges[1]], return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+        finally:
+            await self.kill(proc)
+            for bridge in bridges:
+                bridge.cancel()
+            await asyncio.gather(*bridges, return_exceptions=True)
+            connection.close()
+            LOG.info("AI process %d exited: %s", proc.pid, proc.returncode)
+
+    async def kill(self, proc: Process) -> None:
+        if proc.returncode is None:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+        await proc.wait()
+        output = self.outputs.pop(proc, None)
+        if output is not None:
+            output.close()
+
+    async def close(self) -> None:
+        self.closed = True
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        while len(self.idle) > 0:
+            await self.kill(self.idle.popleft())
+
+    async def __aenter__(self) -> "AiPool":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
+
+
+async def serve_requests(pool: AiPool, host: str, port: int, default_target: Tuple[str, int]) -> asyncio.AbstractServer:
+    """
+    Accept attach requests from local tools: one JSON object per line, {"host", "port", "match", "token"}, all of
+    them optional (the target defaults to default_target). Each request is answered with a line holding either
+    the pid of the attached AI or an error.
+    """
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if len(line) == 0:
+                    break
+                try:
+                    request = json.loads(line)
+                    proc = await pool.attach(request.get("host", default_target[0]),
+                                             int(request.get("port", default_target[1])),
+                                             request.get("match"), request.get("token"))
+                    reply = {"pid": proc.pid}
+                except (ValueError, TypeError, AttributeError, OSError) as e:
+                    reply = {"error": str(e) or type(e).__name__}
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+async def request_attach(host: str, port: int, **target) -> int:
+    """
+    Ask the pool listening on host:port to attach an AI to target (host, port, match, token).
+    Returns the pid of the attached AI.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(json.dumps(target).encode() + b"\n")
+        reply = json.loads(await reader.readline())
+    finally:
+        writer.close()
+    if "error" in reply:
+        raise OSError(reply["error"])
+    return reply["pid"]
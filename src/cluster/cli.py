@@ -0,0 +1,41 @@
+import argparse
+import asyncio
+import logging
+from pathlib import Path
+
+from core.logger import set_console_level, set_log_output_file
+from core.placement import available_cores
+from .worker import Worker
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="judger_worker",
+        description="Run matches handed out by a tournament coordinator (judger_tournament --workers).")
+    parser.add_argument("coordinator", type=str, help="Coordinator address as host:port.")
+    parser.add_argument("--dir", type=str, default="worker", help="Working directory of running matches.")
+    parser.add_argument("--slots", type=int, help="Maximum count of matches running at the same time.")
+    parser.add_argument("--coresPerMatch", type=int,
+                        help="Pin the logic and AIs of every match to this many cores of its own, and offer no "
+                             "more slots than fit on the cores of this node.")
+    parser.add_argument("--name", type=str, help="Worker name shown by the coordinator.")
+    parser.add_argument("--token", type=str, help="Shared token required by the coordinator (--workersToken).")
+    parser.add_argument("--noReconnect", action="store_true",
+                        help="Exit instead of reconnecting when the coordinator is lost.")
+    parser.add_argument("--verbose", action="store_true", help="Log every judger message to console.")
+    args = parser.parse_args()
+
+    if args.coresPerMatch is not None and not 1 <= args.coresPerMatch <= len(available_cores()):
+        parser.error(f"--coresPerMatch must be between 1 and the {len(available_cores())} available cores")
+    host, _, port = args.coordinator.rpartition(":")
+    directory = Path.cwd() / args.dir
+    directory.mkdir(parents=True, exist_ok=True)
+    set_log_output_file(directory)
+    if not args.verbose:
+        set_console_level(logging.WARNING)
+    worker = Worker(host or "localhost", int(port), directory, args.slots, args.name, not args.noReconnect,
+                    args.coresPerMatch, args.token)
+    try:
+        asyncio.run(worker.run())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,257 @@
+import asyncio
+import ipaddress
+import itertools
+import secrets
+import tarfile
+from pathlib import Path
+from typing import Dict, Optional, Set, TYPE_CHECKING
+
+from core.logger import LOG
+from core.match import MatchSpec
+from core.summary import JudgeSummary, JudgeState
+from .wire import read_message, send_message, unpack_artifacts
+
+if TYPE_CHECKING:
+    from core.result_cache import ResultCache
+
+
+def _is_loopback(address: str) -> bool:
+    try:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return False
+
+
+class MatchFailed(Exception):
+    """
+    A match could not be played by any worker within the allowed attempts.
+    """
+    pass
+
+
+class Job:
+    id: int
+    spec: MatchSpec
+    options: dict
+    future: asyncio.Future
+    attempts: int
+
+    def __init__(self, id: int, spec: MatchSpec, options: dict):
+        self.id = id
+        self.spec = spec
+        self.options = options
+        self.future = asyncio.get_running_loop().create_future()
+        self.attempts = 0
+
+
+class WorkerSession:
+    """
+    A connected worker running at most `slots` matches at the same time.
+    """
+    name: str
+    slots: int
+    writer: asyncio.StreamWriter
+    jobs: Dict[int, Job]
+
+    def __init__(self, name: str, slots: int, writer: asyncio.StreamWriter):
+        self.name = name
+        self.slots = slots
+        self.writer = writer
+        self.jobs = {}
+        self.free = asyncio.Semaphore(slots)
+        # Writes of the dispatcher and of close() must not interleave their drain()
+        self.send_lock = asyncio.Lock()
+
+
+class Coordinator:
+    """
+    Hands matches out to worker nodes (see cluster.worker) and collects their results.
+    Workers connect over TCP, announce their slots and receive match specs. The logic and AI paths of the
+    specs must be valid on the workers. Each result carries the JudgeSummary and the compressed artifacts,
+    which are unpacked into the output directory of the spec.
+    A match whose worker disconnects, or stays silent for heartbeat_timeout seconds, is queued again ahead of
+    new matches, at most max_attempts times.
+    The coordinator only listens on the loopback interface by default. With a token, workers must present the
+    same token to join.
+    run() has the signature of JudgerRuntime.run, so a tournament can use either of them.
+    """
+    host: str
+    port: int
+    heartbeat_timeout: float
+    max_attempts: int
+    token: Optional[str]
+    sessions: Set[WorkerSession]
+    server: Optional[asyncio.AbstractServer]
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, heartbeat_timeout: float = 30, max_attempts: int = 3,
+                 token: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        self.token = token
+        self.sessions = set()
+        self.server = None
+        self.closing = False
+        self.handlers: Set[asyncio.Task] = set()
+        self.queue: Optional[asyncio.PriorityQueue] = None
+        self.job_ids = itertools.count()
+
+    async def start(self) -> str:
+        self.queue = asyncio.PriorityQueue()
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        addrs = ', '.join(str(sock.getsockname()) for sock in self.server.sockets)
+        LOG.info("Coordinator is waiting for workers at %s", addrs)
+        if self.token is None and not all(_is_loopback(sock.getsockname()[0]) for sock in self.server.sockets):
+            LOG.warning("Coordinator accepts workers from other hosts without a token, anyone reaching it can "
+                        "take matches")
+        return addrs
+
+    async def close(self) -> None:
+        self.closing = True
+        if self.server is not None:
+            self.server.close()
+        for session in list(self.sessions):
+            try:
+                async with session.send_lock:
+                    await send_message(session.writer, {"type": "bye"})
+            except ConnectionError:
+                pass
+            session.writer.close()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        while not self.queue.empty():
+            _, _, job = self.queue.get_nowait()
+            if not job.future.done():
+                job.future.set_exception(MatchFailed("coordinator is closed"))
+        if self.server is not None:
+            await self.server.wait_closed()
+
+    async def __aenter__(self) -> "Coordinator":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def run(self, spec: MatchSpec, cache: Optional["ResultCache"] = None, force: bool = False,
+                  **options) -> JudgeSummary:
+        """
+        Options are passed to the Judger on the worker, so they must be JSON serializable.
+        """
+        output = Path(spec.output)
+        output.mkdir(parents=True, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        key = None
+        if cache is not None:
+            key = await loop.run_in_executor(None, cache.match_key, spec)
+            if not force:
+                summary = await loop.run_in_executor(None, cache.get, key, output)
+                if summary is not None:
+                    LOG.info("Match %s is answered by the result cache", spec.match_id)
+                    return summary
+        job = Job(next(self.job_ids), spec, options)
+        self.queue.put_nowait((1, job.id, job))
+        summary = await job.future
+        if key is not None and summary.final_state == JudgeState.GAME_OVER:
+            await loop.run_in_executor(None, cache.put, key, summary, output)
+        return summary
+
+    def requeue(self, job: Job, reason: str) -> None:
+        if job.future.done():
+            return
+        if job.attempts >= self.max_attempts:
+            LOG.error("Match %s failed %d times, giving up: %s", job.spec.match_id, job.attempts, reason)
+            job.future.set_exception(MatchFailed(reason))
+            return
+        LOG.warning("Match %s is queued again: %s", job.spec.match_id, reason)
+        # Interrupted matches go before the new ones
+        self.queue.put_nowait((0, job.id, job))
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        handler = asyncio.current_task()
+        self.handlers.add(handler)
+        try:
+            await self.serve_worker(reader, writer)
+        finally:
+            self.handlers.discard(handler)
+
+    async def serve_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            hello, _ = await read_message(reader, self.heartbeat_timeout)
+            if hello.get("type") != "hello":
+                raise ValueError(f"unexpected {hello.get('type')}")
+            if self.token is not None and not secrets.compare_digest(
+                    str(hello.get("token")).encode("utf-8", errors="replace"), self.token.encode("utf-8")):
+                raise ValueError("invalid token")
+            session = WorkerSession(str(hello.get("worker")), max(1, int(hello.get("slots", 1))), writer)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError, TypeError) as e:
+            LOG.warning("Rejected a worker connection: %s", e)
+            writer.close()
+            return
+        self.sessions.add(session)
+        LOG.info("Worker %s joined with %d slots", session.name, session.slots)
+        dispatcher = asyncio.create_task(self.__dispatch(session))
+        reason = "worker disconnected"
+        try:
+            while True:
+                header, blob = await read_message(reader, self.heartbeat_timeout)
+                if header.get("type") == "result":
+                    await self.__finish(session, header, blob)
+                elif header.get("type") == "failed":
+                    job = self.__release(session, header)
+                    if job is not None:
+                        self.requeue(job, f"worker {session.name} failed to run it: {header.get('error')}")
+        except asyncio.TimeoutError:
+            reason = f"no heartbeat from worker in {self.heartbeat_timeout} seconds"
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, TypeError) as e:
+            reason = f"worker connection is lost ({e!r})"
+        finally:
+            if self.closing:
+                LOG.info("Worker %s is dismissed", session.name)
+            else:
+                LOG.warning("Worker %s left: %s", session.name, reason)
+            self.sessions.discard(session)
+            dispatcher.cancel()
+            await asyncio.gather(dispatcher, return_exceptions=True)
+            for job in session.jobs.values():
+                self.requeue(job, f"{reason} on {session.name}")
+            writer.close()
+
+    async def __dispatch(self, session: WorkerSession) -> None:
+        while True:
+            await session.free.acquire()
+            _, _, job = await self.queue.get()
+            if job.future.done():
+                # Abandoned by its caller
+                session.free.release()
+                continue
+            job.attempts += 1
+            session.jobs[job.id] = job
+            LOG.info("Match %s is sent to worker %s", job.spec.match_id, session.name)
+            async with session.send_lock:
+                await send_message(session.writer, {"type": "match", "job": job.id, "spec": job.spec.to_dict(),
+                                                    "options": job.options})
+
+    def __release(self, session: WorkerSession, header: dict) -> Optional[Job]:
+        job = session.jobs.pop(header.get("job"), None)
+        if job is None:
+            LOG.warning("Worker %s reported unknown job %s", session.name, header.get("job"))
+            return None
+        session.free.release()
+        return job
+
+    async def __finish(self, session: WorkerSession, header: dict, blob: Optional[bytes]) -> None:
+        job = self.__release(session, header)
+        if job is None or job.future.done():
+            return
+        try:
+            summary = JudgeSummary.from_dict(header["summary"])
+            if blob is not None:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, unpack_artifacts, blob, Path(job.spec.output))
+        except (ValueError, KeyError, TypeError, OSError, EOFError, tarfile.TarError) as e:
+            self.requeue(job, f"invalid result from worker {session.name}: {e!r}")
+            return
+        LOG.info("Match %s is finished by worker %s", job.spec.match_id, session.name)
+        job.future.set_result(summary)
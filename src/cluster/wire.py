@@ -0,0 +1,74 @@
+import asyncio
+import io
+import json
+import tarfile
+from pathlib import Path
+from typing import Optional, Tuple
+
+from core.utils import bytes2int, int2bytes
+
+# A message is a 4-byte header size, a JSON header and, when the header has a "blob" size, that many raw bytes
+MAX_HEADER_SIZE = 16 * 1024 * 1024
+MAX_BLOB_SIZE = 1024 * 1024 * 1024
+_BLOB_CHUNK_SIZE = 1024 * 1024
+
+
+async def send_message(writer: asyncio.StreamWriter, header: dict, blob: Optional[bytes] = None) -> None:
+    if blob is not None:
+        header = dict(header, blob=len(blob))
+    data = json.dumps(header).encode("utf-8")
+    writer.write(int2bytes(len(data)) + data)
+    if blob is not None:
+        writer.write(blob)
+    await writer.drain()
+
+
+async def read_message(reader: asyncio.StreamReader,
+                       timeout: Optional[float] = None) -> Tuple[dict, Optional[bytes]]:
+    """
+    Raises IncompleteReadError when the peer is gone and ValueError on a malformed message.
+    `timeout` bounds the wait for the header, e.g. to notice missing heartbeats. A blob may take much longer to
+    arrive as a whole, it only times out when no part of it arrives for `timeout` seconds.
+    """
+    size = bytes2int(await asyncio.wait_for(reader.readexactly(4), timeout))
+    if not 0 < size <= MAX_HEADER_SIZE:
+        raise ValueError(f"header size {size}")
+    header = json.loads(await asyncio.wait_for(reader.readexactly(size), timeout))
+    if not isinstance(header, dict):
+        raise ValueError("header is not an object")
+    blob = None
+    if "blob" in header:
+        blob_size = int(header["blob"])
+        if not 0 <= blob_size <= MAX_BLOB_SIZE:
+            raise ValueError(f"blob size {blob_size}")
+        blob = bytearray()
+        while len(blob) < blob_size:
+            chunk = await asyncio.wait_for(reader.read(min(blob_size - len(blob), _BLOB_CHUNK_SIZE)), timeout)
+            if not chunk:
+                raise asyncio.IncompleteReadError(bytes(blob), blob_size)
+            blob += chunk
+    return header, blob
+
+
+def pack_artifacts(directory: Path) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for path in sorted(directory.iterdir()):
+            tar.add(str(path), arcname=path.name)
+    return buffer.getvalue()
+
+
+def unpack_artifacts(data: bytes, directory: Path) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r:gz") as tar:
+        members = []
+        for member in tar.getmembers():
+            # Artifacts come from another host, nothing may land outside the match directory
+            target = (directory / member.name).resolve()
+            if not (member.isfile() or member.isdir()) or directory.resolve() not in target.parents:
+                raise ValueError(f"unsafe artifact {member.name}")
+            members.append(member)
+        if hasattr(tarfile, "data_filter"):
+            tar.extractall(str(directory), members, filter="data")
+        else:
+            tar.extractall(str(directory), members)
@@ -0,0 +1,128 @@
+import asyncio
+import os
+import shutil
+import socket
+from pathlib import Path
+from typing import Optional, Set
+
+from core.logger import LOG
+from core.match import MatchSpec
+from core.placement import CorePool
+from core.runtime import JudgerRuntime
+from .wire import pack_artifacts, read_message, send_message
+
+
+class Worker:
+    """
+    A worker node. Connects to a Coordinator, runs up to `slots` matches at the same time with local judgers and
+    sends back each summary together with the gzipped artifacts of the match.
+    Matches run in <directory>/<job>-<match id>, which is removed once the result is delivered.
+    When the coordinator is lost, running matches are stopped (the coordinator queues them again) and the worker
+    reconnects after retry_interval seconds, unless reconnect is disabled.
+    With cores_per_match, every match is pinned to a core set of its own and slots are limited to the sets
+    that fit on the cores of the node.
+    token is presented to coordinators that require one.
+    """
+    host: str
+    port: int
+    directory: Path
+    slots: int
+    cores: Optional[CorePool]
+    name: str
+    token: Optional[str]
+    heartbeat_interval: float = 5
+    retry_interval: float = 3
+
+    def __init__(self, host: str, port: int, directory: Path, slots: Optional[int] = None,
+                 name: Optional[str] = None, reconnect: bool = True, cores_per_match: Optional[int] = None,
+                 token: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.directory = directory
+        self.slots = slots or os.cpu_count() or 1
+        self.cores = None
+        if cores_per_match is not None:
+            self.cores = CorePool(cores_per_match)
+            self.slots = min(self.slots, self.cores.capacity)
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.reconnect = reconnect
+        self.token = token
+
+    async def run(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        async with JudgerRuntime(console=True) as runtime:
+            while True:
+                try:
+                    reader, writer = await asyncio.open_connection(self.host, self.port)
+                except OSError as e:
+                    if not self.reconnect:
+                        raise
+                    LOG.warning("Cannot reach coordinator %s:%d (%s), retrying", self.host, self.port, e)
+                    await asyncio.sleep(self.retry_interval)
+                    continue
+                if await self.serve(runtime, reader, writer) or not self.reconnect:
+                    return
+                await asyncio.sleep(self.retry_interval)
+
+    async def serve(self, runtime: JudgerRuntime, reader: asyncio.StreamReader,
+                    writer: asyncio.StreamWriter) -> bool:
+        """
+        Returns True when the coordinator dismissed the worker, False when the connection was lost.
+        """
+        await send_message(writer, {"type": "hello", "worker": self.name, "slots": self.slots, "token": self.token})
+        LOG.info("Worker %s is connected to %s:%d with %d slots", self.name, self.host, self.port, self.slots)
+        # Heartbeats and results are sent by different tasks, their drain() must not interleave
+        send_lock = asyncio.Lock()
+        heartbeat = asyncio.create_task(self.__heartbeat(writer, send_lock))
+        running: Set[asyncio.Task] = set()
+        dismissed = False
+        try:
+            while True:
+                header, _ = await read_message(reader)
+                if header.get("type") == "match":
+                    task = asyncio.create_task(self.play(runtime, writer, send_lock, header["job"], header["spec"],
+                                                         header.get("options") or {}))
+                    running.add(task)
+                    task.add_done_callback(running.discard)
+                elif header.get("type") == "bye":
+                    dismissed = True
+                    LOG.info("Coordinator dismissed worker %s", self.name)
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, KeyError) as e:
+            LOG.warning("Lost coordinator: %r", e)
+        finally:
+            heartbeat.cancel()
+            for task in running:
+                task.cancel()
+            await asyncio.gather(heartbeat, *running, return_exceptions=True)
+            writer.close()
+        return dismissed
+
+    async def play(self, runtime: JudgerRuntime, writer: asyncio.StreamWriter, send_lock: asyncio.Lock, job: int,
+                   data: dict, options: dict) -> None:
+        loop = asyncio.get_running_loop()
+        spec = MatchSpec.from_dict(data)
+        spec.output = str(self.directory / f"{job}-{spec.match_id}")
+        try:
+            if self.cores is not None:
+                async with self.cores.slot() as cores:
+                    summary = await runtime.run(spec, **dict(options, cpu_affinity=cores))
+            else:
+                summary = await runtime.run(spec, **options)
+            artifacts = await loop.run_in_executor(runtime.executor, pack_artifacts, Path(spec.output))
+            async with send_lock:
+                await send_message(writer, {"type": "result", "job": job, "summary": summary.to_dict()}, artifacts)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            LOG.exception("Failed to run match %s", spec.match_id)
+            async with send_lock:
+                await send_message(writer, {"type": "failed", "job": job, "error": repr(e)})
+        finally:
+            await loop.run_in_executor(runtime.executor, lambda: shutil.rmtree(spec.output, ignore_errors=True))
+
+    async def __heartbeat(self, writer: asyncio.StreamWriter, send_lock: asyncio.Lock) -> None:
+        while True:
+            async with send_lock:
+                await send_message(writer, {"type": "ping"})
+            await asyncio.sleep(self.heartbeat_interval)
@@ -0,0 +1,168 @@
+import asyncio
+import concurrent.futures
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .logger import LOG
+
+
+class Subscription:
+    """
+    A single subscriber of the EventBus.
+    Pending events are kept in publish order. Events whose type is listed in `coalesce` only keep the latest
+    instance, so a flood of NEW_ROUND events collapses into one delivery.
+    Delivery happens at most once every `min_interval` seconds. If `batch` is set, the handler receives the whole
+    list of pending events in one call, otherwise it is called once per event with the event dict as kwargs.
+    If `threaded` is set, the handler runs in the executor of the bus. Only one job is in flight per subscriber,
+    so the order of delivery is always the order of publishing.
+    """
+    handler: Callable
+    coalesce: frozenset
+    min_interval: float
+    batch: bool
+    threaded: bool
+
+    def __init__(self, handler: Callable, coalesce: Iterable = (), min_interval: float = 0, batch: bool = False,
+                 threaded: bool = True):
+        self.handler = handler
+        self.coalesce = frozenset(coalesce)
+        self.min_interval = min_interval
+        self.batch = batch
+        self.threaded = threaded
+        self.pending: List[dict] = []
+        self.coalesced: Dict[object, dict] = {}
+        self.wakeup: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+
+    def push(self, event: dict) -> None:
+        event_type = event.get("type")
+        if event_type in self.coalesce:
+            old = self.coalesced.get(event_type)
+            if old is not None:
+                self.pending.remove(old)
+            self.coalesced[event_type] = event
+        self.pending.append(event)
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def take(self) -> List[dict]:
+        events = self.pending
+        self.pending = []
+        self.coalesced.clear()
+        return events
+
+    def deliver(self, events: List[dict]) -> None:
+        if self.batch:
+            self.handler(events)
+        else:
+            for event in events:
+                self.handler(**event)
+
+
+class EventBus:
+    """
+    Ordered event bus of a Judger.
+    Publishing is cheap and never blocks the game loop: events are appended to the pending list of every subscriber
+    and a dedicated delivery task per subscriber hands them to the handler.
+    publish() must be called from the event loop thread.
+    Once closed, the bus drops its subscriptions and ignores later events.
+    """
+    subscriptions: List[Subscription]
+    executor: Optional[concurrent.futures.Executor]
+    loop: Optional[asyncio.AbstractEventLoop]
+
+    def __init__(self):
+        self.subscriptions = []
+        self.executor = None
+        self.loop = None
+        self.closed = False
+
+    def subscribe(self, handler: Callable, *, coalesce: Iterable = (), min_interval: float = 0, batch: bool = False,
+                  threaded: bool = True) -> Subscription:
+        subscription = Subscription(handler, coalesce, min_interval, batch, threaded)
+        if self.closed:
+            subscription.closed = True
+            return subscription
+        self.subscriptions.append(subscription)
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.__start_subscription, subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+        subscription.closed = True
+        if subscription.wakeup is not None and self.loop is not None:
+            self.loop.call_soon_threadsafe(subscription.wakeup.set)
+
+    def publish(self, event: dict) -> None:
+        if self.closed:
+            return
+        for subscription in self.subscriptions:
+            subscription.push(event)
+
+    def attach(self, executor: Optional[concurrent.futures.Executor]) -> None:
+        """
+        Start delivering events on the running loop. Events published before are kept and delivered.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.executor = executor
+        for subscription in self.subscriptions:
+            self.__start_subscription(subscription)
+
+    async def close(self) -> None:
+        """
+        Flush all pending events, stop the delivery tasks and drop the subscriptions.
+        """
+        self.closed = True
+        tasks = []
+        for subscription in self.subscriptions:
+            subscription.closed = True
+            if subscription.wakeup is not None:
+                subscription.wakeup.set()
+            if subscription.task is not None:
+                tasks.append(subscription.task)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.subscriptions.clear()
+        self.loop = None
+
+    def __start_subscription(self, subscription: Subscription) -> None:
+        if subscription.task is not None or subscription.closed:
+            return
+        subscription.wakeup = asyncio.Event()
+        if len(subscription.pending) > 0:
+            subscription.wakeup.set()
+        subscription.task = asyncio.create_task(self.__deliver_loop(subscription))
+
+    async def __deliver_loop(self, subscription: Subscription) -> None:
+        loop = asyncio.get_running_loop()
+        last_delivery = None
+        while True:
+            await subscription.wakeup.wait()
+            if not subscription.closed and last_delivery is not None and subscription.min_interval > 0:
+                delay = last_delivery + subscription.min_interval - loop.time()
+                if delay > 0:
+                    # Keep collecting (and coalescing) events until the subscriber is ready again
+                    try:
+                        await asyncio.wait_for(self.__wait_closed(subscription), delay)
+                    except asyncio.TimeoutError:
+                        pass
+            subscription.wakeup.clear()
+            events = subscription.take()
+            if len(events) > 0:
+                last_delivery = loop.time()
+                try:
+                    if subscription.threaded:
+                        await loop.run_in_executor(self.executor, subscription.deliver, events)
+                    else:
+                        subscription.deliver(events)
+                except Exception:
+                    LOG.warning("Event handler %s raised an exception", subscription.handler, exc_info=True)
+            if subscription.closed and len(subscription.pending) == 0:
+                break
+
+    @staticmethod
+    async def __wait_closed(subscription: Subscription) -> None:
+        while not subscription.closed:
+            subscription.wakeup.clear()
+            await subscription.wakeup.wait()
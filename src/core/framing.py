@@ -0,0 +1,276 @@
+import asyncio
+import socket
+import struct
+import sys
+from typing import Callable, List, Optional, Tuple
+
+# Header of AI frames, and of logic frames which add the target after the size
+SIZE_HEADER = struct.Struct(">i")
+LOGIC_HEADER = struct.Struct(">ii")
+
+Frame = Tuple[Tuple[int, ...], Optional[bytes]]
+
+
+class FrameStream(asyncio.BufferedProtocol):
+    """
+    One side of a connection carrying size prefixed frames, in place of a StreamReader/StreamWriter pair.
+    Transports that support buffered protocols (sockets) receive straight into a buffer preallocated for the whole
+    connection, pipe transports copy into it. read_frames() returns every complete frame that has arrived with a
+    single await and parses headers in place, so a frame costs one allocation, for its payload.
+    The buffer grows to the largest frame returned as a whole. Reading pauses while the buffer is full.
+    The writer side mirrors asyncio.StreamWriter: write, drain, close, wait_closed.
+    """
+    header: struct.Struct
+    buffer: bytearray
+    start: int
+    end: int
+
+    def __init__(self, header: struct.Struct = SIZE_HEADER, capacity: int = 64 * 1024,
+                 on_connected: Optional[Callable[["FrameStream"], None]] = None):
+        self.header = header
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        # Unread bytes are buffer[start:end]
+        self.start = 0
+        self.end = 0
+        self.on_connected = on_connected
+        self.transport: Optional[asyncio.BaseTransport] = None
+        self.eof = False
+        self.reading_paused = False
+        self.loop = asyncio.get_running_loop()
+        self.data_waiter: Optional[asyncio.Future] = None
+        self.drain_waiter: Optional[asyncio.Future] = None
+        self.writing_paused = False
+        self.closed = self.loop.create_future()
+
+    # Protocol callbacks
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport
+        if self.on_connected is not None:
+            self.on_connected(self)
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        if self.end == len(self.buffer):
+            self.compact()
+        return self.view[self.end:]
+
+    def buffer_updated(self, nbytes: int) -> None:
+        self.end += nbytes
+        if self.end - self.start == len(self.buffer) and not self.reading_paused:
+            self.reading_paused = True
+            self.transport.pause_reading()
+        self.wake_reader()
+
+    def data_received(self, data: bytes) -> None:
+        # Pipe transports do not fill buffers themselves
+        data = memoryview(data)
+        while len(data) > 0:
+            free = len(self.buffer) - self.end
+            if free == 0:
+                self.compact()
+                free = len(self.buffer) - self.end
+                if free == 0:
+                    self.grow(len(self.buffer) * 2)
+                    continue
+            count = min(free, len(data))
+            self.buffer[self.end:self.end + count] = data[:count]
+            data = data[count:]
+            self.end += count
+        if self.end - self.start >= len(self.buffer) and not self.reading_paused:
+            self.reading_paused = True
+            self.transport.pause_reading()
+        self.wake_reader()
+
+    def eof_received(self) -> bool:
+        self.eof = True
+        self.wake_reader()
+        # Like StreamReaderProtocol, keep the writing half of a socket open
+        return True
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.eof = True
+        self.wake_reader()
+        if self.drain_waiter is not None and not self.drain_waiter.done():
+            self.drain_waiter.set_result(None)
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+    def pause_writing(self) -> None:
+        self.writing_paused = True
+
+    def resume_writing(self) -> None:
+        self.writing_paused = False
+        if self.drain_waiter is not None and not self.drain_waiter.done():
+            self.drain_waiter.set_result(None)
+
+    # Buffer management
+    def compact(self) -> None:
+        size = self.end - self.start
+        if self.start > 0:
+            # Slice assignment copies with memcpy, overlapping ranges need a temporary copy
+            data = self.view[self.start:self.end]
+            self.buffer[:size] = data if self.start >= size else bytes(data)
+            data.release()
+            self.start, self.end = 0, size
+
+    def grow(self, capacity: int) -> None:
+        buffer = bytearray(capacity)
+        size = self.end - self.start
+        buffer[:size] = self.view[self.start:self.end]
+        self.buffer, self.view = buffer, memoryview(buffer)
+        self.start, self.end = 0, size
+
+    def consume(self, count: int) -> None:
+        self.start += count
+        if self.start == self.end:
+            self.start = self.end = 0
+        if self.reading_paused and self.end - self.start < len(self.buffer):
+            self.reading_paused = False
+            self.transport.resume_reading()
+
+    def wake_reader(self) -> None:
+        if self.data_waiter is not None and not self.data_waiter.done():
+            self.data_waiter.set_result(None)
+
+    async def wait_for(self, count: int) -> None:
+        """
+        Wait until at least count bytes are unread. Raises IncompleteReadError at the end of the stream.
+        """
+        if count > len(self.buffer):
+            self.grow(max(count, len(self.buffer) * 2))
+        elif self.start + count > len(self.buffer):
+            self.compact()
+        if self.reading_paused and self.end - self.start < len(self.buffer):
+            self.reading_paused = False
+            self.transport.resume_reading()
+        while self.end - self.start < count:
+            if self.eof:
+                raise asyncio.IncompleteReadError(bytes(self.view[self.start:self.end]), count)
+            self.data_waiter = self.loop.create_future()
+            try:
+                await self.data_waiter
+            finally:
+                self.data_waiter = None
+
+    # Reader API
+    async def read_frames(self, limit: Optional[int] = None) -> List[Frame]:
+        """
+        Wait for the next frame and return it together with every other complete frame already received,
+        as (header fields, payload) pairs. The first header field is the payload size.
+        When a frame is larger than limit, it ends the batch with a None payload and its payload is left unread,
+        for the caller to read with readexactly() or to drop. So does a frame with a negative size.
+        Raises IncompleteReadError at the end of the stream.
+        """
+        header_size = self.header.size
+        await self.wait_for(header_size)
+        fields = self.header.unpack_from(self.buffer, self.start)
+        if 0 <= fields[0] and (limit is None or fields[0] <= limit):
+            await self.wait_for(header_size + fields[0])
+        frames = []
+        while self.end - self.start >= header_size:
+            fields = self.header.unpack_from(self.buffer, self.start)
+            size = fields[0]
+            if size < 0 or limit is not None and size > limit:
+                self.consume(header_size)
+                frames.append((fields, None))
+                break
+            if self.end - self.start < header_size + size:
+                break
+            begin = self.start + header_size
+            frames.append((fields, bytes(self.view[begin:begin + size])))
+            self.consume(header_size + size)
+        return frames
+
+    async def readexactly(self, count: int) -> bytes:
+        await self.wait_for(count)
+        data = bytes(self.view[self.start:self.start + count])
+        self.consume(count)
+        return data
+
+    async def read(self, count: int = -1) -> bytes:
+        """
+        Whatever has arrived, at most count bytes (any amount when negative). Returns b"" at the end of the stream.
+        """
+        try:
+            await self.wait_for(1)
+        except asyncio.IncompleteReadError:
+            return b""
+        available = self.end - self.start
+        count = available if count < 0 else min(count, available)
+        data = bytes(self.view[self.start:self.start + count])
+        self.consume(count)
+        return data
+
+    def at_eof(self) -> bool:
+        return self.eof and self.start == self.end
+
+    # Writer API
+    def write(self, data: bytes) -> None:
+        self.transport.write(data)
+
+    def writelines(self, data) -> None:
+        self.transport.writelines(data)
+
+    async def drain(self) -> None:
+        if self.transport.is_closing():
+            # Let connection_lost run, like StreamWriter.drain
+            await asyncio.sleep(0)
+        if self.closed.done():
+            raise ConnectionResetError("Connection lost")
+        if self.writing_paused:
+            self.drain_waiter = self.loop.create_future()
+            try:
+                await self.drain_waiter
+            finally:
+                self.drain_waiter = None
+
+    def close(self) -> None:
+        if self.transport is not None:
+            self.transport.close()
+
+    def is_closing(self) -> bool:
+        return self.transport is None or self.transport.is_closing()
+
+    async def wait_closed(self) -> None:
+        await self.closed
+
+    def get_extra_info(self, name: str, default=None):
+        return self.transport.get_extra_info(name, default)
+
+
+class ChildOutput:
+    """
+    Output channel of a child process, read through a FrameStream. Pass fileno() as stdout of the child, then
+    connect() once it is launched, or close() if launching failed.
+    On POSIX this is a socket pair rather than a pipe, so that the output is received with recv_into. Windows
+    cannot hand a socket to a child as its stdout, there it is an overlapped pipe read by the proactor loop.
+    """
+
+    def __init__(self, header: struct.Struct = SIZE_HEADER):
+        self.header = header
+        if sys.platform == "win32":
+            # Imported here, both only exist on Windows
+            import msvcrt
+            from asyncio import windows_utils
+            own, child = windows_utils.pipe(overlapped=(True, False))
+            self.own = windows_utils.PipeHandle(own)
+            self.child = open(msvcrt.open_osfhandle(child, 0), "wb", buffering=0)
+        else:
+            self.own, self.child = socket.socketpair()
+
+    def fileno(self) -> int:
+        return self.child.fileno()
+
+    async def connect(self) -> FrameStream:
+        # The child holds its own copy, its exit ends the stream
+        self.child.close()
+        loop = asyncio.get_running_loop()
+        if isinstance(self.own, socket.socket):
+            _, stream = await loop.connect_accepted_socket(lambda: FrameStream(self.header), self.own)
+        else:
+            _, stream = await loop.connect_read_pipe(lambda: FrameStream(self.header), self.own)
+        return stream
+
+    def close(self) -> None:
+        self.child.close()
+        self.own.close()
@@ -1,23 +1,34 @@
 import asyncio
 import concurrent.futures
+import logging
+import os
+import shlex
 import signal
+import subprocess
 import threading
 from asyncio import IncompleteReadError
 from enum import Enum, auto
 from pathlib import Path
-from typing import List, Optional, IO, Callable
+from typing import Dict, List, Optional, IO, Callable, Set, Type, Union, TYPE_CHECKING
 
+from .event_bus import EventBus, Subscription
 from .exception import JudgerIllegalState
 from .logger import LOG
-from .protocol import Protocol, RoundConfig, RoundInfo, AiErrorType
+from .process import ManagedProcess, ResourceLimits
+from .framing import ChildOutput, FrameStream, LOGIC_HEADER
+from .streaming import CHUNK_SIZE, StreamedMessage, spool_ai_content, stream_ai_message
+from .protocol import Protocol, ProtocolV2, RoundConfig, RoundInfo, AiErrorType, get_protocol
 from .summary import JudgeSummary
-from .utils import bytes2int
+
+if TYPE_CHECKING:
+    from .spectator import SpectatorHub
 
 
 class JudgerEvent(Enum):
     TCP_SERVER_STARTED = auto(),
     AI_CONNECTED = auto(),
     NEW_ROUND = auto(),
+    AI_RESPONDED = auto(),
     GAME_OVER = auto()
 
 
@@ -30,31 +41,63 @@ class Judger:
     config: object
     host: str
     port: int
+    ai_commands: List[str]
+    limits: Optional[ResourceLimits]
+    cpu_affinity: Optional[List[int]]
+    handle_signals: bool
+    protocol: Type[Union[Protocol, ProtocolV2]]
+    spectators: Optional["SpectatorHub"]
     # Communication
     to_logic_msg: asyncio.Queue
     to_ai_msg: List[asyncio.Queue]
     logic_proc: asyncio.subprocess.Process
+    logic_process: Optional[ManagedProcess]
+    logic_launched: bool
+    processes: List[ManagedProcess]
+    process_grace: float
     # Game state
     next_ai_index: int
+    seats: List[bool]
+    ai_writers: List[Union[FrameStream, asyncio.StreamWriter]]
+    streams: List[FrameStream]
     listen_target: [int]
     timer: Optional[asyncio.TimerHandle]
     round_time_limit: int
     round_begin_time: float
     output_limit: int
+    stream_threshold: int
+    logic_frame_limit: int
     state: int
     game_running: bool
     # Internal
-    server: asyncio.AbstractServer
+    listen: bool
+    server: Optional[asyncio.AbstractServer]
+    replay_fifo: bool
+    replay_capture: Optional[asyncio.Task]
+    replay_keepalive: int
     shutdown_event: asyncio.Event
-    executor: concurrent.futures.ThreadPoolExecutor
+    executor: concurrent.futures.Executor
+    own_executor: bool
+    log: logging.Logger
+    loop: Optional[asyncio.AbstractEventLoop]
     summary: JudgeSummary
-    event_handler: Optional[Callable]
+    tasks: Set[asyncio.Task]
+    event_bus: EventBus
+    event_handler: Optional[Subscription]
+    on_started: Optional[Callable[[], None]]
+    aborted: bool
 
     def __init__(self, **kwargs):
+        # Embedders pass a logger per match and a shared executor, see core.runtime
+        self.log = kwargs.get("logger") or LOG
+        self.executor = kwargs.get("executor")
+        self.own_executor = self.executor is None
+        self.loop = None
+
         def getValue(name):
             v = kwargs.get(name)
             if v is None:
-                LOG.error("Missing init config: %s", name)
+                self.log.error("Missing init config: %s", name)
                 raise JudgerIllegalState
             return v
 
@@ -63,92 +106,183 @@ class Judger:
         self.replay_path = self.output_dir / "replay.json"
         self.logic_path = getValue("logic_path")
         self.config = getValue("config")
-        self.host, self.port = "localhost", getValue("port")
+        # A judger may instead be fed by a shared listener, see core.match_server
+        self.listen = kwargs.get("listen", True)
+        self.host, self.port = "localhost", getValue("port") if self.listen else kwargs.get("port")
+        self.server = None
+        # AIs launched by the judger itself and talking through stdin/stdout, seated before any TCP AI
+        self.ai_commands = kwargs.get("ai_commands") or []
+        self.limits = kwargs.get("limits")
+        # Cores the logic and launched AIs are pinned to, see core.placement
+        self.cpu_affinity = kwargs.get("cpu_affinity")
+        if self.cpu_affinity is not None and not hasattr(os, "sched_setaffinity"):
+            self.log.warning("This platform cannot pin processes to cores, cpu_affinity is ignored")
+            self.cpu_affinity = None
+        # Embedded judgers running side by side must not fight over the process-wide signal handlers
+        self.handle_signals = kwargs.get("handle_signals", True)
+        # The logic writes its replay into a named pipe and the judger stores it gzipped, see capture_replay
+        self.replay_fifo = kwargs.get("replay_fifo", False)
+        self.replay_capture = None
+        self.replay_keepalive = -1
+        self.protocol = get_protocol(kwargs.get("protocol_version") or 1)
+        # Live stream for spectators is only served when an observer port is given
+        observer_port = kwargs.get("observer_port")
+        self.spectators = None
+        if observer_port is not None:
+            from .spectator import SpectatorHub
+            self.spectators = SpectatorHub(self.host, observer_port, kwargs.get("observer_buffer") or 256,
+                                           kwargs.get("observer_policy") or "drop", self.log)
 
         self.to_ai_msg = []
+        self.logic_process = None
+        self.logic_launched = False
+        self.processes = []
+        self.process_grace = 3
         self.next_ai_index = 0
+        self.seats = [False] * self.player_count
+        self.ai_writers = []
+        # Output of the logic and of every AI, closed when the game is released
+        self.streams = []
         self.listen_target = []
         self.timer = None
         self.round_time_limit = 3
         self.round_begin_time = 0
-        self.output_limit = 2048
+        # Until the logic sets it with its round config
+        self.output_limit = kwargs.get("output_limit") or 2048
+        # Larger AI messages are forwarded to the logic piece by piece, see core.streaming
+        self.stream_threshold = kwargs.get("stream_threshold") or 256 * 1024
+        # Logic frames are read whole, a larger size is taken for a broken stream
+        self.logic_frame_limit = kwargs.get("logic_frame_limit") or 64 * 1024 * 1024
         self.state = -1
         self.game_running = False
+        self.tasks = set()
+        self.event_bus = EventBus()
         self.event_handler = None
+        # Called once run() is ready to seat AIs, see core.match_server
+        self.on_started = None
+        self.aborted = False
 
     # Logic Handlers
-    async def handle_logic_stdout(self, stdout):
-        LOG.info("Attached to logic stdout")
+    async def handle_logic_stdout(self, stdout: FrameStream):
+        self.log.info("Attached to logic stdout")
         try:
             while True:
-                pack_size: int = bytes2int(await stdout.readexactly(4))
-                target: int = bytes2int(await stdout.readexactly(4))
-                data: bytes = await stdout.readexactly(pack_size)
-                LOG.debug("Logic is sending %d bytes of data to target %d: %s", pack_size, target, data)
-                asyncio.create_task(self.parse_logic_data(target, data))
+                for (pack_size, target), data in await stdout.read_frames(self.logic_frame_limit):
+                    if data is None:
+                        # The rest of the stream cannot be framed any more
+                        self.log.error("Logic sent a frame of invalid size %d", pack_size)
+                        if self.game_running:
+                            self.game_running = False
+                            self.summary.appendLogicCrashed()
+                        self.create_task(self.__shutdown())
+                        return
+                    self.log.debug("Logic is sending %d bytes of data to target %d: %s", pack_size, target, data)
+                    self.create_task(self.parse_logic_data(target, data))
         except IncompleteReadError:
-            LOG.warning("Logic stream reached EOF.")
+            self.log.warning("Logic stream reached EOF.")
 
     async def handle_logic_stderr(self, stderr):
-        LOG.info("Attached to Logic stderr")
+        self.log.info("Attached to Logic stderr")
         loop = asyncio.get_event_loop()
         logic_stderr_path = self.output_dir / "logic_stderr.txt"
         trace_file: IO = await loop.run_in_executor(self.executor, lambda: open(logic_stderr_path, "w"))
-        LOG.debug("Logic stderr will also be logged into file: %s", logic_stderr_path)
+        self.log.debug("Logic stderr will also be logged into file: %s", logic_stderr_path)
         try:
             while True:
                 line = await stderr.readline()
                 if not line:
                     break
-                loop.run_in_executor(self.executor, lambda: trace_file.writelines([line.decode("utf-8")]))
-                LOG.debug("Logic STDERR: %s", line)
-            LOG.info("Logic stderr disconnected normally.")
+                # Buffered write in the loop thread keeps the lines in order
+                trace_file.write(line.decode("utf-8", errors="replace"))
+                self.log.debug("Logic STDERR: %s", line)
+            self.log.info("Logic stderr disconnected normally.")
         except:
             if not self.shutdown_event.is_set():
-                LOG.warning("Logic stderr disconnected unexpectedly", exc_info=True)
+                self.log.warning("Logic stderr disconnected unexpectedly", exc_info=True)
         finally:
-            loop.run_in_executor(self.executor, lambda: trace_file.close())
+            trace_file.close()
 
     async def send_to_logic_stdin(self, stdin):
-        LOG.info("Attached to logic stdin")
-        while True:
-            data: bytes = await self.to_logic_msg.get()
-            LOG.debug("Send data to logic: %s", data)
-            stdin.write(data)
-            await stdin.drain()
-            LOG.debug("Send complete")
-            self.to_logic_msg.task_done()
+        self.log.info("Attached to logic stdin")
+        try:
+            while True:
+                data: Union[bytes, StreamedMessage] = await self.to_logic_msg.get()
+                if isinstance(data, StreamedMessage):
+                    self.log.debug("Stream %d bytes of data to logic", data.size)
+                    try:
+                        await data.write_to(stdin)
+                    except ConnectionError:
+                        raise
+                    except OSError:
+                        # The spool file failed, the frame announced to the logic cannot be completed
+                        self.log.error("Cannot read the spooled AI message", exc_info=True)
+                        self.summary.appendInternalError()
+                        self.create_task(self.__shutdown())
+                        return
+                else:
+                    self.log.debug("Send data to logic: %s", data)
+                    stdin.write(data)
+                    await stdin.drain()
+                self.log.debug("Send complete")
+                self.to_logic_msg.task_done()
+        except ConnectionError:
+            # The logic exited, wait_logic_exit ends the game
+            self.log.warning("Logic stdin is closed")
 
     async def wait_logic_exit(self):
-        return_code = await self.logic_proc.wait()
+        return_code = await self.logic_process.wait()
         if self.game_running:
             if return_code == 0:
-                LOG.warning("Logic exit normally before game over")
+                self.log.warning("Logic exit normally before game over")
             else:
                 self.summary.appendLogicCrashed()
-                LOG.error("Logic crashed with exit code: %d", return_code)
+                self.log.error("Logic crashed with exit code: %d", return_code)
         self.fire_event({"type": JudgerEvent.GAME_OVER})
-        asyncio.create_task(self.__shutdown())
+        self.create_task(self.__shutdown())
 
     async def try_launch_logic(self):
-        if self.next_ai_index < self.player_count:
+        if self.next_ai_index < self.player_count or self.logic_launched:
             return
+        # Set before the first await, several connections may try to launch the logic at the same time
+        self.logic_launched = True
 
-        LOG.info("The number of players is sufficient. LINK START!")
-        self.logic_proc = await asyncio.create_subprocess_exec(
-            str(self.logic_path),
-            cwd=self.logic_path.parent,
-            stdin=asyncio.subprocess.PIPE,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            start_new_session=True
-        )
+        self.log.info("The number of players is sufficient. LINK START!")
+        if self.replay_fifo:
+            self.open_replay_fifo()
+        stdout = ChildOutput(LOGIC_HEADER)
+        try:
+            self.logic_process = await ManagedProcess.spawn(
+                "logic",
+                [str(self.logic_path)],
+                self.limits,
+                self.log,
+                self.cpu_affinity,
+                cwd=self.logic_path.parent,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=stdout.fileno(),
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True
+            )
+        except (OSError, subprocess.SubprocessError):
+            # SubprocessError when pinning or limiting the child failed, e.g. cores that are not available
+            self.log.error("Failed to launch logic: %s", self.logic_path, exc_info=True)
+            stdout.close()
+            self.summary.appendInternalError()
+            self.create_task(self.__shutdown())
+            return
+        except BaseException:
+            stdout.close()
+            raise
+        self.processes.append(self.logic_process)
+        logic_stdout = await stdout.connect()
+        self.streams.append(logic_stdout)
+        self.logic_proc = self.logic_process.proc
 
         self.summary.appendLogicBooted()
         self.game_running = True
         self.to_logic_msg = asyncio.Queue()
         await self.to_logic_msg.put(
-            Protocol.to_logic_init_info(
+            self.protocol.to_logic_init_info(
                 [1 for _ in range(self.player_count)],
                 self.config, self.replay_path
             )
@@ -156,59 +290,218 @@ class Judger:
 
         for task in [
             self.send_to_logic_stdin(self.logic_proc.stdin),
-            self.handle_logic_stdout(self.logic_proc.stdout),
+            self.handle_logic_stdout(logic_stdout),
             self.handle_logic_stderr(self.logic_proc.stderr),
             self.wait_logic_exit(),
         ]:
-            asyncio.create_task(task)
+            self.create_task(task)
 
-    # AI Handlers
-    async def read_from_ai(self, reader: asyncio.StreamReader, ai_id: int):
-        LOG.info("Attached to AI[id=%d] reader", ai_id)
+    def open_replay_fifo(self) -> None:
+        try:
+            if self.replay_path.exists():
+                self.replay_path.unlink()
+            os.mkfifo(self.replay_path)
+            read_fd = os.open(self.replay_path, os.O_RDONLY | os.O_NONBLOCK)
+            try:
+                # Holding a write end ourselves, the pipe only reaches EOF once the logic is gone
+                self.replay_keepalive = os.open(self.replay_path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError:
+                os.close(read_fd)
+                raise
+        except (OSError, AttributeError):
+            self.log.warning("Cannot capture the replay through a named pipe, it is written as usual", exc_info=True)
+            return
+        self.replay_capture = self.create_task(self.capture_replay(read_fd))
+
+    async def capture_replay(self, read_fd: int) -> None:
+        """
+        Gzip what the logic writes into replay.json as it arrives, into replay.json.gz.
+        The reader pauses the pipe when the compressor falls behind, so memory stays bounded.
+        """
+        import gzip
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=1024 * 1024)
+        transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader),
+                                                    os.fdopen(read_fd, "rb", buffering=0))
+        target = self.output_dir / (self.replay_path.name + ".gz")
+        sink = await loop.run_in_executor(self.executor, lambda: gzip.open(target, "wb"))
         try:
             while True:
-                pack_size: int = bytes2int(await reader.readexactly(4))
+                chunk = await reader.read(1024 * 1024)
+                if not chunk:
+                    break
+                await loop.run_in_executor(self.executor, sink.write, chunk)
+            self.log.info("Replay is saved to %s", target)
+        finally:
+            transport.close()
+            await loop.run_in_executor(self.executor, sink.close)
+            try:
+                self.replay_path.unlink()
+            except OSError:
+                pass
+
+    async def finish_replay_capture(self) -> None:
+        if self.replay_capture is None:
+            return
+        # Shutdown may run more than once, every run waits for the capture
+        if self.replay_keepalive >= 0:
+            os.close(self.replay_keepalive)
+            self.replay_keepalive = -1
+        _, pending = await asyncio.wait([self.replay_capture], timeout=self.process_grace)
+        if len(pending) > 0:
+            self.log.warning("Replay pipe is still open by a process, the replay may be incomplete")
+            self.replay_capture.cancel()
 
-                if pack_size > self.output_limit:
-                    self.on_ai_ole(ai_id)
-                else:
-                    data: bytes = await reader.readexactly(pack_size)
-                    LOG.debug("Received %d bytes of data from ai[id=%d]: %s", pack_size, ai_id, data)
-                    if self.listen_target.count(ai_id) == 0:
-                        LOG.warning("Received data from ai which is not listened")
+    # AI Handlers
+    async def launch_ais(self):
+        loop = asyncio.get_event_loop()
+        for ai_id, command in enumerate(self.ai_commands):
+            stderr_path = self.output_dir / f"ai{ai_id}_stderr.txt"
+            stderr_file: IO = await loop.run_in_executor(self.executor, lambda: open(stderr_path, "wb"))
+            stdout = ChildOutput()
+            try:
+                ai = await ManagedProcess.spawn(
+                    f"ai{ai_id}",
+                    shlex.split(command),
+                    self.limits,
+                    self.log,
+                    self.cpu_affinity,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=stdout.fileno(),
+                    stderr=stderr_file,
+                    start_new_session=True
+                )
+            except (OSError, subprocess.SubprocessError):
+                self.log.error("Failed to launch AI[id=%d]: %s", ai_id, command, exc_info=True)
+                stdout.close()
+                self.summary.appendInternalError()
+                self.create_task(self.__shutdown())
+                return
+            finally:
+                stderr_file.close()
+            self.processes.append(ai)
+            self.log.info("Launched AI[id=%d]: %s", ai_id, command)
+            await self.attach_ai(await stdout.connect(), ai.proc.stdin, ai_id)
+
+    async def read_from_ai(self, reader: FrameStream, ai_id: int):
+        self.log.info("Attached to AI[id=%d] reader", ai_id)
+        try:
+            while True:
+                # Frames above either limit are left unread by the decoder
+                for (pack_size,), data in await reader.read_frames(min(self.output_limit, self.stream_threshold)):
+                    if pack_size > self.output_limit:
+                        # The rest of the stream cannot be framed any more
+                        self.on_ai_ole(ai_id)
+                        return
+                    elif pack_size < 0:
+                        self.log.warning("AI[id=%d] sent a frame of negative size %d", ai_id, pack_size)
+                        if self.game_running:
+                            self.on_ai_re(ai_id)
+                        return
+                    elif data is None:
+                        await self.stream_from_ai(reader, ai_id, pack_size)
                     else:
-                        LOG.info("Received data from listened ai. Forwarding to logic.")
-                        elapsed_time = 1000 * (asyncio.get_running_loop().time() - self.round_begin_time)
-                        data = Protocol.to_logic_ai_normal_message(ai_id, data.decode('utf-8'), elapsed_time)
-                        asyncio.create_task(self.to_logic_msg.put(data))
+                        self.forward_ai_data(ai_id, data)
         except IncompleteReadError:
-            LOG.warning("Reader stream of AI[id=%d] is closed", ai_id)
+            self.log.warning("Reader stream of AI[id=%d] is closed", ai_id)
+            if self.game_running:
+                self.on_ai_re(ai_id)
+        except UnicodeDecodeError:
+            # Protocol v1 carries the content as a JSON string
+            self.log.warning("AI[id=%d] sent data that is not UTF-8", ai_id)
             if self.game_running:
                 self.on_ai_re(ai_id)
 
+    def forward_ai_data(self, ai_id: int, data: bytes) -> None:
+        self.log.debug("Received %d bytes of data from ai[id=%d]: %s", len(data), ai_id, data)
+        if self.listen_target.count(ai_id) == 0:
+            self.log.warning("Received data from ai which is not listened")
+            return
+        self.log.info("Received data from listened ai. Forwarding to logic.")
+        elapsed_time = self.ai_responded(ai_id, data)
+        data = self.protocol.to_logic_ai_normal_message(ai_id, data, elapsed_time)
+        self.create_task(self.to_logic_msg.put(data))
+
+    def ai_responded(self, ai_id: int, reply: Union[bytes, str]) -> float:
+        """
+        Report a complete answer of a listened AI, returns its elapsed time in milliseconds.
+        """
+        elapsed_time = 1000 * (asyncio.get_running_loop().time() - self.round_begin_time)
+        self.fire_event({"type": JudgerEvent.AI_RESPONDED, "ai_id": ai_id, "elapsed": elapsed_time})
+        if self.spectators is not None:
+            self.spectators.publish_ai_reply(self.state, ai_id, reply, elapsed_time)
+        return elapsed_time
+
+    async def stream_from_ai(self, reader: FrameStream, ai_id: int, pack_size: int):
+        """
+        Forward a large AI message without reading it into memory as a whole.
+        The content is spooled before it is announced to the logic, and is never logged.
+        """
+        if self.listen_target.count(ai_id) == 0:
+            self.log.warning("Received %d bytes of data from ai which is not listened", pack_size)
+            while pack_size > 0:
+                pack_size -= len(await reader.readexactly(min(pack_size, CHUNK_SIZE)))
+            return
+        self.log.info("Streaming %d bytes of data from listened ai[id=%d] to logic.", pack_size, ai_id)
+        content, size = await spool_ai_content(self.protocol, reader, pack_size, self.executor)
+        if self.listen_target.count(ai_id) == 0:
+            # The round ended while the content was arriving, e.g. with a timeout
+            self.log.warning("Dropped %d bytes of data from ai[id=%d] which is not listened any more",
+                             pack_size, ai_id)
+            content.close()
+            return
+        elapsed_time = self.ai_responded(ai_id, f"<{pack_size} bytes>")
+        message = stream_ai_message(self.protocol, ai_id, content, size, elapsed_time, self.executor)
+        self.create_task(self.to_logic_msg.put(message))
+        # Only one message of this AI is spooled at a time
+        await message.done
+
     async def write_to_ai(self, writer: asyncio.StreamWriter, ai_id: int):
-        LOG.info("Attached to AI[id=%d] writer", ai_id)
-        while True:
-            data: bytes = await self.to_ai_msg[ai_id].get()
-            LOG.debug("Send data to ai[id=%d]: %s", ai_id, data)
-            writer.write(data)
-            await writer.drain()
-            self.to_ai_msg[ai_id].task_done()
+        self.log.info("Attached to AI[id=%d] writer", ai_id)
+        try:
+            while True:
+                data: bytes = await self.to_ai_msg[ai_id].get()
+                self.log.debug("Send data to ai[id=%d]: %s", ai_id, data)
+                writer.write(data)
+                await writer.drain()
+                self.to_ai_msg[ai_id].task_done()
+        except ConnectionError:
+            # Reported by wait_ai_writer_closed
+            self.log.warning("Cannot write to AI[id=%d] any more", ai_id)
 
     async def wait_ai_writer_closed(self, writer: asyncio.StreamWriter, ai_id: int):
-        await writer.wait_closed()
-        LOG.warning("Writer stream of AI[id=%d] is closed", ai_id)
+        # For a launched AI this is the stdin close future of the subprocess protocol, which fails with
+        # InvalidStateError when the pipe closes after the future was cancelled together with this task
+        try:
+            await asyncio.shield(writer.wait_closed())
+        except ConnectionError:
+            # The pipe of a launched AI is broken when the AI exited first
+            pass
+        self.log.warning("Writer stream of AI[id=%d] is closed", ai_id)
         if self.game_running:
             self.on_ai_re(ai_id)
 
-    async def handle_ai_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
-        LOG.info("A new AI is connected")
-
-        # It is atomic operation?
-        ai_id = self.next_ai_index
+    def handle_ai_connection(self, stream: FrameStream):
+        self.log.info("A new AI is connected")
+        self.create_task(self.attach_ai(stream, stream))
+
+    async def attach_ai(self, reader: FrameStream, writer: Union[FrameStream, asyncio.StreamWriter],
+                        ai_id: Optional[int] = None) -> bool:
+        """
+        Seat an AI connection. Without ai_id the first free seat is taken.
+        Returns False and closes the connection if the seat is not available.
+        """
+        if ai_id is None:
+            ai_id = next((i for i, taken in enumerate(self.seats) if not taken), None)
+        if ai_id is None or not 0 <= ai_id < self.player_count or self.seats[ai_id]:
+            self.log.warning("Rejected an AI connection because seat %s is not available", ai_id)
+            writer.close()
+            return False
+        self.seats[ai_id] = True
+        self.streams.append(reader)
+        self.ai_writers.append(writer)
         self.summary.appendAiConnected(ai_id)
         self.next_ai_index = self.next_ai_index + 1
-        self.to_ai_msg.append(asyncio.Queue())
         self.fire_event({"type": JudgerEvent.AI_CONNECTED})
 
         for task in [
@@ -217,31 +510,32 @@ class Judger:
             self.write_to_ai(writer, ai_id),
             self.wait_ai_writer_closed(writer, ai_id),
         ]:
-            asyncio.create_task(task)
+            self.create_task(task)
+        return True
 
     def on_ai_ole(self, ai_id: int) -> None:
         self.game_running = False
-        LOG.warning("AI %d exceeded output limit %d", ai_id, self.output_limit)
-        asyncio.create_task(
-            self.to_logic_msg.put(Protocol.to_logic_ai_error(ai_id, self.state, AiErrorType.OutputLimitError)))
+        self.log.warning("AI %d exceeded output limit %d", ai_id, self.output_limit)
+        self.create_task(
+            self.to_logic_msg.put(self.protocol.to_logic_ai_error(ai_id, self.state, AiErrorType.OutputLimitError)))
         self.summary.appendAiOle(self.state, ai_id)
 
     def on_ai_re(self, ai_id: int) -> None:
         self.game_running = False
-        LOG.warning("AI %d disconnected unexpectedly", ai_id)
-        asyncio.create_task(self.to_logic_msg.put(Protocol.to_logic_ai_error(ai_id, self.state, AiErrorType.RunError)))
+        self.log.warning("AI %d disconnected unexpectedly", ai_id)
+        self.create_task(self.to_logic_msg.put(self.protocol.to_logic_ai_error(ai_id, self.state, AiErrorType.RunError)))
         self.summary.appendAiRe(self.state, ai_id)
 
     def on_ai_tle(self) -> None:
         self.game_running = False
         if len(self.listen_target) > 0:
             timeout_ai = self.listen_target[0]
-            LOG.warning("AI %d listen timeout", timeout_ai)
-            asyncio.create_task(
-                self.to_logic_msg.put(Protocol.to_logic_ai_error(timeout_ai, self.state, AiErrorType.TimeOutError)))
+            self.log.warning("AI %d listen timeout", timeout_ai)
+            self.create_task(
+                self.to_logic_msg.put(self.protocol.to_logic_ai_error(timeout_ai, self.state, AiErrorType.TimeOutError)))
             self.summary.appendAiTle(self.state, timeout_ai)
         elif self.game_running:
-            LOG.warning("Timeout but no listen target set. This may be an internal bug.")
+            self.log.warning("Timeout but no listen target set. This may be an internal bug.")
 
     # Handle state change
     def check_state_change(self, new_state: int) -> None:
@@ -253,13 +547,13 @@ class Judger:
             current_time = loop.time()
             if self.state == -1:
                 elapsed_time = 0
-                LOG.info("Enter next round %d", new_state)
+                self.log.info("Enter next round %d", new_state)
             else:
                 elapsed_time = current_time - self.round_begin_time
-                LOG.info("Enter next round %d. Last round took %f seconds.", new_state, elapsed_time)
+                self.log.info("Enter next round %d. Last round took %f seconds.", new_state, elapsed_time)
             self.state = new_state
             self.round_begin_time = current_time
-            self.fire_event({"type": JudgerEvent.NEW_ROUND})
+            self.fire_event({"type": JudgerEvent.NEW_ROUND, "round": new_state})
             self.summary.appendNewRound(self.state, elapsed_time)
 
     # Logic data handler
@@ -267,86 +561,205 @@ class Judger:
         if target_id == -1:
             # PyCharm bug which causes confusion on decorated function
             # noinspection PyTypeChecker
-            message = Protocol.from_logic_data(data)
+            try:
+                message = self.protocol.from_logic_data(data)
+            except ValueError:
+                self.log.error("Malformed logic data: %s. Ignoring.", data, exc_info=True)
+                return
             if isinstance(message, RoundConfig):
-                LOG.info("Round config received")
+                self.log.info("Round config received")
+                if message.length > 0 and message.length != self.output_limit:
+                    self.log.info("Reset output limit to %d bytes", message.length)
+                    self.output_limit = message.length
                 # if self.round_time_limit != message.time:
-                #     LOG.info("Reset round time limit to %s", message.time)
+                #     self.log.info("Reset round time limit to %s", message.time)
                 #     self.round_time_limit = message.time
-                # We currently ignore length limit
             elif isinstance(message, RoundInfo):
-                LOG.info("Normal round information received")
+                self.log.info("Normal round information received")
                 if len(message.player) != len(message.content):
-                    LOG.error("Player count %d is not equal to content count %d. "
-                              "Judger will ignore this message currently",
-                              len(message.player), len(message.content))
+                    self.log.error("Player count %d is not equal to content count %d. "
+                                   "Judger will ignore this message currently",
+                                   len(message.player), len(message.content))
+                    return
+                if not all(0 <= ai_id < self.player_count for ai_id in message.player):
+                    self.log.error("Invalid player %s in round information. Ignoring.", message.player)
                     return
                 self.check_state_change(message.state)
                 self.listen_target = message.listen
-                LOG.info("Now listening on player %s", str(self.listen_target))
-
-                for i in range(len(message.player)):
-                    ai_id = message.player[i]
-                    data = message.content[i].encode("utf-8")
-                    asyncio.create_task(self.to_ai_msg[ai_id].put(data))
+                self.log.info("Now listening on player %s", str(self.listen_target))
+                if self.spectators is not None:
+                    self.spectators.publish_round(message.state, message.listen, message.player, message.content)
+
+                # Identical contents are encoded once and the immutable buffer is shared by all AI writers
+                encoded: Dict[Union[str, bytes], bytes] = {}
+                for ai_id, content in zip(message.player, message.content):
+                    data = encoded.get(content)
+                    if data is None:
+                        data = encoded[content] = content.encode("utf-8") if isinstance(content, str) else content
+                    self.to_ai_msg[ai_id].put_nowait(data)
             elif type(message) == list:
-                LOG.info("Game over. Result: %s", str(message))
+                self.log.info("Game over. Result: %s", str(message))
+                self.game_running = False
                 self.summary.appendGameOver(message)
+                if self.spectators is not None:
+                    self.spectators.publish({"type": "game_over", "score": message})
                 self.fire_event({"type": JudgerEvent.GAME_OVER})
-                asyncio.create_task(self.__shutdown())
+                self.create_task(self.__shutdown())
             else:
-                LOG.error("Unrecognized logic data: %s. Ignoring.", data.decode("utf-8"))
+                self.log.error("Unrecognized logic data: %s. Ignoring.", data)
         elif list(range(self.player_count)).count(target_id):
-            LOG.info("Directly forwarding data to AI %d", target_id)
-            asyncio.create_task(self.to_ai_msg[target_id].put(data))
+            self.log.info("Directly forwarding data to AI %d", target_id)
+            self.create_task(self.to_ai_msg[target_id].put(data))
         else:
-            LOG.error("Invalid target id %d. Ignoring.", target_id)
+            self.log.error("Invalid target id %d. Ignoring.", target_id)
+
+    def create_task(self, coro) -> asyncio.Task:
+        """
+        Tasks of the judger are tracked, so that no task outlives the game when several judgers share a loop.
+        """
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
 
     def fire_event(self, event: dict):
-        if self.event_handler is not None:
-            asyncio.get_event_loop().run_in_executor(self.executor, lambda: self.event_handler(**event))
+        self.event_bus.publish(event)
 
-    def set_event_handler(self, handler):
-        self.event_handler = handler
+    def set_event_handler(self, handler: Optional[Callable]):
+        """
+        Legacy single handler API. The handler is called with every event in the executor.
+        Use event_bus.subscribe() for coalescing, rate limiting or batched delivery.
+        """
+        if self.event_handler is not None:
+            self.event_bus.unsubscribe(self.event_handler)
+            self.event_handler = None
+        if handler is not None:
+            self.event_handler = self.event_bus.subscribe(handler)
 
     # Main control
     async def run(self) -> JudgeSummary:
-        self.executor = concurrent.futures.ThreadPoolExecutor()
+        self.loop = asyncio.get_running_loop()
+        if self.own_executor:
+            self.executor = concurrent.futures.ThreadPoolExecutor()
         self.shutdown_event = asyncio.Event()
         self.summary = JudgeSummary()
-
-        server = await asyncio.start_server(self.handle_ai_connection, self.host, self.port)
-        addrs = ', '.join(str(sock.getsockname()) for sock in server.sockets)
-        self.fire_event({
-            "type": JudgerEvent.TCP_SERVER_STARTED,
-            "addr": addrs
-        })
-        LOG.info("Judger server is running at %s", addrs)
-        asyncio.create_task(server.serve_forever())
-
-        self.server = server
+        if self.cpu_affinity is not None:
+            self.summary.placement = list(self.cpu_affinity)
+            self.log.info("Processes of this game are pinned to cores %s", self.cpu_affinity)
+        self.to_ai_msg = [asyncio.Queue() for _ in range(self.player_count)]
+        self.event_bus.attach(self.executor)
+        if self.aborted:
+            # Aborted before it was started
+            self.summary.appendInternalError()
+            await self.__shutdown()
+            await self.release([])
+            return self.summary
+        if self.on_started is not None:
+            self.on_started()
+
+        if self.listen:
+            server = await self.loop.create_server(lambda: FrameStream(on_connected=self.handle_ai_connection),
+                                                   self.host, self.port)
+            addrs = ', '.join(str(sock.getsockname()) for sock in server.sockets)
+            self.fire_event({
+                "type": JudgerEvent.TCP_SERVER_STARTED,
+                "addr": addrs
+            })
+            self.log.info("Judger server is running at %s", addrs)
+            self.create_task(server.serve_forever())
+            self.server = server
         loop = asyncio.get_event_loop()
+        if self.spectators is not None:
+            observer_addrs = await self.spectators.start()
+            self.log.info("Spectators can watch the game at %s", observer_addrs)
+        await self.launch_ais()
 
         def signal_handler():
             self.summary.appendInternalError()
-            asyncio.create_task(self.__shutdown())
+            self.create_task(self.__shutdown())
 
-        if threading.current_thread() is threading.main_thread():
-            for s in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+        signals = []
+        if self.handle_signals and threading.current_thread() is threading.main_thread():
+            signals = [signal.SIGHUP, signal.SIGTERM, signal.SIGINT]
+            for s in signals:
                 loop.add_signal_handler(s, signal_handler)
 
-        await self.shutdown_event.wait()
+        try:
+            await self.shutdown_event.wait()
+        finally:
+            await self.release(signals)
         return self.summary
 
+    async def release(self, signals: List[int]):
+        """
+        Free everything the game holds, so that a judger leaves no task, thread, socket or handler behind.
+        """
+        loop = asyncio.get_running_loop()
+        for s in signals:
+            loop.remove_signal_handler(s)
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        for writer in self.ai_writers:
+            writer.close()
+        for stream in self.streams:
+            stream.close()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for process in self.processes:
+            if process.proc.returncode is None:
+                await process.stop(0)
+        if self.own_executor:
+            self.executor.shutdown(wait=False)
+
     def start(self) -> JudgeSummary:
         summary = asyncio.run(self.run())
-        LOG.info("SaibloLocalJudger is closed")
+        self.log.info("SaibloLocalJudger is closed")
         return summary
 
     def shutdown(self):
-        asyncio.create_task(self.__shutdown())
+        """
+        Can be called from any thread, e.g. the GUI.
+        """
+        if self.loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.create_task(self.__shutdown())
+        else:
+            self.loop.call_soon_threadsafe(lambda: self.create_task(self.__shutdown()))
+
+    def abort(self, reason: str):
+        """
+        Stop a game that cannot be played, e.g. because some AIs never connected.
+        """
+        self.log.error("Judger is aborted: %s", reason)
+        if self.loop is None:
+            # run() ends the game as soon as it starts
+            self.aborted = True
+            return
+        self.summary.appendInternalError()
+        self.shutdown()
+
+    async def stop_processes(self):
+        for process in self.processes:
+            # Launched AIs only wait for their stdin, the logic may still be writing its replay
+            if process is not self.logic_process and process.proc.stdin is not None:
+                process.proc.stdin.close()
+        await asyncio.gather(*(process.stop(self.process_grace) for process in self.processes))
+        self.summary.process_usage = [process.usage() for process in self.processes]
 
     async def __shutdown(self):
-        LOG.info("SaibloLocalJudger is shutting down")
-        self.server.close()
+        self.log.info("SaibloLocalJudger is shutting down")
+        if self.server is not None:
+            self.server.close()
+        await self.stop_processes()
+        await self.finish_replay_capture()
+        if self.spectators is not None:
+            await self.spectators.close()
+        await self.event_bus.close()
         self.shutdown_event.set()
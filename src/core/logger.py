@@ -9,6 +9,7 @@ def _init_logger():
     logger = logging.getLogger("SLJ Core")
     logger.setLevel(logging.DEBUG)
     ch = logging.StreamHandler(stream=sys.stdout)
+    ch.set_name("console")
     ch.setLevel(logging.INFO)
     ch.setFormatter(_formatter)
     logger.addHandler(ch)
@@ -18,10 +19,36 @@ def _init_logger():
 LOG = _init_logger()
 
 
+def file_handler(output_dir: Path) -> logging.FileHandler:
+    handler = logging.FileHandler(output_dir / "judger.log")
+    handler.set_name("file")
+    handler.setFormatter(_formatter)
+    handler.setLevel(logging.DEBUG)
+    return handler
+
+
+def console_handler() -> logging.Handler:
+    return next(handler for handler in LOG.handlers if handler.get_name() == "console")
+
+
+def close_log_output_file() -> None:
+    for handler in list(LOG.handlers):
+        if handler.get_name() == "file":
+            LOG.removeHandler(handler)
+            handler.close()
+
+
 def set_log_output_file(output_dir: Path) -> None:
-    file = output_dir / "judger.log"
-    file_handler = logging.FileHandler(file)
-    file_handler.setFormatter(_formatter)
-    file_handler.setLevel(logging.DEBUG)
-    LOG.addHandler(file_handler)
-    LOG.debug("Logging to file %s is successfully enabled", file)
+    """
+    Log into <output_dir>/judger.log. Replaces the file of a previous call instead of logging into both.
+    """
+    close_log_output_file()
+    handler = file_handler(output_dir)
+    LOG.addHandler(handler)
+    LOG.debug("Logging to file %s is successfully enabled", handler.baseFilename)
+
+
+def set_console_level(level: int) -> None:
+    for handler in LOG.handlers:
+        if handler.get_name() == "console":
+            handler.setLevel(level)
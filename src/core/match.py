@@ -0,0 +1,87 @@
+import asyncio
+import dataclasses
+from pathlib import Path
+from typing import Callable, List, Optional, TYPE_CHECKING
+
+from .judger import Judger
+from .process import ResourceLimits
+from .logger import LOG
+from .summary import JudgeSummary, JudgeState
+
+if TYPE_CHECKING:
+    from .result_cache import ResultCache
+
+
+@dataclasses.dataclass
+class MatchSpec:
+    """
+    Everything needed to run one game without user interaction.
+    All AIs are launched by the judger with ai_commands, in seat order.
+    seed is not interpreted by the judger. It identifies the randomness of a match for callers,
+    e.g. when it is also written into config.
+    """
+    match_id: str
+    logic_path: str
+    player_count: int
+    ai_commands: List[str]
+    output: str
+    config: object = dataclasses.field(default_factory=dict)
+    protocol_version: int = 1
+    seed: Optional[int] = None
+    limits: Optional[ResourceLimits] = None
+
+    def to_judger_config(self) -> dict:
+        return {
+            "port": 0,
+            # Every seat is launched by the judger, nobody needs to connect
+            "listen": len(self.ai_commands) < self.player_count,
+            "player_count": self.player_count,
+            "config": self.config,
+            "output": Path(self.output),
+            "logic_path": Path(self.logic_path).absolute(),
+            "protocol_version": self.protocol_version,
+            "ai_commands": self.ai_commands,
+            "limits": self.limits,
+            "handle_signals": False
+        }
+
+    def to_dict(self) -> dict:
+        return dataclasses.asdict(self)
+
+    @staticmethod
+    def from_dict(data: dict) -> "MatchSpec":
+        data = dict(data)
+        if data.get("limits") is not None:
+            data["limits"] = ResourceLimits(**data["limits"])
+        return MatchSpec(**data)
+
+
+async def run_match(spec: MatchSpec, cache: Optional["ResultCache"] = None, force: bool = False,
+                    setup: Optional[Callable[[Judger], None]] = None, **options) -> JudgeSummary:
+    """
+    Run a match in the current event loop. Several matches can run concurrently in one loop.
+    Extra options are passed to the Judger and override the config derived from the spec.
+    setup is called with the Judger before it runs, e.g. to subscribe to its events.
+    With a result cache, a known match returns the stored result unless force is set.
+    Only finished games are stored, failures to run are always retried.
+    """
+    output = Path(spec.output)
+    output.mkdir(parents=True, exist_ok=True)
+    loop = asyncio.get_running_loop()
+    executor = options.get("executor")
+    log = options.get("logger") or LOG
+    key = None
+    if cache is not None:
+        key = await loop.run_in_executor(executor, cache.match_key, spec)
+        if not force:
+            summary = await loop.run_in_executor(executor, cache.get, key, output)
+            if summary is not None:
+                log.info("Match %s is answered by the result cache", spec.match_id)
+                return summary
+    judger = Judger(**dict(spec.to_judger_config(), **options))
+    if setup is not None:
+        setup(judger)
+    summary = await judger.run()
+    if key is not None and summary.final_state == JudgeState.GAME_OVER:
+        await loop.run_in_executor(executor, cache.put, key, summary, output)
+    return summary
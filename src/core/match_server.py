@@ -0,0 +1,147 @@
+import asyncio
+import json
+import secrets
+from typing import Dict, List, Optional, Set
+
+from .framing import FrameStream
+from .judger import Judger
+from .logger import LOG
+from .summary import JudgeSummary
+from .utils import bytes2int
+
+# Handshakes are tiny, anything larger is not an AI of ours
+_MAX_HANDSHAKE_SIZE = 1024
+
+
+class HostedMatch:
+    """
+    A match registered on a MatchServer. Seat i is taken by the connection presenting tokens[i].
+    """
+    match_id: str
+    judger: Judger
+    tokens: List[str]
+
+    def __init__(self, match_id: str, judger: Judger):
+        self.match_id = match_id
+        self.judger = judger
+        self.tokens = [secrets.token_urlsafe(12) for _ in range(judger.player_count)]
+        self.ready = asyncio.Event()
+
+    def seat_of(self, token: str) -> Optional[int]:
+        # compare_digest only takes ASCII strings, the token comes from the network
+        token = token.encode("utf-8", errors="replace")
+        for seat, expected in enumerate(self.tokens):
+            if secrets.compare_digest(expected.encode("ascii"), token):
+                return seat
+        return None
+
+
+class MatchServer:
+    """
+    One listening port shared by many concurrent matches.
+    Every AI starts with a handshake frame naming its match and seat token, and is then routed to the Judger of
+    that match on the seat bound to the token, regardless of the order of connections.
+    Matches whose seats are not all taken within seat_timeout are aborted, finished matches are unregistered.
+    A connection waits at most seat_timeout for its match to be run.
+    """
+    host: str
+    port: int
+    handshake_timeout: float
+    seat_timeout: float
+    matches: Dict[str, HostedMatch]
+    server: Optional[asyncio.AbstractServer]
+
+    def __init__(self, host: str = "localhost", port: int = 0, handshake_timeout: float = 10,
+                 seat_timeout: float = 60):
+        self.host = host
+        self.port = port
+        self.handshake_timeout = handshake_timeout
+        self.seat_timeout = seat_timeout
+        self.matches = {}
+        self.server = None
+        self.handshakes: Set[asyncio.Task] = set()
+
+    async def start(self) -> str:
+        loop = asyncio.get_running_loop()
+        self.server = await loop.create_server(lambda: FrameStream(on_connected=self.accept), self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        addrs = ', '.join(str(sock.getsockname()) for sock in self.server.sockets)
+        LOG.info("Match server is running at %s", addrs)
+        return addrs
+
+    async def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for task in list(self.handshakes):
+            task.cancel()
+        for match in list(self.matches.values()):
+            match.judger.abort("match server is closed")
+
+    def open_match(self, judger: Judger, match_id: Optional[str] = None) -> HostedMatch:
+        """
+        Register a judger created with listen=False. Give each AI the match id and its seat token,
+        then await run_match().
+        """
+        match_id = match_id or secrets.token_hex(8)
+        if match_id in self.matches:
+            LOG.error("Match %s is already hosted", match_id)
+            raise ValueError(match_id)
+        match = HostedMatch(match_id, judger)
+        self.matches[match_id] = match
+        return match
+
+    async def run_match(self, match: HostedMatch) -> JudgeSummary:
+        # Connections are only seated once the judger is initialized
+        match.judger.on_started = match.ready.set
+        watchdog = asyncio.create_task(self.__watch_seats(match))
+        try:
+            return await match.judger.run()
+        finally:
+            watchdog.cancel()
+            self.matches.pop(match.match_id, None)
+            # Handshakes still waiting find the match gone
+            match.ready.set()
+
+    async def __watch_seats(self, match: HostedMatch) -> None:
+        await asyncio.sleep(self.seat_timeout)
+        if not all(match.judger.seats):
+            match.judger.abort(f"only {sum(match.judger.seats)}/{match.judger.player_count} AIs of match "
+                               f"{match.match_id} connected in {self.seat_timeout} seconds")
+
+    def accept(self, stream: FrameStream) -> None:
+        task = asyncio.ensure_future(self.handle_connection(stream))
+        self.handshakes.add(task)
+        task.add_done_callback(self.handshakes.discard)
+
+    async def handle_connection(self, stream: FrameStream):
+        try:
+            size = bytes2int(await asyncio.wait_for(stream.readexactly(4), self.handshake_timeout))
+            if not 0 < size <= _MAX_HANDSHAKE_SIZE:
+                raise ValueError(f"handshake size {size}")
+            handshake = json.loads(await asyncio.wait_for(stream.readexactly(size), self.handshake_timeout))
+            match_id, token = str(handshake["match"]), str(handshake["token"])
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, KeyError, TypeError) as e:
+            LOG.warning("Rejected a connection with invalid handshake: %s", e)
+            stream.close()
+            return
+        match = self.matches.get(match_id)
+        seat = match.seat_of(token) if match is not None else None
+        if seat is None:
+            LOG.warning("Rejected a connection for match %s with unknown match or token", match_id)
+            stream.close()
+            return
+        try:
+            # A match that is opened but never run must not hold the connection
+            await asyncio.wait_for(match.ready.wait(), self.seat_timeout)
+        except asyncio.TimeoutError:
+            LOG.warning("Rejected a connection for match %s which did not start in %s seconds",
+                        match_id, self.seat_timeout)
+            stream.close()
+            return
+        if self.matches.get(match_id) is not match:
+            LOG.warning("Rejected a connection for match %s which is already over", match_id)
+            stream.close()
+            return
+        LOG.info("AI of match %s is connected on seat %d", match_id, seat)
+        await match.judger.attach_ai(stream, stream, seat)
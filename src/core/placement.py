@@ -0,0 +1,106 @@
+import asyncio
+import contextlib
+import os
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Set
+
+from .exception import JudgerIllegalState
+from .logger import LOG
+
+_CPU_ROOT = Path("/sys/devices/system/cpu")
+
+
+def pinning_supported() -> bool:
+    return hasattr(os, "sched_setaffinity")
+
+
+def available_cores() -> List[int]:
+    """
+    Cores this process may run on, ordered so that neighbours share as much as possible: the cores of a package
+    come together and hyper-threads of a physical core are adjacent.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+
+    def topology(core: int):
+        try:
+            base = _CPU_ROOT / f"cpu{core}" / "topology"
+            return int((base / "physical_package_id").read_text()), int((base / "core_id").read_text()), core
+        except (OSError, ValueError):
+            return 0, core, core
+
+    return sorted(cores, key=topology)
+
+
+class CorePool:
+    """
+    Hands out disjoint sets of `per_match` cores, one per running match, so that the processes of concurrent
+    matches do not compete for cores or migrate between them. A match waits until a set is free, so the count of
+    running matches is limited to the cores available. Sets are taken from adjacent cores in topology order
+    whenever possible.
+    """
+    cores: List[int]
+    per_match: int
+
+    def __init__(self, per_match: int, cores: Optional[List[int]] = None):
+        self.cores = cores if cores is not None else available_cores()
+        self.per_match = per_match
+        if per_match < 1 or per_match > len(self.cores):
+            LOG.error("Cannot pin matches to %d cores, %d cores are available", per_match, len(self.cores))
+            raise JudgerIllegalState
+        if not pinning_supported():
+            LOG.warning("This platform cannot pin processes to cores, matches are only limited to %d at a time",
+                        self.capacity)
+        self.free: Set[int] = set(self.cores)
+        self.waiters: List[asyncio.Future] = []
+
+    @property
+    def capacity(self) -> int:
+        return len(self.cores) // self.per_match
+
+    def take(self) -> Optional[List[int]]:
+        """
+        A set of free cores, preferably adjacent, or None when not enough cores are free.
+        """
+        if len(self.free) < self.per_match:
+            return None
+        run: List[int] = []
+        for core in self.cores:
+            run = run + [core] if core in self.free else []
+            if len(run) == self.per_match:
+                break
+        else:
+            run = [core for core in self.cores if core in self.free][:self.per_match]
+        self.free.difference_update(run)
+        return run
+
+    async def acquire(self) -> List[int]:
+        while True:
+            cores = self.take()
+            if cores is not None:
+                return cores
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                self.waiters.remove(waiter)
+
+    def release(self, cores: List[int]) -> None:
+        """
+        Synchronous, so that a cancelled match cannot keep its cores.
+        """
+        self.free.update(cores)
+        for waiter in self.waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    @contextlib.asynccontextmanager
+    async def slot(self) -> AsyncIterator[List[int]]:
+        cores = await self.acquire()
+        try:
+            yield cores
+        finally:
+            self.release(cores)
@@ -0,0 +1,145 @@
+import asyncio
+import concurrent.futures
+import dataclasses
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from .logger import LOG
+from .summary import JudgeSummary, JudgeState
+
+MANIFEST = "manifest.json"
+# Kept readable, they are small and read by other tools
+_UNCOMPRESSED = {MANIFEST, "summary.json"}
+
+
+def process_match(directory: str, summary: dict, compress: bool = True, level: int = 6) -> dict:
+    """
+    Write the manifest of a finished match, gzipping its artifacts in place first when compress is set.
+    Runs in a worker process.
+    """
+    root = Path(directory)
+    files = {}
+    for path in sorted(root.iterdir()):
+        if not path.is_file() or path.name in _UNCOMPRESSED:
+            continue
+        sha = hashlib.sha256()
+        size = path.stat().st_size
+        if path.suffix == ".gz" or not compress:
+            target = path
+            with path.open("rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    sha.update(chunk)
+        else:
+            target = path.with_name(path.name + ".gz")
+            with path.open("rb") as source, gzip.open(target, "wb", compresslevel=level) as sink:
+                for chunk in iter(lambda: source.read(1024 * 1024), b""):
+                    sha.update(chunk)
+                    sink.write(chunk)
+            path.unlink()
+        files[path.name] = {"file": target.name, "size": size, "stored_size": target.stat().st_size,
+                            "sha256": sha.hexdigest()}
+    manifest = {
+        "match": root.name,
+        "finished": time.time(),
+        "final_state": summary["final_state"],
+        "final_score": summary["final_score"],
+        "total_round": summary["total_round"],
+        "total_time": summary["total_time"],
+        "files": files,
+        "stored_size": sum(f["stored_size"] for f in files.values())
+    }
+    tmp = root / (MANIFEST + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, root / MANIFEST)
+    return manifest
+
+
+@dataclasses.dataclass
+class RetentionPolicy:
+    """
+    Which processed match directories under a root to keep. Only directories with a manifest are ever removed.
+    failures_only: remove matches that ended with GAME_OVER
+    keep_last: keep the newest N matches
+    max_size: remove the oldest matches until the stored artifacts take at most max_size bytes
+    """
+    keep_last: Optional[int] = None
+    failures_only: bool = False
+    max_size: Optional[int] = None
+
+    def is_empty(self) -> bool:
+        return self.keep_last is None and not self.failures_only and self.max_size is None
+
+    def apply(self, root: str) -> List[str]:
+        """
+        Runs in a worker process. Returns the removed directories.
+        """
+        entries = []
+        for path in Path(root).iterdir():
+            try:
+                manifest = json.loads((path / MANIFEST).read_text())
+                entries.append((manifest["finished"], manifest, path))
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+        # Newest first
+        entries.sort(key=lambda entry: entry[0], reverse=True)
+        kept, removed = [], []
+        for _, manifest, path in entries:
+            if self.failures_only and manifest["final_state"] == JudgeState.GAME_OVER.name:
+                removed.append(path)
+            elif self.keep_last is not None and len(kept) >= self.keep_last:
+                removed.append(path)
+            else:
+                kept.append((manifest, path))
+        if self.max_size is not None:
+            total = sum(manifest["stored_size"] for manifest, _ in kept)
+            while total > self.max_size and len(kept) > 0:
+                manifest, path = kept.pop()
+                total -= manifest["stored_size"]
+                removed.append(path)
+        for path in removed:
+            shutil.rmtree(path, ignore_errors=True)
+        return [str(path) for path in removed]
+
+
+class PostGamePipeline:
+    """
+    Work done after each game in a process pool, away from the event loop running the games:
+    artifacts are gzipped in place (unless compress is off) and described by a manifest.json,
+    then the retention policy is applied to root, the directory holding the match directories.
+    """
+    root: Path
+    policy: RetentionPolicy
+    compress: bool
+
+    def __init__(self, root: Path, policy: Optional[RetentionPolicy] = None, compress: bool = True,
+                 max_workers: Optional[int] = None):
+        self.root = root
+        self.policy = policy or RetentionPolicy()
+        self.compress = compress
+        # Forked workers would inherit the pipes and sockets of running games and keep them open
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers, multiprocessing.get_context("spawn"))
+        self.retention_lock: Optional[asyncio.Lock] = None
+
+    async def process(self, directory: Path, summary: JudgeSummary) -> None:
+        loop = asyncio.get_running_loop()
+        manifest = await loop.run_in_executor(self.executor, process_match, str(directory), summary.to_dict(),
+                                              self.compress)
+        LOG.debug("Artifacts of %s take %d bytes", directory, manifest["stored_size"])
+        if not self.policy.is_empty():
+            if self.retention_lock is None:
+                self.retention_lock = asyncio.Lock()
+            # Concurrent passes would see each other's half removed directories
+            async with self.retention_lock:
+                removed = await loop.run_in_executor(self.executor, self.policy.apply, str(self.root))
+            for path in removed:
+                LOG.info("Removed match output %s by retention policy", path)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
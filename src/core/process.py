@@ -0,0 +1,353 @@
+import asyncio
+import dataclasses
+import itertools
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import List, Optional, Union
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .logger import LOG
+from .summary import ProcessUsage
+
+_CGROUP_ROOT = Path("/sys/fs/cgroup")
+_cgroup_counter = itertools.count()
+_JUDGER_LEAF = "slj-judger"
+# The fallback to rlimits is the same for every process, it is reported once
+_rlimit_fallback_warned = False
+
+
+@dataclasses.dataclass
+class ResourceLimits:
+    """
+    Optional limits applied to every process launched by the judger. None means unlimited.
+    memory: address space in bytes (RLIMIT_AS), and memory.max when a cgroup is available
+    cpu_time: CPU time in seconds (RLIMIT_CPU)
+    processes: process count (RLIMIT_NPROC counts all processes of the user, pids.max is exact)
+    open_files: open file descriptors (RLIMIT_NOFILE)
+    """
+    memory: Optional[int] = None
+    cpu_time: Optional[int] = None
+    processes: Optional[int] = None
+    open_files: Optional[int] = None
+    use_cgroup: bool = True
+
+    def is_empty(self) -> bool:
+        return all(x is None for x in (self.memory, self.cpu_time, self.processes, self.open_files))
+
+    def apply_rlimits(self) -> None:
+        """
+        Called in the child process before exec. Must not log or allocate much.
+        """
+        for limit, value in ((resource.RLIMIT_AS, self.memory),
+                             (resource.RLIMIT_CPU, self.cpu_time),
+                             (resource.RLIMIT_NPROC, self.processes),
+                             (resource.RLIMIT_NOFILE, self.open_files)):
+            if value is not None:
+                resource.setrlimit(limit, (value, value))
+
+
+def _fall_back_to_rlimits(name: str, reason: str) -> None:
+    global _rlimit_fallback_warned
+    if _rlimit_fallback_warned:
+        LOG.debug("cgroups v2 is not available for %s, falling back to rlimits", name)
+        return
+    _rlimit_fallback_warned = True
+    LOG.warning("cgroups v2 is not available (%s), falling back to rlimits: the memory limit only bounds the "
+                "address space of each process and the process limit counts every process of the user", reason)
+
+
+class CgroupScope:
+    """
+    A cgroups v2 leaf group holding a single launched process (and everything it forks).
+    Only usable when the judger runs inside a delegated cgroups v2 hierarchy.
+    """
+    path: Path
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    @staticmethod
+    def create(name: str, limits: ResourceLimits) -> Optional["CgroupScope"]:
+        """
+        Scopes are created next to the group of the judger. A group that hands controllers to its children may not
+        hold processes itself, so the judger first moves into a leaf group of its own, `slj-judger`.
+        """
+        try:
+            if not (_CGROUP_ROOT / "cgroup.controllers").exists():
+                _fall_back_to_rlimits(name, "cgroups v2 is not mounted")
+                return None
+            with open("/proc/self/cgroup") as f:
+                own = _CGROUP_ROOT / next(line[3:].strip() for line in f if line.startswith("0::")).lstrip("/")
+            parent = own.parent if own.name == _JUDGER_LEAF else own
+            wanted = [c for c, v in (("memory", limits.memory), ("pids", limits.processes)) if v is not None]
+            enabled = (parent / "cgroup.subtree_control").read_text().split()
+            missing = [c for c in wanted if c not in enabled]
+            if len(missing) > 0:
+                # The root group is exempt from the rule
+                if parent == own and own != _CGROUP_ROOT:
+                    leaf = parent / _JUDGER_LEAF
+                    leaf.mkdir(exist_ok=True)
+                    (leaf / "cgroup.procs").write_text(str(os.getpid()))
+                (parent / "cgroup.subtree_control").write_text(" ".join("+" + c for c in missing))
+            path = parent / f"slj-{os.getpid()}-{name}-{next(_cgroup_counter)}"
+            path.mkdir()
+            scope = CgroupScope(path)
+            try:
+                if limits.memory is not None:
+                    (path / "memory.max").write_text(str(limits.memory))
+                    # Missing when swap accounting is off
+                    if (path / "memory.swap.max").exists():
+                        (path / "memory.swap.max").write_text("0")
+                if limits.processes is not None:
+                    (path / "pids.max").write_text(str(limits.processes))
+            except OSError:
+                scope.remove()
+                raise
+            return scope
+        except (OSError, StopIteration) as e:
+            LOG.debug("Cannot create a cgroup for %s", name, exc_info=True)
+            _fall_back_to_rlimits(name, repr(e))
+            return None
+
+    def join(self) -> None:
+        """
+        Called in the child process before exec, so no descendant can escape the group.
+        """
+        with open(self.path / "cgroup.procs", "w") as f:
+            f.write(str(os.getpid()))
+
+    def read_usage(self) -> (int, float):
+        peak_rss = 0
+        cpu_time = 0
+        try:
+            peak_rss = int((self.path / "memory.peak").read_text()) // 1024
+        except (OSError, ValueError):
+            pass
+        try:
+            for line in (self.path / "cpu.stat").read_text().splitlines():
+                key, value = line.split()
+                if key == "usage_usec":
+                    cpu_time = int(value) / 1e6
+        except (OSError, ValueError):
+            pass
+        return peak_rss, cpu_time
+
+    def remove(self) -> None:
+        try:
+            self.path.rmdir()
+        except OSError:
+            LOG.debug("Failed to remove cgroup %s", self.path, exc_info=True)
+
+
+class ReapedProcess:
+    """
+    A child started with subprocess.Popen and reaped by os.wait4 in a thread of its own, like the threaded child
+    watcher of asyncio does with waitpid, so that its exact resource usage is known once it exits.
+    Offers the part of asyncio.subprocess.Process the judger uses.
+    """
+    pid: int
+    returncode: Optional[int]
+    cpu_time: Optional[float]
+    peak_rss: Optional[int]
+    stdin: Optional[asyncio.StreamWriter]
+    stderr: Optional[asyncio.StreamReader]
+
+    def __init__(self, popen: subprocess.Popen):
+        self.popen = popen
+        self.pid = popen.pid
+        self.returncode = None
+        self.cpu_time = None
+        self.peak_rss = None
+        # The peak RSS of a child counts the memory of the judger before exec, see __exit
+        self.parent_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stdin = None
+        self.stderr = None
+        loop = asyncio.get_running_loop()
+        self.exited = loop.create_future()
+        threading.Thread(target=self.__reap, args=(loop,), name=f"slj-reaper-{self.pid}", daemon=True).start()
+
+    @staticmethod
+    async def start(args: List[str], **kwargs) -> "ReapedProcess":
+        loop = asyncio.get_running_loop()
+        popen = subprocess.Popen(args, bufsize=0, **kwargs)
+        proc = ReapedProcess(popen)
+        try:
+            if popen.stdin is not None:
+                protocol = asyncio.StreamReaderProtocol(asyncio.StreamReader())
+                transport, _ = await loop.connect_write_pipe(lambda: protocol, popen.stdin)
+                proc.stdin = asyncio.StreamWriter(transport, protocol, None, loop)
+            if popen.stderr is not None:
+                reader = asyncio.StreamReader()
+                await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), popen.stderr)
+                proc.stderr = reader
+        except BaseException:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+            for pipe in (popen.stdin, popen.stderr):
+                if pipe is not None:
+                    pipe.close()
+            raise
+        return proc
+
+    async def wait(self) -> int:
+        return await asyncio.shield(self.exited)
+
+    def kill(self) -> None:
+        if self.returncode is None:
+            os.kill(self.pid, signal.SIGKILL)
+
+    def __reap(self, loop: asyncio.AbstractEventLoop) -> None:
+        try:
+            _, status, rusage = os.wait4(self.pid, 0)
+            if os.WIFSIGNALED(status):
+                return_code = -os.WTERMSIG(status)
+            else:
+                return_code = os.WEXITSTATUS(status)
+        except ChildProcessError:
+            # Reaped by someone else, the status is lost
+            return_code, rusage = 255, None
+        try:
+            loop.call_soon_threadsafe(self.__exit, return_code, rusage)
+        except RuntimeError:
+            # The loop is closed
+            pass
+
+    def __exit(self, return_code: int, rusage) -> None:
+        self.returncode = self.popen.returncode = return_code
+        if rusage is not None:
+            self.cpu_time = rusage.ru_utime + rusage.ru_stime
+            # Above the peak of the judger when forking, it can only be the peak of the child. Otherwise it is unknown.
+            if rusage.ru_maxrss > self.parent_peak:
+                # Bytes on macOS, KiB elsewhere
+                self.peak_rss = rusage.ru_maxrss // 1024 if sys.platform == "darwin" else rusage.ru_maxrss
+        if not self.exited.done():
+            self.exited.set_result(return_code)
+
+
+class ManagedProcess:
+    """
+    A process launched by the judger with optional resource limits and usage accounting.
+    Peak RSS and CPU time are read from the cgroup when available. Otherwise CPU time comes from os.wait4, and so does
+    peak RSS if the figure is above the peak of the judger, which it includes. Else peak RSS is sampled from /proc.
+    """
+    name: str
+    proc: Union[asyncio.subprocess.Process, ReapedProcess]
+    cgroup: Optional[CgroupScope]
+    peak_rss: int
+    cpu_time: float
+    sample_interval: float = 0.2
+
+    def __init__(self, name: str, proc: Union[asyncio.subprocess.Process, ReapedProcess],
+                 cgroup: Optional[CgroupScope], log: logging.Logger = LOG):
+        self.name = name
+        self.log = log
+        self.proc = proc
+        self.cgroup = cgroup
+        self.peak_rss = 0
+        self.cpu_time = 0
+        self.sampler = asyncio.create_task(self.__sample_loop())
+        self.exited = asyncio.create_task(self.__wait())
+
+    @staticmethod
+    async def spawn(name: str, args: List[str], limits: Optional[ResourceLimits] = None,
+                    log: logging.Logger = LOG, affinity: Optional[List[int]] = None, **kwargs) -> "ManagedProcess":
+        """
+        affinity pins the process, and everything it starts, to these cores.
+        Failures of the setup in the child raise subprocess.SubprocessError, failures to execute it OSError.
+        """
+        cgroup = None
+        limited = limits is not None and not limits.is_empty() and resource is not None
+        if affinity is not None and not hasattr(os, "sched_setaffinity"):
+            affinity = None
+        if limited and limits.use_cgroup:
+            cgroup = CgroupScope.create(name, limits)
+
+        def setup_child():
+            # Before exec, so that no thread of the program starts elsewhere
+            if affinity is not None:
+                os.sched_setaffinity(0, affinity)
+            if cgroup is not None:
+                cgroup.join()
+            if limited:
+                limits.apply_rlimits()
+
+        preexec = setup_child if limited or affinity is not None else None
+        try:
+            if hasattr(os, "wait4"):
+                proc = await ReapedProcess.start(args, preexec_fn=preexec, **kwargs)
+            else:
+                proc = await asyncio.create_subprocess_exec(*args, preexec_fn=preexec, **kwargs)
+        except BaseException:
+            if cgroup is not None:
+                cgroup.remove()
+            raise
+        log.debug("Launched %s[pid=%d]: %s", name, proc.pid, args)
+        return ManagedProcess(name, proc, cgroup, log)
+
+    async def wait(self) -> int:
+        return await asyncio.shield(self.exited)
+
+    async def stop(self, grace: float) -> None:
+        """
+        Wait the process to exit by itself for at most `grace` seconds, then kill its whole session.
+        """
+        if self.exited.done():
+            return
+        try:
+            await asyncio.wait_for(self.wait(), grace)
+        except asyncio.TimeoutError:
+            self.log.warning("%s[pid=%d] did not exit in %.1f seconds, killing it", self.name, self.proc.pid, grace)
+            try:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            except (OSError, AttributeError):
+                try:
+                    self.proc.kill()
+                except ProcessLookupError:
+                    # It exited meanwhile
+                    pass
+            await self.wait()
+
+    def usage(self) -> ProcessUsage:
+        return ProcessUsage(self.name, self.proc.pid, self.peak_rss, self.cpu_time, self.proc.returncode)
+
+    async def __wait(self) -> int:
+        return_code = await self.proc.wait()
+        self.sampler.cancel()
+        if isinstance(self.proc, ReapedProcess):
+            if self.proc.cpu_time is not None:
+                self.cpu_time = self.proc.cpu_time
+            if self.proc.peak_rss is not None:
+                self.peak_rss = max(self.peak_rss, self.proc.peak_rss)
+        if self.cgroup is not None:
+            peak_rss, cpu_time = self.cgroup.read_usage()
+            self.peak_rss = max(self.peak_rss, peak_rss)
+            self.cpu_time = max(self.cpu_time, cpu_time)
+            self.cgroup.remove()
+        return return_code
+
+    async def __sample_loop(self) -> None:
+        proc_dir = Path("/proc") / str(self.proc.pid)
+        clock_ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        while True:
+            try:
+                for line in (proc_dir / "status").read_text().splitlines():
+                    if line.startswith("VmHWM:"):
+                        self.peak_rss = max(self.peak_rss, int(line.split()[1]))
+                        break
+                # Fields after the command name, which may contain spaces
+                stat = (proc_dir / "stat").read_text().rsplit(")", 1)[1].split()
+                self.cpu_time = max(self.cpu_time, (int(stat[11]) + int(stat[12])) / clock_ticks)
+            except (OSError, ValueError, IndexError):
+                return
+            await asyncio.sleep(self.sample_interval)
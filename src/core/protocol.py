@@ -1,10 +1,12 @@
 import functools
 import json
+import struct
 from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
-from typing import Callable, Union, List, TypeVar
+from typing import Callable, Union, List, Tuple, TypeVar, Type
 
+from .exception import JudgerIllegalState
 from .logger import LOG
 from .utils import int2bytes
 
@@ -21,7 +23,7 @@ class RoundInfo:
     state: int
     listen: List[int]
     player: List[int]
-    content: List[str]
+    content: List[Union[str, bytes]]
 
 
 class AiErrorType(Enum):
@@ -32,7 +34,7 @@ class AiErrorType(Enum):
 
 EndInfo = List[int]
 
-ValueAccessor = Callable[[str], any]
+ValueAccessor = Callable[..., any]
 
 T = TypeVar('T')
 
@@ -42,12 +44,18 @@ def json_object_receiver(desc):
         @functools.wraps(func)
         def wrapper(data: bytes) -> T:
             json_obj = json.loads(data.decode("utf-8"))
+            if not isinstance(json_obj, dict):
+                LOG.error("The %s is not a JSON object", desc)
+                raise ValueError
 
-            def value(key: str) -> any:
+            def value(key: str, kind: Union[type, Tuple[type, ...]] = object) -> any:
                 v = json_obj.get(key)
                 if v is None:
                     LOG.error("Missing [%s] in %s", key, desc)
                     raise ValueError
+                if not isinstance(v, kind):
+                    LOG.error("Unexpected type of [%s] in %s", key, desc)
+                    raise ValueError
                 return v
 
             return func(value)
@@ -73,14 +81,19 @@ class Protocol:
     to_xxx methods will append the package size information
     from_xxx methods should accept data without the size information
     In fact you can directly pass away the bytes across current designed classes
+    Round information may carry a single string as content, which is then sent to every player in the list
     """
 
     @staticmethod
     @json_object_receiver("logic data")
     def from_logic_data(value: ValueAccessor) -> Union[RoundConfig, RoundInfo, EndInfo]:
-        if value("state") == -1:
-            end_info: str = value("end_info")
+        state: int = value("state", int)
+        if state == -1:
+            end_info: str = value("end_info", str)
             end_info_obj = json.loads(end_info)
+            if not isinstance(end_info_obj, dict):
+                LOG.error("The end info is not a JSON object")
+                raise ValueError
             scores: EndInfo = []
             for i in range(10):
                 score = end_info_obj.get(str(i))
@@ -88,10 +101,19 @@ class Protocol:
                     break
                 scores.append(score)
             return scores
-        elif value("state") == 0:
-            return RoundConfig(value("state"), value("time"), value("length"))
+        elif state == 0:
+            return RoundConfig(state, value("time", (int, float)), value("length", int))
         else:
-            return RoundInfo(value("state"), value("listen"), value("player"), value("content"))
+            listen: List[int] = value("listen", list)
+            player: List[int] = value("player", list)
+            content = value("content", (str, list))
+            if isinstance(content, str):
+                # Broadcast form: one content shared by every target player
+                content = [content] * len(player)
+            if not all(isinstance(x, int) for x in listen + player) or not all(isinstance(x, str) for x in content):
+                LOG.error("Unexpected type of the players, listen targets or contents in logic data")
+                raise ValueError
+            return RoundInfo(state, listen, player, content)
 
     @staticmethod
     @json_object_sender
@@ -105,13 +127,20 @@ class Protocol:
 
     @staticmethod
     @json_object_sender
-    def to_logic_ai_normal_message(ai_id: int, content: str, time: int):
+    def to_logic_ai_normal_message(ai_id: int, content: bytes, time: float):
         return {
             "player": ai_id,
-            "content": content,
+            "content": content.decode("utf-8"),
             "time": time
         }
 
+    @staticmethod
+    def to_logic_ai_message_envelope(ai_id: int, time: float) -> Tuple[bytes, bytes]:
+        """
+        JSON around the escaped content of to_logic_ai_normal_message, for content that is encoded piece by piece.
+        """
+        return b'{"player": %d, "content": "' % ai_id, b'", "time": %s}' % json.dumps(time).encode("utf-8")
+
     @staticmethod
     @json_object_sender
     def to_logic_ai_error(error_ai: int, state: int, error_type: AiErrorType):
@@ -124,3 +153,140 @@ class Protocol:
                 "error_log": error_type.value[1]
             })
         }
+
+
+_u8 = struct.Struct(">B")
+_u16 = struct.Struct(">H")
+_u32 = struct.Struct(">I")
+_i32 = struct.Struct(">i")
+_i64 = struct.Struct(">q")
+_round_config = struct.Struct(">iii")
+_ai_message_header = struct.Struct(">iBidI")
+_ai_error = struct.Struct(">iBiiB")
+
+
+class BinaryReader:
+    """
+    Cursor over a v2 payload. Every read raises ValueError if the payload is truncated.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def unpack(self, fmt: struct.Struct) -> tuple:
+        try:
+            result = fmt.unpack_from(self.data, self.offset)
+        except struct.error as e:
+            raise ValueError(e)
+        self.offset += fmt.size
+        return result
+
+    def int_list(self) -> List[int]:
+        count, = self.unpack(_u16)
+        return list(self.unpack(struct.Struct(">%di" % count)))
+
+    def payload(self) -> bytes:
+        size, = self.unpack(_u32)
+        if self.offset + size > len(self.data):
+            raise ValueError("Payload exceeds the package")
+        result = bytes(self.data[self.offset:self.offset + size])
+        self.offset += size
+        return result
+
+
+class ProtocolV2:
+    """
+    Binary protocol, selected by protocol version 2.
+    Packages keep the same size prefix (and target header from the logic) as version 1, but the payload is a
+    compact binary envelope instead of JSON. All integers are big-endian.
+
+    Logic to judger, starting with u8 kind:
+      0 round config: i32 state, i32 time, i32 length
+      1 round info: i32 state, u16 n + i32[n] listen, u16 m + m * (i32 player, u32 size, raw content)
+      2 round broadcast: i32 state, u16 n + i32[n] listen, u16 m + i32[m] player, u32 size, raw content
+      3 end info: u16 n + i64[n] scores
+    Judger to logic, starting with u8 kind:
+      0 init info: u16 n + u8[n] player list, u32 size + utf-8 replay path, u32 size + JSON config
+      1 ai message: i32 player, f64 time in milliseconds, u32 size + raw content
+      2 ai error: i32 player, i32 state, u8 error type
+    """
+    ROUND_CONFIG = 0
+    ROUND_INFO = 1
+    ROUND_BROADCAST = 2
+    END_INFO = 3
+    INIT_INFO = 0
+    AI_MESSAGE = 1
+    AI_ERROR = 2
+
+    @staticmethod
+    def from_logic_data(data: bytes) -> Union[RoundConfig, RoundInfo, EndInfo]:
+        reader = BinaryReader(data)
+        kind, = reader.unpack(_u8)
+        if kind == ProtocolV2.ROUND_CONFIG:
+            return RoundConfig(*reader.unpack(_round_config))
+        elif kind == ProtocolV2.ROUND_INFO:
+            state, = reader.unpack(_i32)
+            listen = reader.int_list()
+            count, = reader.unpack(_u16)
+            player, content = [], []
+            for _ in range(count):
+                player.append(reader.unpack(_i32)[0])
+                content.append(reader.payload())
+            return RoundInfo(state, listen, player, content)
+        elif kind == ProtocolV2.ROUND_BROADCAST:
+            state, = reader.unpack(_i32)
+            listen = reader.int_list()
+            player = reader.int_list()
+            content = reader.payload()
+            return RoundInfo(state, listen, player, [content] * len(player))
+        elif kind == ProtocolV2.END_INFO:
+            count, = reader.unpack(_u16)
+            return list(reader.unpack(struct.Struct(">%dq" % count)))
+        else:
+            LOG.error("Unknown v2 logic data kind %d", kind)
+            raise ValueError
+
+    @staticmethod
+    def to_logic_init_info(player_list: List[int], config: object, replay_path: Path) -> bytes:
+        replay = str(replay_path).encode("utf-8")
+        config_json = json.dumps(config).encode("utf-8")
+        body = b"".join([
+            _u8.pack(ProtocolV2.INIT_INFO),
+            _u16.pack(len(player_list)), bytes(player_list),
+            _u32.pack(len(replay)), replay,
+            _u32.pack(len(config_json)), config_json
+        ])
+        return int2bytes(len(body)) + body
+
+    @staticmethod
+    def to_logic_ai_normal_message(ai_id: int, content: bytes, time: float) -> bytes:
+        return ProtocolV2.to_logic_ai_message_header(ai_id, len(content), time) + content
+
+    @staticmethod
+    def to_logic_ai_message_header(ai_id: int, size: int, time: float) -> bytes:
+        """
+        Everything of an ai message before its content of the given size.
+        """
+        return _ai_message_header.pack(_ai_message_header.size - 4 + size, ProtocolV2.AI_MESSAGE, ai_id, time, size)
+
+    @staticmethod
+    def to_logic_ai_error(error_ai: int, state: int, error_type: AiErrorType) -> bytes:
+        return _ai_error.pack(_ai_error.size - 4, ProtocolV2.AI_ERROR, error_ai, state, error_type.value[0])
+
+
+def handshake_frame(match_id: str, token: str) -> bytes:
+    """
+    First frame an AI sends to a shared MatchServer, framed like any other AI message.
+    """
+    data = json.dumps({"match": match_id, "token": token}).encode("utf-8")
+    return int2bytes(len(data)) + data
+
+
+def get_protocol(version: int) -> Type[Union[Protocol, ProtocolV2]]:
+    if version == 1:
+        return Protocol
+    elif version == 2:
+        return ProtocolV2
+    LOG.error("Unsupported protocol version: %s", version)
+    raise JudgerIllegalState
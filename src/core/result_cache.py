@@ -0,0 +1,204 @@
+import dataclasses
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from .logger import LOG
+from .match import MatchSpec
+from .summary import JudgeSummary
+
+# Bump when the meaning of cached results changes
+CACHE_VERSION = 1
+# Artifacts that belong to a particular run rather than to the match
+_EXCLUDED_ARTIFACTS = {"judger.log", "summary.json"}
+
+
+def _tree_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def _copy_tree(source: Path, target: Path) -> None:
+    target.mkdir(parents=True, exist_ok=True)
+    for path in source.iterdir():
+        if path.is_dir():
+            _copy_tree(path, target / path.name)
+        elif path.is_file():
+            shutil.copy2(path, target / path.name)
+
+
+class ResultCache:
+    """
+    Content-addressed cache of match results.
+    The key covers the content of the logic and AI binaries, the AI commands in seat order, the config,
+    the seed, the protocol version and the resource limits. A hit restores the stored JudgeSummary and
+    artifacts instead of running the game again.
+    Entries are evicted least recently used first once the cache grows over max_size bytes. The sizes are indexed
+    in memory, entries stored by other processes sharing the directory are only seen by the next ResultCache.
+    """
+    directory: Path
+    max_size: int
+
+    def __init__(self, directory: Path, max_size: int = 1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self.file_hashes: Dict[Tuple[str, int, int], str] = {}
+        # Guards the size index, readers and the entry directories themselves
+        self.lock = threading.Lock()
+        self.entries: Optional["OrderedDict[str, int]"] = None
+        self.total = 0
+        self.readers: Dict[str, int] = {}
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def hash_file(self, path: Path) -> str:
+        stat = path.stat()
+        cache_key = (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+        digest = self.file_hashes.get(cache_key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with path.open("rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    sha.update(chunk)
+            digest = self.file_hashes[cache_key] = sha.hexdigest()
+        return digest
+
+    def command_files(self, command: str) -> list:
+        """
+        Hashes of the files a command refers to, e.g. the script in "python3 ai.py".
+        Programs found through PATH are identified by name only.
+        """
+        result = []
+        for token in shlex.split(command):
+            path = Path(token)
+            if path.is_file():
+                result.append([token, self.hash_file(path)])
+        return result
+
+    def match_key(self, spec: MatchSpec) -> str:
+        key = {
+            "version": CACHE_VERSION,
+            "logic": self.hash_file(Path(spec.logic_path)),
+            "ais": [[command, self.command_files(command)] for command in spec.ai_commands],
+            "player_count": spec.player_count,
+            "config": spec.config,
+            "seed": spec.seed,
+            "protocol_version": spec.protocol_version,
+            "limits": dataclasses.asdict(spec.limits) if spec.limits is not None else None
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str, output_dir: Path) -> Optional[JudgeSummary]:
+        entry = self.directory / key
+        with self.lock:
+            # Not evicted or replaced while its artifacts are copied
+            self.readers[key] = self.readers.get(key, 0) + 1
+        try:
+            try:
+                summary = JudgeSummary.from_dict(json.loads((entry / "summary.json").read_text()))
+                artifacts = entry / "artifacts"
+                if artifacts.is_dir():
+                    _copy_tree(artifacts, output_dir)
+                # Entry modification time records the last use for eviction
+                os.utime(entry)
+            except (OSError, ValueError, KeyError, TypeError):
+                return None
+        finally:
+            with self.lock:
+                self.readers[key] -= 1
+                if self.readers[key] == 0:
+                    del self.readers[key]
+        with self.lock:
+            if self.entries is not None and key in self.entries:
+                self.entries.move_to_end(key)
+        LOG.info("Result cache hit %s", key)
+        return summary
+
+    def put(self, key: str, summary: JudgeSummary, output_dir: Path) -> None:
+        entry = self.directory / key
+        tmp = self.__hidden(key, "tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        (tmp / "artifacts").mkdir(parents=True)
+        for path in output_dir.iterdir():
+            if path.name in _EXCLUDED_ARTIFACTS:
+                continue
+            if path.is_dir():
+                _copy_tree(path, tmp / "artifacts" / path.name)
+            elif path.is_file():
+                shutil.copy2(path, tmp / "artifacts" / path.name)
+        (tmp / "summary.json").write_text(json.dumps(summary.to_dict()))
+        size = _tree_size(tmp)
+        garbage = [tmp]
+        with self.lock:
+            entries = self.__index()
+            if self.readers.get(key, 0) == 0:
+                old = self.__hidden(key, "old")
+                try:
+                    if entry.exists():
+                        os.rename(entry, old)
+                        garbage.append(old)
+                    os.rename(tmp, entry)
+                    garbage.remove(tmp)
+                    self.total += size - entries.pop(key, 0)
+                    entries[key] = size
+                except OSError:
+                    # Stored concurrently by another judger
+                    LOG.debug("Failed to store cached result %s", key, exc_info=True)
+        for path in garbage:
+            shutil.rmtree(path, ignore_errors=True)
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Entries are moved out of the way under the lock and removed after, so a concurrent get never sees a half
+        removed entry, and entries being read are skipped.
+        """
+        evicted = []
+        with self.lock:
+            entries = self.__index()
+            for key in list(entries.keys()):
+                if self.total <= self.max_size:
+                    break
+                if self.readers.get(key, 0) > 0:
+                    continue
+                target = self.__hidden(key, "evicted")
+                try:
+                    os.rename(self.directory / key, target)
+                    evicted.append(target)
+                except OSError:
+                    # Removed by someone else
+                    pass
+                self.total -= entries.pop(key)
+                LOG.info("Evicted cached result %s", key)
+        for path in evicted:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def clear(self) -> None:
+        with self.lock:
+            for entry in self.directory.iterdir():
+                shutil.rmtree(entry, ignore_errors=True)
+            self.entries = None
+            self.total = 0
+
+    def __index(self) -> "OrderedDict[str, int]":
+        """
+        Sizes of the entries, least recently used first. Scanned once, then kept up to date by put and evict.
+        Called with the lock held.
+        """
+        if self.entries is None:
+            found = []
+            for entry in self.directory.iterdir():
+                if entry.name.startswith(".") or not entry.is_dir():
+                    continue
+                found.append((entry.stat().st_mtime, entry.name, _tree_size(entry)))
+            found.sort()
+            self.entries = OrderedDict((name, size) for _, name, size in found)
+            self.total = sum(self.entries.values())
+        return self.entries
+
+    def __hidden(self, key: str, kind: str) -> Path:
+        return self.directory / f".{key}.{os.getpid()}.{threading.get_ident()}.{kind}"
@@ -0,0 +1,340 @@
+import asyncio
+import concurrent.futures
+import dataclasses
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from .logger import LOG
+from .summary import JudgeEventType, JudgeState, JudgeSummary
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    match_id TEXT NOT NULL,
+    logic TEXT NOT NULL,
+    start_time REAL NOT NULL,
+    total_time REAL NOT NULL,
+    final_state TEXT NOT NULL,
+    total_round INTEGER NOT NULL,
+    UNIQUE (source, match_id)
+);
+CREATE TABLE IF NOT EXISTS players (
+    match INTEGER NOT NULL,
+    seat INTEGER NOT NULL,
+    ai TEXT NOT NULL,
+    score REAL,
+    outcome TEXT NOT NULL,
+    re INTEGER NOT NULL,
+    tle INTEGER NOT NULL,
+    ole INTEGER NOT NULL,
+    peak_rss INTEGER,
+    cpu_time REAL,
+    PRIMARY KEY (match, seat)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rounds (
+    match INTEGER NOT NULL,
+    round INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    PRIMARY KEY (match, round)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rounds_duration ON rounds (duration);
+CREATE TABLE IF NOT EXISTS events (
+    match INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    time REAL NOT NULL,
+    round INTEGER NOT NULL,
+    ai_id INTEGER NOT NULL,
+    elapsed_time REAL NOT NULL,
+    comment TEXT NOT NULL,
+    PRIMARY KEY (match, seq)
+) WITHOUT ROWID;
+"""
+
+# Events that end a game, and so the last round
+_END_EVENTS = {JudgeEventType.GAME_OVER, JudgeEventType.LOGIC_CRASHED, JudgeEventType.INTERNAL_ERROR}
+
+
+@dataclasses.dataclass
+class MatchRecord:
+    """
+    A finished match as stored: players are the AI names in seat order.
+    (source, match_id) identifies a match, storing it again replaces it.
+    """
+    match_id: str
+    players: List[str]
+    summary: JudgeSummary
+    source: str = ""
+    logic: str = ""
+
+
+@dataclasses.dataclass
+class AiStats:
+    ai: str
+    played: int
+    wins: int
+    draws: int
+    losses: int
+    failures: int
+    crashes: int
+    tles: int
+    oles: int
+    mean_score: Optional[float]
+
+
+@dataclasses.dataclass
+class RoundStats:
+    count: int
+    mean: float
+    min: float
+    max: float
+    percentiles: Dict[int, float]
+    matches: int
+    mean_rounds: float
+    mean_match_time: float
+
+
+def outcomes(players: List[str], summary: JudgeSummary) -> List[str]:
+    """
+    win, draw, loss or fail for every seat, like the tournament standings: a draw is a shared best score and
+    every seat of a game that did not end normally fails.
+    """
+    scores = summary.final_score
+    if summary.final_state != JudgeState.GAME_OVER or len(scores) != len(players):
+        return ["fail"] * len(players)
+    best = max(scores)
+    winners = scores.count(best)
+    return ["loss" if score != best else "win" if winners == 1 else "draw" for score in scores]
+
+
+def round_durations(summary: JudgeSummary) -> List[Tuple[int, float]]:
+    """
+    (round, seconds) of every round in the timeline. The last round lasts until the game ended,
+    it is left out when the game never ended.
+    """
+    result = []
+    current = None
+    for event in summary.event_list:
+        if event.type == JudgeEventType.NEW_ROUND:
+            if current is not None:
+                result.append((current.round, event.time - current.time))
+            current = event
+        elif event.type in _END_EVENTS and current is not None:
+            result.append((current.round, event.time - current.time))
+            current = None
+    return result
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Nearest rank percentile of sorted values.
+    """
+    return values[min(len(values) - 1, max(0, int(round(q / 100 * len(values))) - 1))]
+
+
+class ResultsStore:
+    """
+    Match summaries with their event timelines in a SQLite database, for analysis over many tournaments.
+    Concurrent games add() their records, which are written in batches, one transaction each, by a single
+    writer thread with a connection of its own. Queries use another connection, in the thread that created the
+    store. The database is in WAL mode, so several processes may write it and queries do not block writers.
+    Per seat results and round durations get tables of their own, so that statistics over a hundred thousand
+    matches only read small indexed rows.
+    """
+    path: Path
+    batch_size: int
+    flush_delay: float
+
+    def __init__(self, path: Path, batch_size: int = 500, flush_delay: float = 1):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_delay = flush_delay
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # For the queries, the writer thread opens its own connection
+        self.connection = sqlite3.connect(str(path), timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(_SCHEMA)
+        self.writer: Optional[sqlite3.Connection] = None
+        self.executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="slj-results")
+        self.pending: List[MatchRecord] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.flushes: Set[asyncio.Task] = set()
+
+    # Writing
+    def insert(self, records: List[MatchRecord]) -> None:
+        """
+        Store records in one transaction. Blocking, use add() in the event loop.
+        """
+        self.executor.submit(self.__insert, records).result()
+
+    def __insert(self, records: List[MatchRecord]) -> None:
+        if self.writer is None:
+            self.writer = sqlite3.connect(str(self.path), timeout=60)
+            self.writer.execute("PRAGMA synchronous=NORMAL")
+        # The last record of a match queued twice wins
+        records = list({(record.source, record.match_id): record for record in records}.values())
+        with self.writer:
+            cursor = self.writer.cursor()
+            players, rounds, events = [], [], []
+            for record in records:
+                summary = record.summary
+                self.__delete(cursor, record.source, record.match_id)
+                cursor.execute("INSERT INTO matches (source, match_id, logic, start_time, total_time, final_state, "
+                               "total_round) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (record.source, record.match_id, record.logic, summary.start_time, summary.total_time,
+                                summary.final_state.name, summary.total_round))
+                match = cursor.lastrowid
+                usage = {u.name: u for u in summary.process_usage}
+                for seat, (ai, outcome) in enumerate(zip(record.players, outcomes(record.players, summary))):
+                    errors = [e.type for e in summary.event_list if e.ai_id == seat]
+                    process = usage.get(f"ai{seat}")
+                    players.append((match, seat, ai,
+                                    summary.final_score[seat] if seat < len(summary.final_score) else None, outcome,
+                                    errors.count(JudgeEventType.AI_RE), errors.count(JudgeEventType.AI_TLE),
+                                    errors.count(JudgeEventType.AI_OLE),
+                                    process.peak_rss if process is not None else None,
+                                    process.cpu_time if process is not None else None))
+                rounds.extend((match, round, duration) for round, duration in round_durations(summary))
+                events.extend((match, seq, e.type.name, e.time, e.round, e.ai_id, e.elapsed_time, e.comment)
+                              for seq, e in enumerate(summary.event_list))
+            cursor.executemany("INSERT INTO players VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", players)
+            # A round may be entered twice in a broken timeline, the last entry wins
+            cursor.executemany("INSERT OR REPLACE INTO rounds VALUES (?, ?, ?)", rounds)
+            cursor.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)", events)
+
+    @staticmethod
+    def __delete(cursor: sqlite3.Cursor, source: str, match_id: str) -> None:
+        row = cursor.execute("SELECT id FROM matches WHERE source = ? AND match_id = ?", (source, match_id)).fetchone()
+        if row is not None:
+            for table in ("players", "rounds", "events"):
+                cursor.execute(f"DELETE FROM {table} WHERE match = ?", row)
+            cursor.execute("DELETE FROM matches WHERE id = ?", row)
+
+    async def add(self, record: MatchRecord) -> None:
+        """
+        Queue a record. It is written once batch_size records are queued, or flush_delay seconds later.
+        """
+        self.pending.append(record)
+        if len(self.pending) >= self.batch_size:
+            await self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.flush_delay, self.__flush_later)
+
+    def __flush_later(self) -> None:
+        self.timer = None
+        records, self.pending = self.pending, []
+        task = asyncio.ensure_future(self.__write(records))
+        self.flushes.add(task)
+        task.add_done_callback(self.flushes.discard)
+
+    async def __write(self, records: List[MatchRecord]) -> None:
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.__insert, records)
+        except sqlite3.Error:
+            # Results are also kept next to the artifacts, a failed write must not stop the games
+            LOG.exception("Failed to store %d match results into %s", len(records), self.path)
+
+    async def flush(self) -> None:
+        """
+        Write the queued records and wait for the writes in progress.
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        records, self.pending = self.pending, []
+        if len(records) > 0:
+            await self.__write(records)
+        await asyncio.gather(*self.flushes)
+
+    def close(self) -> None:
+        """
+        Write the queued records and close the database. Blocking, in the event loop flush() first.
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        records, self.pending = self.pending, []
+        try:
+            if len(records) > 0:
+                self.insert(records)
+        except sqlite3.Error:
+            LOG.exception("Failed to store %d match results into %s", len(records), self.path)
+        finally:
+            self.executor.submit(self.__close_writer)
+            self.executor.shutdown(wait=True)
+            self.connection.close()
+
+    def __close_writer(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    # Queries, source limits them to the matches of one source
+    def __filter(self, source: Optional[str], column: str = "match") -> Tuple[str, tuple]:
+        if source is None:
+            return "", ()
+        return f" WHERE {column} IN (SELECT id FROM matches WHERE source = ?)", (source,)
+
+    def sources(self) -> List[Tuple[str, int]]:
+        return self.connection.execute(
+            "SELECT source, COUNT(*) FROM matches GROUP BY source ORDER BY source").fetchall()
+
+    def ai_stats(self, source: Optional[str] = None) -> List[AiStats]:
+        where, params = self.__filter(source)
+        rows = self.connection.execute(
+            "SELECT ai, COUNT(*), SUM(outcome = 'win'), SUM(outcome = 'draw'), SUM(outcome = 'loss'), "
+            "SUM(outcome = 'fail'), SUM(re > 0), SUM(tle > 0), SUM(ole > 0), AVG(score) "
+            f"FROM players{where} GROUP BY ai ORDER BY ai", params)
+        return [AiStats(*row) for row in rows]
+
+    def scores(self, source: Optional[str] = None) -> Dict[str, List[float]]:
+        """
+        Sorted final scores of every AI, from the games that ended normally.
+        """
+        where, params = self.__filter(source)
+        where += " AND" if where else " WHERE"
+        result: Dict[str, List[float]] = {}
+        rows = self.connection.execute(
+            f"SELECT ai, score FROM players{where} outcome != 'fail' ORDER BY ai, score", params)
+        for ai, score in rows:
+            result.setdefault(ai, []).append(score)
+        return result
+
+    def round_stats(self, source: Optional[str] = None, percentiles: Tuple[int, ...] = (50, 90, 99)) -> RoundStats:
+        where, params = self.__filter(source)
+        values = {}
+        if source is None:
+            count, mean, low, high = self.connection.execute(
+                "SELECT COUNT(*), AVG(duration), MIN(duration), MAX(duration) FROM rounds").fetchone()
+            for q in percentiles if count > 0 else ():
+                # Walks the duration index instead of sorting every round
+                offset = min(count - 1, max(0, int(round(q / 100 * count)) - 1))
+                values[q] = self.connection.execute(
+                    "SELECT duration FROM rounds ORDER BY duration LIMIT 1 OFFSET ?", (offset,)).fetchone()[0]
+        else:
+            # The index is of no use for a part of the rounds, they are read once and sorted here
+            durations = sorted(row[0] for row in self.connection.execute(
+                f"SELECT duration FROM rounds{where}", params))
+            count = len(durations)
+            mean = sum(durations) / count if count > 0 else None
+            low, high = (durations[0], durations[-1]) if count > 0 else (None, None)
+            for q in percentiles if count > 0 else ():
+                values[q] = percentile(durations, q)
+        where, params = self.__filter(source, "id")
+        matches, mean_rounds, mean_time = self.connection.execute(
+            f"SELECT COUNT(*), AVG(total_round), AVG(total_time) FROM matches{where}", params).fetchone()
+        return RoundStats(count, mean or 0, low or 0, high or 0, values, matches, mean_rounds or 0, mean_time or 0)
+
+    def timeline(self, match_id: str, source: Optional[str] = None) -> List[tuple]:
+        """
+        (source, seq, type, time, round, ai_id, elapsed_time, comment) of the events of a match.
+        """
+        query = "SELECT m.source, e.seq, e.type, e.time, e.round, e.ai_id, e.elapsed_time, e.comment " \
+                "FROM matches m JOIN events e ON e.match = m.id WHERE m.match_id = ?"
+        params: tuple = (match_id,)
+        if source is not None:
+            query += " AND m.source = ?"
+            params += (source,)
+        return self.connection.execute(query + " ORDER BY m.source, e.seq", params).fetchall()
@@ -0,0 +1,88 @@
+import asyncio
+import concurrent.futures
+import itertools
+import logging
+import threading
+from pathlib import Path
+from typing import Optional, TYPE_CHECKING
+
+from .logger import LOG, console_handler, file_handler
+from .match import MatchSpec, run_match
+from .summary import JudgeSummary
+
+if TYPE_CHECKING:
+    from .result_cache import ResultCache
+
+_runtime_counter = itertools.count()
+
+
+class JudgerRuntime:
+    """
+    Library entry point for running many games in one process.
+    The runtime owns a thread pool shared by all its judgers for file and cache I/O, and gives every match
+    its own logger writing into <output>/judger.log (and to the console when console is set).
+    Judgers of a runtime never install signal handlers. Everything a match acquires is released when it
+    returns, and close() stops the shared threads, so running any number of games leaks nothing.
+
+        async with JudgerRuntime() as runtime:
+            summary = await runtime.run(spec)
+    """
+    executor: concurrent.futures.ThreadPoolExecutor
+    console: bool
+    name: str
+
+    def __init__(self, max_workers: Optional[int] = None, console: bool = False):
+        self.name = f"slj-runtime-{next(_runtime_counter)}"
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers, thread_name_prefix=self.name)
+        self.console = console
+        self.closed = False
+
+    def match_logger(self, spec: MatchSpec) -> logging.Logger:
+        """
+        A logger that is not registered in the logging module, so it is collected with its match.
+        """
+        logger = logging.Logger(f"{self.name}.{spec.match_id}", logging.DEBUG)
+        logger.addHandler(file_handler(Path(spec.output)))
+        if self.console:
+            logger.addHandler(console_handler())
+        return logger
+
+    async def run(self, spec: MatchSpec, cache: Optional["ResultCache"] = None, force: bool = False,
+                  **options) -> JudgeSummary:
+        if self.closed:
+            LOG.error("Judger runtime %s is already closed", self.name)
+            raise RuntimeError(self.name)
+        Path(spec.output).mkdir(parents=True, exist_ok=True)
+        logger = self.match_logger(spec)
+        try:
+            return await run_match(spec, cache, force, **dict(options, executor=self.executor, logger=logger))
+        finally:
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+                # The console handler is shared with the global logger
+                if handler.get_name() != "console":
+                    handler.close()
+
+    def close(self) -> None:
+        self.closed = True
+        self.executor.shutdown(wait=True)
+
+    async def __aenter__(self) -> "JudgerRuntime":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        """
+        Like close(), but waits for the shared threads without blocking the loop, a job may still be running.
+        """
+        self.closed = True
+        loop = asyncio.get_running_loop()
+        stopped = loop.create_future()
+
+        def shutdown():
+            self.executor.shutdown(wait=True)
+            loop.call_soon_threadsafe(stopped.set_result, None)
+
+        thread = threading.Thread(target=shutdown, name=f"{self.name}-shutdown")
+        thread.start()
+        await stopped
+        thread.join()
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Deque, List, Optional, Set, Union
+
+from .logger import LOG
+
+POLICIES = ("drop", "skip")
+
+
+def _text(content: Union[str, bytes]) -> str:
+    return content if isinstance(content, str) else content.decode("utf-8", errors="replace")
+
+
+class Spectator:
+    """
+    One connected viewer with its own bounded buffer, of at most `buffer_size` frames and `buffer_bytes` bytes.
+    "drop" policy discards the oldest frames when the buffer is full,
+    "skip" policy discards the whole backlog and jumps to the newest frame.
+    The newest frame is always kept, even if it is larger than `buffer_bytes` on its own.
+    The viewer may change its settings at any time by sending a line like {"policy": "skip", "buffer": 64}.
+    Closing its side of the connection ends the spectator.
+    """
+    writer: asyncio.StreamWriter
+    buffer: Deque[bytes]
+    policy: str
+    dropped: int
+
+    def __init__(self, writer: asyncio.StreamWriter, buffer_size: int, policy: str, buffer_bytes: int):
+        self.writer = writer
+        self.buffer = deque()
+        self.buffer_size = buffer_size
+        self.buffer_bytes = buffer_bytes
+        self.buffered = 0
+        self.policy = policy
+        self.dropped = 0
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.disconnected = False
+
+    def push(self, frame: bytes) -> None:
+        if len(self.buffer) >= self.buffer_size or self.buffered + len(frame) > self.buffer_bytes:
+            if self.policy == "skip":
+                self.dropped += len(self.buffer)
+                self.buffer.clear()
+                self.buffered = 0
+            else:
+                while len(self.buffer) > 0 and (len(self.buffer) >= self.buffer_size
+                                                or self.buffered + len(frame) > self.buffer_bytes):
+                    self.dropped += 1
+                    self.buffered -= len(self.buffer.popleft())
+        self.buffer.append(frame)
+        self.buffered += len(frame)
+        self.ready.set()
+
+    def configure(self, line: bytes) -> None:
+        try:
+            settings = json.loads(line)
+            policy = settings.get("policy", self.policy)
+            buffer_size = int(settings.get("buffer", self.buffer_size))
+        except (ValueError, AttributeError, TypeError):
+            LOG.debug("Ignoring invalid spectator settings: %s", line)
+            return
+        if policy in POLICIES and buffer_size > 0:
+            self.policy = policy
+            self.buffer_size = buffer_size
+
+    async def write_loop(self) -> None:
+        while not self.disconnected and (not self.closed or len(self.buffer) > 0):
+            await self.ready.wait()
+            self.ready.clear()
+            if self.disconnected:
+                break
+            frames: List[bytes] = []
+            if self.dropped > 0:
+                frames.append(json.dumps({"type": "dropped", "count": self.dropped}).encode("utf-8") + b"\n")
+                self.dropped = 0
+            frames.extend(self.buffer)
+            self.buffer.clear()
+            self.buffered = 0
+            if len(frames) > 0:
+                # The frames are shared by all spectators, they are handed over without joining them
+                self.writer.writelines(frames)
+                await self.writer.drain()
+
+    async def read_loop(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.configure(line)
+        except (ConnectionError, OSError, ValueError):
+            # ValueError: a settings line above the reader limit
+            pass
+        self.disconnected = True
+        self.ready.set()
+        # Also ends a write_loop stuck in drain() to a viewer that stopped reading
+        self.writer.transport.abort()
+
+
+class SpectatorHub:
+    """
+    Optional observer server of a Judger. Spectators receive the live stream as newline-delimited JSON frames:
+      {"type": "round", "state": ..., "listen": [...], "player": [...], "content": [...]}
+      {"type": "ai", "state": ..., "player": ..., "content": ..., "time": ...}
+      {"type": "game_over", "score": [...]}
+      {"type": "dropped", "count": ...} when the spectator was too slow and frames were discarded
+    Every frame is serialized once and shared by all spectators. Publishing never waits for a spectator.
+    """
+    host: str
+    port: int
+    buffer_size: int
+    buffer_bytes: int
+    policy: str
+    spectators: Set[Spectator]
+    server: Optional[asyncio.AbstractServer]
+
+    def __init__(self, host: str, port: int, buffer_size: int = 256, policy: str = "drop",
+                 log: logging.Logger = LOG, buffer_bytes: int = 16 * 1024 * 1024):
+        self.host = host
+        self.log = log
+        self.port = port
+        self.buffer_size = buffer_size
+        self.buffer_bytes = buffer_bytes
+        self.policy = policy
+        self.spectators = set()
+        self.server = None
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        return ', '.join(str(sock.getsockname()) for sock in self.server.sockets)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        spectator = Spectator(writer, self.buffer_size, self.policy, self.buffer_bytes)
+        self.spectators.add(spectator)
+        self.log.info("A spectator is connected. %d spectators in total", len(self.spectators))
+        read_task = asyncio.create_task(spectator.read_loop(reader))
+        try:
+            await spectator.write_loop()
+            if spectator.disconnected:
+                self.log.info("A spectator disconnected")
+        except (ConnectionError, OSError):
+            self.log.info("A spectator disconnected")
+        finally:
+            self.spectators.discard(spectator)
+            read_task.cancel()
+            writer.close()
+
+    def publish(self, frame: dict) -> None:
+        if len(self.spectators) == 0:
+            return
+        data = json.dumps(frame).encode("utf-8") + b"\n"
+        for spectator in self.spectators:
+            spectator.push(data)
+
+    def publish_round(self, state: int, listen: List[int], player: List[int],
+                      content: List[Union[str, bytes]]) -> None:
+        if len(self.spectators) > 0:
+            self.publish({"type": "round", "state": state, "listen": listen, "player": player,
+                          "content": [_text(c) for c in content]})
+
+    def publish_ai_reply(self, state: int, ai_id: int, content: bytes, time: float) -> None:
+        if len(self.spectators) > 0:
+            self.publish({"type": "ai", "state": state, "player": ai_id, "content": _text(content), "time": time})
+
+    async def close(self, timeout: float = 1) -> None:
+        """
+        Stop accepting spectators and give the connected ones a short time to receive their buffered frames.
+        """
+        if self.server is not None:
+            self.server.close()
+        for spectator in self.spectators:
+            spectator.closed = True
+            spectator.ready.set()
+        waiters = {asyncio.create_task(s.writer.wait_closed()): s for s in self.spectators}
+        if len(waiters) > 0:
+            _, pending = await asyncio.wait(waiters.keys(), timeout=timeout)
+            for task in pending:
+                # Viewers that are still behind are cut off instead of delaying the shutdown
+                task.cancel()
+                waiters[task].writer.transport.abort()
+        if self.server is not None:
+            await self.server.wait_closed()
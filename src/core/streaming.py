@@ -0,0 +1,95 @@
+import asyncio
+import codecs
+import concurrent.futures
+import json
+from typing import IO, Optional, Tuple, Type, Union
+
+from .framing import FrameStream
+from .protocol import Protocol, ProtocolV2
+from .utils import int2bytes
+
+# Size of the pieces a streamed payload is copied in
+CHUNK_SIZE = 64 * 1024
+
+
+class StreamedMessage:
+    """
+    A message to the logic whose payload of `size` bytes is copied from a spool file while it is written to the
+    logic stdin, instead of being held in memory as a whole. `done` is set once the writer is finished with the message,
+    the AI reader producing it waits for it before reading its next frame.
+    """
+    header: bytes
+    content: IO[bytes]
+    trailer: bytes
+    size: int
+    done: asyncio.Future
+
+    def __init__(self, header: bytes, content: IO[bytes], trailer: bytes, size: int,
+                 executor: Optional[concurrent.futures.Executor] = None):
+        self.header = header
+        self.content = content
+        self.trailer = trailer
+        self.size = size
+        self.executor = executor
+        self.done = asyncio.get_running_loop().create_future()
+
+    async def write_to(self, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            writer.write(self.header)
+            while True:
+                chunk = await loop.run_in_executor(self.executor, self.content.read, CHUNK_SIZE)
+                if len(chunk) == 0:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+            writer.write(self.trailer)
+            await writer.drain()
+        finally:
+            self.content.close()
+            if not self.done.done():
+                self.done.set_result(None)
+
+
+async def spool_ai_content(protocol: Type[Union[Protocol, ProtocolV2]], reader: FrameStream, size: int,
+                           executor: Optional[concurrent.futures.Executor] = None) -> Tuple[IO[bytes], int]:
+    """
+    Read the next `size` bytes of reader into a temporary file, which stays in memory only while it is small.
+    Nothing is announced to the logic before the whole content arrived, so an AI stalling in the middle of
+    a message never blocks the logic stdin, and its elapsed time is taken after the last byte.
+    JSON messages escape the content, the returned size is the size of the spooled content.
+    """
+    loop = asyncio.get_running_loop()
+    # Imported here, tempfile is slow to import and rarely needed
+    import tempfile
+    spool = tempfile.SpooledTemporaryFile(CHUNK_SIZE)
+    try:
+        decoder = codecs.getincrementaldecoder("utf-8")() if protocol is Protocol else None
+        spooled_size = 0
+        while size > 0:
+            chunk = await reader.readexactly(min(size, CHUNK_SIZE))
+            size -= len(chunk)
+            if decoder is not None:
+                chunk = json.dumps(decoder.decode(chunk))[1:-1].encode("utf-8")
+            spooled_size += len(chunk)
+            await loop.run_in_executor(executor, spool.write, chunk)
+        if decoder is not None:
+            decoder.decode(b"", final=True)
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    return spool, spooled_size
+
+
+def stream_ai_message(protocol: Type[Union[Protocol, ProtocolV2]], ai_id: int, content: IO[bytes], size: int,
+                      time: float, executor: Optional[concurrent.futures.Executor] = None) -> StreamedMessage:
+    """
+    The ai message carrying content spooled by spool_ai_content().
+    """
+    if protocol is ProtocolV2:
+        return StreamedMessage(ProtocolV2.to_logic_ai_message_header(ai_id, size, time), content, b"", size,
+                               executor)
+    prefix, suffix = Protocol.to_logic_ai_message_envelope(ai_id, time)
+    header = int2bytes(len(prefix) + size + len(suffix)) + prefix
+    return StreamedMessage(header, content, suffix, size, executor)
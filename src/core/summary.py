@@ -1,7 +1,7 @@
 import dataclasses
 import time
 from enum import Enum, auto
-from typing import List
+from typing import List, Optional
 
 
 class JudgeEventType(Enum):
@@ -33,6 +33,15 @@ class JudgeState(Enum):
     INTERNAL_ERROR = auto()
 
 
+@dataclasses.dataclass
+class ProcessUsage:
+    name: str
+    pid: int
+    peak_rss: int  # KiB
+    cpu_time: float  # Seconds, user + system
+    exit_code: Optional[int]
+
+
 @dataclasses.dataclass
 class JudgeSummary:
     start_time: float
@@ -40,6 +49,8 @@ class JudgeSummary:
     final_state: JudgeState
     final_score: List[int]
     total_round: int
+    process_usage: List[ProcessUsage]
+    placement: List[int]  # Cores the processes were pinned to, empty when not pinned
     event_list: List[JudgeEvent] = dataclasses.field(repr=False)
 
     def __init__(self):
@@ -47,8 +58,35 @@ class JudgeSummary:
         self.total_time = 0
         self.final_state = JudgeState.INTERNAL_ERROR
         self.final_score = []
+        self.total_round = -1
+        self.process_usage = []
+        self.placement = []
         self.event_list = [JudgeEvent(JudgeEventType.JUDGE_START, self.start_time, -1, -1, 0, "")]
 
+    def to_dict(self) -> dict:
+        """
+        JSON compatible form, enums are stored by name.
+        """
+        result = dataclasses.asdict(self)
+        result["final_state"] = self.final_state.name
+        for event in result["event_list"]:
+            event["type"] = event["type"].name
+        return result
+
+    @staticmethod
+    def from_dict(data: dict) -> "JudgeSummary":
+        summary = JudgeSummary()
+        summary.start_time = data["start_time"]
+        summary.total_time = data["total_time"]
+        summary.final_state = JudgeState[data["final_state"]]
+        summary.final_score = list(data["final_score"])
+        summary.total_round = data["total_round"]
+        summary.process_usage = [ProcessUsage(**usage) for usage in data.get("process_usage", [])]
+        summary.placement = list(data.get("placement", []))
+        summary.event_list = [JudgeEvent(**dict(event, type=JudgeEventType[event["type"]]))
+                              for event in data["event_list"]]
+        return summary
+
     def appendAiConnected(self, ai_id: int):
         self.event_list.append(
             JudgeEvent(JudgeEventType.AI_CONNECTED, time.time(), -1, ai_id, 0, "")
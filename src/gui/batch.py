@@ -0,0 +1,198 @@
+import asyncio
+import dataclasses
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from core.judger import Judger, JudgerEvent
+from core.match import MatchSpec
+from core.runtime import JudgerRuntime
+from core.summary import JudgeSummary, JudgeState
+
+WAITING = "排队中"
+RUNNING = "运行中"
+FINISHED = "已完成"
+FAILED = "失败"
+CANCELLED = "已取消"
+
+
+@dataclasses.dataclass
+class BatchEntry:
+    index: int
+    spec: MatchSpec
+    status: str = WAITING
+    round: int = 0
+    summary: Optional[JudgeSummary] = None
+    error: str = ""
+
+
+@dataclasses.dataclass
+class AiScore:
+    command: str
+    played: int = 0
+    wins: int = 0
+    draws: int = 0
+    losses: int = 0
+    failures: int = 0
+    total_score: int = 0
+
+
+class BatchQueue:
+    """
+    Matches queued in the GUI, run in the background by a BatchRunner.
+    The runner thread writes progress under the lock and marks entries dirty. The UI polls changes with
+    take_changes() on a timer, so judger events never reach the UI thread directly, whatever the round rate.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries: List[BatchEntry] = []
+        self.dirty: Set[int] = set()
+
+    def add(self, spec: MatchSpec) -> BatchEntry:
+        with self.lock:
+            entry = BatchEntry(len(self.entries), spec)
+            self.entries.append(entry)
+            self.dirty.add(entry.index)
+            return entry
+
+    def update(self, entry: BatchEntry, **changes) -> None:
+        with self.lock:
+            for key, value in changes.items():
+                setattr(entry, key, value)
+            self.dirty.add(entry.index)
+
+    def take_changes(self) -> List[BatchEntry]:
+        with self.lock:
+            changed = [dataclasses.replace(self.entries[i]) for i in sorted(self.dirty)]
+            self.dirty.clear()
+            return changed
+
+    def scores(self) -> List[AiScore]:
+        """
+        Results of finished matches aggregated by AI command.
+        """
+        with self.lock:
+            finished = [(e.spec.ai_commands, e.summary) for e in self.entries if e.status == FINISHED]
+        scores: Dict[str, AiScore] = {}
+        for commands, summary in finished:
+            for command in commands:
+                scores.setdefault(command, AiScore(command)).played += 1
+            if summary.final_state != JudgeState.GAME_OVER or len(summary.final_score) != len(commands):
+                for command in commands:
+                    scores[command].failures += 1
+                continue
+            best = max(summary.final_score)
+            winners = summary.final_score.count(best)
+            for command, score in zip(commands, summary.final_score):
+                scores[command].total_score += score
+                if score != best:
+                    scores[command].losses += 1
+                elif winners == 1:
+                    scores[command].wins += 1
+                else:
+                    scores[command].draws += 1
+        return sorted(scores.values(), key=lambda s: (-s.wins, -s.total_score, s.command))
+
+
+class BatchRunner:
+    """
+    Runs the matches of a BatchQueue in an event loop on its own thread, at most `concurrency` at a time.
+    All public methods may be called from the UI thread.
+    """
+    # Upper bound of progress updates per second and match
+    progress_rate = 10
+
+    def __init__(self, queue: BatchQueue, concurrency: int):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.started = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.__thread_main, name="slj-batch", daemon=True)
+        self.thread.start()
+        self.started.wait()
+
+    def __thread_main(self) -> None:
+        asyncio.run(self.__main())
+
+    async def __main(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        self.slots = asyncio.Condition()
+        self.running = 0
+        self.tasks: Set[asyncio.Task] = set()
+        async with JudgerRuntime() as runtime:
+            self.runtime = runtime
+            self.started.set()
+            await self.stopped.wait()
+            await self.__cancel_all()
+
+    def submit(self, entry: BatchEntry) -> None:
+        self.loop.call_soon_threadsafe(self.__create_task, entry)
+
+    def set_concurrency(self, concurrency: int) -> None:
+        self.loop.call_soon_threadsafe(lambda: self.__create_task(None, concurrency))
+
+    def cancel_all(self) -> None:
+        """
+        Stop running matches and drop queued ones. The runner keeps accepting new matches.
+        """
+        self.loop.call_soon_threadsafe(lambda: asyncio.ensure_future(self.__cancel_all()))
+
+    def close(self) -> None:
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.stopped.set)
+            self.thread.join()
+            self.loop = None
+
+    def __create_task(self, entry: Optional[BatchEntry], concurrency: Optional[int] = None) -> None:
+        coro = self.__play(entry) if entry is not None else self.__resize(concurrency)
+        task = asyncio.ensure_future(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def __cancel_all(self) -> None:
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def __resize(self, concurrency: int) -> None:
+        async with self.slots:
+            self.concurrency = concurrency
+            self.slots.notify_all()
+
+    async def __play(self, entry: BatchEntry) -> None:
+        acquired = False
+        try:
+            async with self.slots:
+                await self.slots.wait_for(lambda: self.running < self.concurrency)
+                self.running += 1
+                acquired = True
+            self.queue.update(entry, status=RUNNING)
+            Path(entry.spec.output).mkdir(parents=True, exist_ok=True)
+            summary = await self.runtime.run(entry.spec, setup=lambda judger: self.__watch(judger, entry))
+            self.queue.update(entry, status=FINISHED, summary=summary)
+        except asyncio.CancelledError:
+            self.queue.update(entry, status=CANCELLED)
+            raise
+        except Exception as e:
+            self.queue.update(entry, status=FAILED, error=str(e))
+        finally:
+            if acquired:
+                async with self.slots:
+                    self.running -= 1
+                    self.slots.notify_all()
+
+    def __watch(self, judger: Judger, entry: BatchEntry) -> None:
+        def handle_events(events: List[dict]):
+            rounds = [e["round"] for e in events if e.get("type") == JudgerEvent.NEW_ROUND]
+            if len(rounds) > 0:
+                self.queue.update(entry, round=rounds[-1])
+
+        # Only the latest round matters, at a bounded rate and without a worker thread
+        judger.event_bus.subscribe(handle_events, coalesce=[JudgerEvent.NEW_ROUND],
+                                   min_interval=1 / self.progress_rate, batch=True, threaded=False)
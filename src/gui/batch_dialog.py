@@ -0,0 +1,233 @@
+import json
+import time
+from pathlib import Path
+from typing import Optional
+
+from PySide6.QtCore import Qt, Slot, QTimer
+from PySide6.QtGui import QCloseEvent
+from PySide6.QtWidgets import QDialog, QGridLayout, QVBoxLayout, QHBoxLayout, QSpinBox, QLineEdit, QPushButton, \
+    QLabel, QFileDialog, QMessageBox, QPlainTextEdit, QCheckBox, QTableWidget, QTableWidgetItem, QHeaderView
+
+from core.match import MatchSpec
+from gui.batch import BatchQueue, BatchRunner, BatchEntry, WAITING, RUNNING
+
+
+class BatchDialog(QDialog):
+    """
+    Queue of matches run in the background. Every AI is launched by the judger with its command,
+    so a queued match needs no interaction. The tables are refreshed from the queue at a fixed rate.
+    """
+    refresh_rate = 10
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("批量评测")
+        self.resize(820, 640)
+
+        self.queue = BatchQueue()
+        self.runner: Optional[BatchRunner] = None
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000 // self.refresh_rate)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+        # Match configuration
+        self.logic_path = QLineEdit()
+        self.logic_path_btn = QPushButton("...")
+        self.logic_path_btn.clicked.connect(self.browseForLogicPath)
+
+        self.config_path = QLineEdit()
+        self.config_path.setPlaceholderText("可选")
+        self.config_path_btn = QPushButton("...")
+        self.config_path_btn.clicked.connect(self.browseForConfigFile)
+
+        self.output_path = QLineEdit()
+        self.output_path.setPlaceholderText("留空为当前目录下的 batch-<时间>")
+        self.output_path_btn = QPushButton("...")
+        self.output_path_btn.clicked.connect(self.browseForOutputPath)
+
+        self.ai_commands = QPlainTextEdit()
+        self.ai_commands.setPlaceholderText("每行一条AI启动命令，按座位顺序，例如：python3 ai.py")
+        self.ai_commands.setFixedHeight(80)
+
+        self.repeat = QSpinBox()
+        self.repeat.setRange(1, 1000)
+        self.rotate_seats = QCheckBox("轮换座位")
+        self.rotate_seats.setChecked(True)
+        self.add_btn = QPushButton("加入队列")
+        self.add_btn.clicked.connect(self.addMatches)
+
+        # Queue control
+        self.concurrency = QSpinBox()
+        self.concurrency.setRange(1, 64)
+        self.concurrency.setValue(2)
+        self.concurrency.valueChanged.connect(self.changeConcurrency)
+        self.cancel_btn = QPushButton("停止全部")
+        self.cancel_btn.clicked.connect(self.cancelAll)
+        self.summary_label = QLabel()
+
+        self.match_table = QTableWidget(0, 6)
+        self.match_table.setHorizontalHeaderLabels(["编号", "AI", "状态", "回合", "得分", "用时"])
+        self.match_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.match_table.verticalHeader().setVisible(False)
+        self.match_table.setEditTriggers(QTableWidget.NoEditTriggers)
+
+        self.score_table = QTableWidget(0, 7)
+        self.score_table.setHorizontalHeaderLabels(["AI", "对局", "胜", "平", "负", "异常", "总分"])
+        self.score_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.score_table.verticalHeader().setVisible(False)
+        self.score_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.score_table.setFixedHeight(140)
+
+        # Layout
+        form = QGridLayout()
+        form.addWidget(QLabel("逻辑启动脚本路径："), 0, 0)
+        form.addWidget(self.logic_path, 0, 1, 1, 3)
+        form.addWidget(self.logic_path_btn, 0, 4)
+        form.addWidget(QLabel("对局配置文件路径："), 1, 0)
+        form.addWidget(self.config_path, 1, 1, 1, 3)
+        form.addWidget(self.config_path_btn, 1, 4)
+        form.addWidget(QLabel("输出目录："), 2, 0)
+        form.addWidget(self.output_path, 2, 1, 1, 3)
+        form.addWidget(self.output_path_btn, 2, 4)
+        form.addWidget(QLabel("AI启动命令："), 3, 0, Qt.AlignTop)
+        form.addWidget(self.ai_commands, 3, 1, 1, 4)
+        form.addWidget(QLabel("对局次数"), 4, 0)
+        form.addWidget(self.repeat, 4, 1)
+        form.addWidget(self.rotate_seats, 4, 2)
+        form.addWidget(self.add_btn, 4, 4)
+
+        control = QHBoxLayout()
+        control.addWidget(QLabel("同时运行"))
+        control.addWidget(self.concurrency)
+        control.addWidget(self.summary_label, 1)
+        control.addWidget(self.cancel_btn)
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(form)
+        layout.addLayout(control)
+        layout.addWidget(self.match_table, 1)
+        layout.addWidget(QLabel("汇总"))
+        layout.addWidget(self.score_table)
+
+    def ensure_runner(self) -> BatchRunner:
+        if self.runner is None:
+            self.runner = BatchRunner(self.queue, self.concurrency.value())
+            self.runner.start()
+            self.refresh_timer.start()
+        return self.runner
+
+    @Slot()
+    def addMatches(self):
+        logic_path = Path(self.logic_path.text())
+        if not logic_path.is_file():
+            QMessageBox.critical(self, "输入无效", "逻辑启动脚本不存在")
+            return
+        commands = [line.strip() for line in self.ai_commands.toPlainText().splitlines() if line.strip()]
+        if len(commands) == 0:
+            QMessageBox.critical(self, "输入无效", "请至少填写一条AI启动命令")
+            return
+        config = {}
+        if len(self.config_path.text()) != 0:
+            try:
+                with open(self.config_path.text(), "r") as f:
+                    config = json.load(f)
+            except json.decoder.JSONDecodeError:
+                QMessageBox.critical(self, "输入无效", "对局配置文件不是合法的JSON")
+                return
+            except OSError:
+                QMessageBox.critical(self, "输入无效", "读取对局配置文件时出错")
+                return
+        if len(self.output_path.text()) == 0:
+            self.output_path.setText(str(Path.cwd() / time.strftime("batch-%Y%m%d-%H%M%S")))
+        output_root = Path(self.output_path.text())
+        try:
+            output_root.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            QMessageBox.critical(self, "输入无效", "无法创建输出目录")
+            return
+
+        runner = self.ensure_runner()
+        for game in range(self.repeat.value()):
+            shift = game % len(commands) if self.rotate_seats.isChecked() else 0
+            seats = commands[shift:] + commands[:shift]
+            index = len(self.queue.entries)
+            spec = MatchSpec(f"match-{index:04d}", str(logic_path.absolute()), len(seats), seats,
+                             str(output_root / f"match-{index:04d}"), config)
+            runner.submit(self.queue.add(spec))
+        self.refresh()
+
+    @Slot(int)
+    def changeConcurrency(self, value: int):
+        if self.runner is not None:
+            self.runner.set_concurrency(value)
+
+    @Slot()
+    def cancelAll(self):
+        if self.runner is not None:
+            self.runner.cancel_all()
+
+    @Slot()
+    def refresh(self):
+        changes = self.queue.take_changes()
+        if len(changes) == 0:
+            return
+        self.match_table.setRowCount(len(self.queue.entries))
+        for entry in changes:
+            self.set_row(entry)
+        counts = {}
+        for entry in self.queue.entries:
+            counts[entry.status] = counts.get(entry.status, 0) + 1
+        self.summary_label.setText("  ".join(f"{status} {count}" for status, count in counts.items()))
+        scores = self.queue.scores()
+        self.score_table.setRowCount(len(scores))
+        for row, score in enumerate(scores):
+            values = [score.command, score.played, score.wins, score.draws, score.losses, score.failures,
+                      score.total_score]
+            for column, value in enumerate(values):
+                self.score_table.setItem(row, column, QTableWidgetItem(str(value)))
+
+    def set_row(self, entry: BatchEntry):
+        score, elapsed, status = "", "", entry.status
+        if entry.summary is not None:
+            score = " : ".join(str(s) for s in entry.summary.final_score)
+            elapsed = f"{entry.summary.total_time:.1f}s"
+            status = f"{status} ({entry.summary.final_state.name})"
+        elif entry.error:
+            status = f"{status}: {entry.error}"
+        values = [entry.spec.match_id, " vs ".join(entry.spec.ai_commands), status, entry.round, score, elapsed]
+        for column, value in enumerate(values):
+            self.match_table.setItem(entry.index, column, QTableWidgetItem(str(value)))
+
+    def closeEvent(self, event: QCloseEvent) -> None:
+        running = any(e.status in (WAITING, RUNNING) for e in self.queue.entries)
+        if running:
+            btn = QMessageBox.warning(self, "确认关闭", "是否停止队列中的全部对局？", QMessageBox.Yes | QMessageBox.Cancel,
+                                      QMessageBox.Cancel)
+            if btn != QMessageBox.Yes:
+                event.ignore()
+                return
+        self.shutdown()
+        event.accept()
+
+    def shutdown(self):
+        self.refresh_timer.stop()
+        if self.runner is not None:
+            self.runner.close()
+            self.runner = None
+
+    @Slot()
+    def browseForLogicPath(self):
+        file_name = QFileDialog.getOpenFileName(self, "选择逻辑脚本")
+        if len(file_name) == 2:
+            self.logic_path.setText(file_name[0])
+
+    @Slot()
+    def browseForOutputPath(self):
+        dir_name = QFileDialog.getExistingDirectory(self, "选择输出目录", options=QFileDialog.ShowDirsOnly)
+        self.output_path.setText(dir_name)
+
+    @Slot()
+    def browseForConfigFile(self):
+        file_name = QFileDialog.getOpenFileName(self, "选择对局配置文件", filter="JSON 文件 (*.json)")
+        if len(file_name) == 2:
+            self.config_path.setText(file_name[0])
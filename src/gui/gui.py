@@ -4,6 +4,7 @@ from PySide6.QtCore import QObject, Slot
 from PySide6.QtWidgets import QApplication, QMessageBox
 
 from . import glob_var
+from .batch_dialog import BatchDialog
 from .running_dialog import RunningDialog
 from .start_dialog import StartDialog
 
@@ -15,12 +16,14 @@ class Main(QObject):
 
         self.start_dialog = StartDialog()
         self.running_dialog = RunningDialog()
+        self.batch_dialog = BatchDialog()
 
         self.start_dialog.accepted.connect(self.openRunningDialog)
         self.running_dialog.accepted.connect(self.openStartDialog)
 
         self.start_dialog.rejected.connect(self.closeApp)
         self.running_dialog.rejected.connect(self.closeApp)
+        self.start_dialog.batch_requested.connect(self.openBatchDialog)
 
         self.start_dialog.open()
         self.app.exec()
@@ -35,8 +38,15 @@ class Main(QObject):
         self.running_dialog.open()
         self.running_dialog.launch_judger()
 
+    @Slot()
+    def openBatchDialog(self):
+        # Not modal, single games can still be started while the queue runs
+        self.batch_dialog.show()
+        self.batch_dialog.raise_()
+
     @Slot()
     def closeApp(self):
+        self.batch_dialog.shutdown()
         self.app.quit()
 
 
@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from PySide6.QtCore import Qt, QPointF, QRectF
+from PySide6.QtGui import QColor, QPainter, QPen, QPolygonF, QPaintEvent
+from PySide6.QtWidgets import QWidget, QSizePolicy
+
+from core.judger import JudgerEvent
+
+_SERIES_COLORS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f"]
+
+
+class LiveStats:
+    """
+    Aggregates judger events into fixed-length histories of rounds/sec and per-AI response time.
+    handle_events() is called by the event bus from a worker thread, sample() is called by the UI timer.
+    Both only touch a few counters, so the cost does not depend on how fast rounds go by.
+    """
+
+    def __init__(self, history: int = 300):
+        self.history = history
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.current_round = 0
+            self.last_round = 0
+            self.last_sample_time: Optional[float] = None
+            self.pending_response: Dict[int, Tuple[float, int]] = {}
+            self.round_rate: Deque[float] = deque(maxlen=self.history)
+            self.response_time: Dict[int, Deque[float]] = {}
+
+    def handle_events(self, events: List[dict]):
+        with self.lock:
+            for event in events:
+                type: JudgerEvent = event.get("type")
+                if type == JudgerEvent.NEW_ROUND:
+                    self.current_round = event.get("round")
+                elif type == JudgerEvent.AI_RESPONDED:
+                    ai_id = event.get("ai_id")
+                    total, count = self.pending_response.get(ai_id, (0, 0))
+                    self.pending_response[ai_id] = (total + event.get("elapsed"), count + 1)
+
+    def sample(self):
+        now = time.monotonic()
+        with self.lock:
+            if self.last_sample_time is None:
+                self.last_sample_time = now
+                self.last_round = self.current_round
+                return
+            interval = now - self.last_sample_time
+            if interval <= 0:
+                return
+            self.round_rate.append(max(self.current_round - self.last_round, 0) / interval)
+            self.last_round = self.current_round
+            self.last_sample_time = now
+            for ai_id in self.pending_response:
+                if ai_id not in self.response_time:
+                    self.response_time[ai_id] = deque(maxlen=self.history)
+            for ai_id, series in self.response_time.items():
+                total, count = self.pending_response.get(ai_id, (0, 0))
+                # Keep the last value when an AI was not listened in this interval
+                if count > 0:
+                    series.append(total / count)
+                elif len(series) > 0:
+                    series.append(series[-1])
+            self.pending_response.clear()
+
+    def snapshot_round_rate(self) -> Dict[str, List[float]]:
+        with self.lock:
+            return {"回合/秒": list(self.round_rate)}
+
+    def snapshot_response_time(self) -> Dict[str, List[float]]:
+        with self.lock:
+            return {f"AI {ai_id}": list(series) for ai_id, series in sorted(self.response_time.items())}
+
+
+class LiveChart(QWidget):
+    """
+    Lightweight line chart of bounded series. Every series is drawn as a single polyline.
+    """
+
+    def __init__(self, title: str, unit: str, history: int):
+        super().__init__()
+        self.title = title
+        self.unit = unit
+        self.history = history
+        self.series: Dict[str, List[float]] = {}
+        self.setMinimumHeight(110)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+
+    def set_series(self, series: Dict[str, List[float]]):
+        self.series = series
+        self.update()
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        metrics = painter.fontMetrics()
+        line_height = metrics.height()
+
+        max_value = max((max(values) for values in self.series.values() if len(values) > 0), default=0)
+        latest = ", ".join(f"{name}: {values[-1]:.1f}" for name, values in self.series.items() if len(values) > 0)
+        painter.drawText(QRectF(0, 0, self.width(), line_height), Qt.AlignLeft,
+                         f"{self.title} ({self.unit})  {latest}")
+
+        plot = QRectF(0, line_height + 2, self.width() - 1, self.height() - line_height - 3)
+        painter.setPen(QPen(QColor("#c0c0c0")))
+        painter.drawRect(plot)
+        if max_value <= 0:
+            painter.end()
+            return
+        painter.drawText(plot.adjusted(2, 0, 0, 0), Qt.AlignLeft | Qt.AlignTop, f"{max_value:.1f}")
+
+        x_step = plot.width() / max(self.history - 1, 1)
+        y_scale = plot.height() / (max_value * 1.1)
+        for index, values in enumerate(self.series.values()):
+            # Align the newest sample to the right edge
+            x_offset = plot.right() - (len(values) - 1) * x_step
+            polygon = QPolygonF([QPointF(x_offset + i * x_step, plot.bottom() - v * y_scale)
+                                 for i, v in enumerate(values)])
+            painter.setPen(QPen(QColor(_SERIES_COLORS[index % len(_SERIES_COLORS)]), 1.5))
+            painter.drawPolyline(polygon)
+        painter.end()
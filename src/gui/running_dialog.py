@@ -1,12 +1,14 @@
 from typing import List
 
-from PySide6.QtCore import Qt, Signal, Slot, QObject, QThread
+from PySide6.QtCore import Qt, Signal, Slot, QObject, QThread, QTimer
 from PySide6.QtGui import QFont, QCloseEvent
 from PySide6.QtWidgets import QDialog, QVBoxLayout, QProgressBar, QLabel, QMessageBox
 
+from core.event_bus import Subscription
 from core.judger import JudgerEvent
 from core.logger import set_log_output_file
 from gui import glob_var
+from gui.live_chart import LiveChart, LiveStats
 
 
 class JudgerRunner(QObject):
@@ -18,7 +20,6 @@ class JudgerRunner(QObject):
         try:
             set_log_output_file(glob_var.judger_config.get("output"))
             glob_var.summary = glob_var.judger.start()
-            glob_var.judger.set_event_handler(None)
             self.finished.emit()
         except Exception as e:
             self.crashed.emit(e)
@@ -26,10 +27,15 @@ class JudgerRunner(QObject):
 
 class RunningDialog(QDialog):
     need_refresh = Signal()
+    # Upper bound of refreshes per second requested by judger events
+    refresh_rate = 30
+    # Charts are sampled and repainted at this fixed rate, independent of the round rate
+    chart_rate = 5
+    chart_history = 120
 
     def __init__(self):
         super().__init__()
-        self.setFixedSize(450, 200)
+        self.setFixedSize(450, 480)
 
         # States
         self.listen_addr = None
@@ -39,7 +45,12 @@ class RunningDialog(QDialog):
         self.judger_log_text = ""
         self.judger_runner = None
         self.judger_thread = None
+        self.subscriptions: List[Subscription] = []
         self.need_refresh.connect(self.refresh)
+        self.live_stats = LiveStats(self.chart_history)
+        self.chart_timer = QTimer(self)
+        self.chart_timer.setInterval(1000 // self.chart_rate)
+        self.chart_timer.timeout.connect(self.refresh_charts)
 
         # Components
         self.main_state = QLabel()
@@ -61,6 +72,9 @@ class RunningDialog(QDialog):
         self.round_info = QLabel()
         self.round_info.setAlignment(Qt.AlignCenter)
 
+        self.round_rate_chart = LiveChart("回合速率", "回合/秒", self.chart_history)
+        self.response_time_chart = LiveChart("AI响应时间", "毫秒", self.chart_history)
+
         self.refresh()
 
         # Layout
@@ -70,9 +84,19 @@ class RunningDialog(QDialog):
         layout.addWidget(self.port_info)
         layout.addWidget(self.player_info)
         layout.addWidget(self.round_info)
+        layout.addWidget(self.round_rate_chart)
+        layout.addWidget(self.response_time_chart)
 
     def launch_judger(self):
-        glob_var.judger.set_event_handler(self.handle_judger_event)
+        event_bus = glob_var.judger.event_bus
+        self.live_stats.reset()
+        self.subscriptions = [
+            event_bus.subscribe(self.handle_judger_event, coalesce=[JudgerEvent.NEW_ROUND],
+                                min_interval=1 / self.refresh_rate, batch=True),
+            event_bus.subscribe(self.live_stats.handle_events, coalesce=[JudgerEvent.NEW_ROUND],
+                                min_interval=1 / self.chart_rate, batch=True),
+        ]
+        self.chart_timer.start()
         self.judger_runner = JudgerRunner()
         self.judger_thread = QThread(self)
         self.judger_thread.started.connect(self.judger_runner.run)
@@ -82,8 +106,15 @@ class RunningDialog(QDialog):
         self.judger_runner.crashed.connect(self.judge_crashed)
         self.judger_thread.start()
 
+    def stop_updates(self):
+        for subscription in self.subscriptions:
+            glob_var.judger.event_bus.unsubscribe(subscription)
+        self.subscriptions = []
+        self.chart_timer.stop()
+
     @Slot()
     def judge_finished(self):
+        self.stop_updates()
         self.judger_thread.quit()
         self.judger_thread.wait()
         self.accept()
@@ -91,23 +122,28 @@ class RunningDialog(QDialog):
     @Slot(Exception)
     def judge_crashed(self, e: Exception):
         QMessageBox.critical(self, "评测机异常退出", "评测机崩溃，请向Saiblo维护人员汇报此问题：\n" + str(e))
+        self.stop_updates()
         self.judger_thread.quit()
         self.judger_thread.wait()
         self.reject()
 
-    def handle_judger_event(self, **kwargs):
-        type: JudgerEvent = kwargs.get("type")
-        if type == JudgerEvent.TCP_SERVER_STARTED:
-            self.listen_addr = kwargs.get("addr")
-        elif type == JudgerEvent.AI_CONNECTED:
-            self.current_player_count = self.current_player_count + 1
-        elif type == JudgerEvent.NEW_ROUND:
-            self.current_round = self.current_round + 1
-        elif type == JudgerEvent.GAME_OVER:
-            self.judger_exited = True
-        else:
-            return
-        self.need_refresh.emit()
+    def handle_judger_event(self, events: List[dict]):
+        changed = False
+        for event in events:
+            type: JudgerEvent = event.get("type")
+            if type == JudgerEvent.TCP_SERVER_STARTED:
+                self.listen_addr = event.get("addr")
+            elif type == JudgerEvent.AI_CONNECTED:
+                self.current_player_count = self.current_player_count + 1
+            elif type == JudgerEvent.NEW_ROUND:
+                self.current_round = event.get("round")
+            elif type == JudgerEvent.GAME_OVER:
+                self.judger_exited = True
+            else:
+                continue
+            changed = True
+        if changed:
+            self.need_refresh.emit()
 
     def closeEvent(self, event: QCloseEvent) -> None:
         btn = QMessageBox.warning(self, "确认关闭", "是否停止正在运行的本地评测机？", QMessageBox.Yes | QMessageBox.Cancel,
@@ -117,12 +153,19 @@ class RunningDialog(QDialog):
                 glob_var.judger.shutdown()
             except:
                 pass
+            self.stop_updates()
             self.judger_thread.quit()
             self.judger_thread.wait()
             event.accept()
         else:
             event.ignore()
 
+    @Slot()
+    def refresh_charts(self):
+        self.live_stats.sample()
+        self.round_rate_chart.set_series(self.live_stats.snapshot_round_rate())
+        self.response_time_chart.set_series(self.live_stats.snapshot_response_time())
+
     @Slot()
     def refresh(self):
         text: List[str] = ["", "", "", ""]
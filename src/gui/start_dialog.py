@@ -2,7 +2,7 @@ import json
 import random
 from pathlib import Path
 
-from PySide6.QtCore import Slot
+from PySide6.QtCore import Signal, Slot
 from PySide6.QtWidgets import QDialog, QGridLayout, QSpinBox, QLineEdit, QPushButton, QLabel, QFileDialog, QMessageBox
 
 from core.judger import Judger
@@ -10,6 +10,8 @@ from gui import glob_var
 
 
 class StartDialog(QDialog):
+    batch_requested = Signal()
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("启动本地评测机")
@@ -27,6 +29,8 @@ class StartDialog(QDialog):
         self.confirm_btn = QPushButton("Let's GO!")
         self.confirm_btn.clicked.connect(self.launchJudger)
         self.help_btn = QPushButton("Help")
+        self.batch_btn = QPushButton("批量评测")
+        self.batch_btn.clicked.connect(self.batch_requested)
 
         self.logic_path = QLineEdit()
         self.logic_path_btn = QPushButton("...")
@@ -51,6 +55,7 @@ class StartDialog(QDialog):
         layout.addWidget(self.judger_port, 0, 3)
         layout.addWidget(self.confirm_btn, 0, 4)
         layout.addWidget(self.help_btn, 0, 5)
+        layout.addWidget(self.batch_btn, 0, 6)
 
         layout.addWidget(QLabel("逻辑启动脚本路径："), 1, 0)
         layout.addWidget(self.logic_path, 1, 1, 1, 4)
@@ -1,13 +1,12 @@
 import argparse
 import json
-import random
 import sys
 from json import JSONDecodeError
 from pathlib import Path
 
 from core.exception import JudgerIllegalState
-from core.judger import Judger
-from core.logger import LOG, set_log_output_file
+from core.logger import LOG, close_log_output_file, set_log_output_file
+from core.placement import available_cores
 
 version = "v0.0.2"
 
@@ -19,8 +18,51 @@ def main():
     parser.add_argument("--configFile", type=str, help="Game config file.")
     parser.add_argument("--output", type=str, help="Output directory.")
     parser.add_argument("--logicPath", type=str, help="Required. Path to logic executable.")
-    parser.add_argument("--protocolVersion", type=int, help="Communication protocol version.", default=1)
+    parser.add_argument("--protocolVersion", type=int, default=1,
+                        help="Communication protocol version. 1 is JSON, 2 is the compact binary protocol.")
+    parser.add_argument("--aiCommand", type=str, action="append", default=[],
+                        help="Launch an AI talking through stdin/stdout with this command. Can be repeated. "
+                             "Launched AIs take the first seats, remaining seats wait for TCP connections.")
+    parser.add_argument("--observerPort", type=int,
+                        help="Serve the live game stream to spectators on this port. 0 for a random port.")
+    parser.add_argument("--observerBuffer", type=int, default=256, help="Frames buffered for each spectator.")
+    parser.add_argument("--observerPolicy", type=str, choices=["drop", "skip"], default="drop",
+                        help="What to do when a spectator falls behind: drop the oldest frames "
+                             "or skip to the newest frame.")
+    parser.add_argument("--seed", type=int,
+                        help="Seed of the match. Only used to tell apart cached results of the same match.")
+    parser.add_argument("--cacheDir", type=str,
+                        help="Result cache directory. Requires every AI to be launched by --aiCommand.")
+    parser.add_argument("--cacheMaxSize", type=int, default=1024, help="Result cache size limit in MiB.")
+    parser.add_argument("--forceRerun", action="store_true", help="Run the match even if its result is cached.")
+    parser.add_argument("--memoryLimit", type=int, help="Memory limit of each launched process in MiB.")
+    parser.add_argument("--cpuTimeLimit", type=int, help="CPU time limit of each launched process in seconds.")
+    parser.add_argument("--processLimit", type=int, help="Process count limit of each launched process.")
+    parser.add_argument("--openFileLimit", type=int, help="Open file limit of each launched process.")
+    parser.add_argument("--cpuAffinity", type=str,
+                        help="Pin the logic and launched AIs to these cores, e.g. 0,1,2.")
+    parser.add_argument("--replayFifo", action="store_true",
+                        help="Hand the logic a named pipe as replay file and gzip the replay while it is written.")
+    parser.add_argument("--compress", action="store_true",
+                        help="Gzip the artifacts after the game and describe them in manifest.json.")
+    parser.add_argument("--keepLast", type=int,
+                        help="Keep only the newest N processed outputs under --outputRoot.")
+    parser.add_argument("--keepFailuresOnly", action="store_true",
+                        help="Remove processed outputs under --outputRoot of games that ended normally.")
+    parser.add_argument("--maxOutputSize", type=int,
+                        help="Remove the oldest processed outputs under --outputRoot above this size in MiB.")
+    parser.add_argument("--outputRoot", type=str, default="judger-outputs",
+                        help="Directory dedicated to the outputs the retention options manage. The default output "
+                             "is created in it when any of them is given.")
+    parser.add_argument("--resultsDb", type=str,
+                        help="Also store the summary with its event timeline into this SQLite database, "
+                             "see judger_results.")
     args = parser.parse_args()
+    # Loaded after the arguments are checked, so that usage errors and --help return at once
+    import asyncio
+    from core.judger import Judger
+    from core.match import MatchSpec, run_match
+    from core.process import ResourceLimits
 
     def require_not_none(x):
         if x is None:
@@ -34,6 +76,23 @@ def main():
     output = args.output
     logic_path = require_not_none(args.logicPath)
     protocol_version = args.protocolVersion
+    limits = ResourceLimits(
+        memory=args.memoryLimit * 1024 * 1024 if args.memoryLimit is not None else None,
+        cpu_time=args.cpuTimeLimit,
+        processes=args.processLimit,
+        open_files=args.openFileLimit
+    )
+
+    cpu_affinity = None
+    if args.cpuAffinity:
+        try:
+            cpu_affinity = [int(core) for core in args.cpuAffinity.split(",")]
+        except ValueError:
+            parser.error("--cpuAffinity must be a comma separated list of cores")
+        unavailable = sorted(set(cpu_affinity) - set(available_cores()))
+        if len(unavailable) > 0:
+            parser.error(f"--cpuAffinity cores {unavailable} are not available, "
+                         f"available cores are {sorted(available_cores())}")
 
     config = {}
     if config_file:
@@ -47,8 +106,13 @@ def main():
             LOG.exception("Failed to parse json in config file [{}]".format(config_file))
             exit(1)
 
+    retention = args.keepLast is not None or args.keepFailuresOnly or args.maxOutputSize is not None
+    output_root = Path.cwd() / args.outputRoot
     if not output:
+        import random
         output = "res-{:010d}".format(random.randrange(0, 10000000000))
+        if retention:
+            output = str(output_root / output)
 
     output_dir = Path.cwd() / output
     # Make sure output directory is existed
@@ -80,9 +144,58 @@ def main():
         "config": config,
         "output": output_dir,
         "logic_path": Path.cwd() / logic_path,
-        "protocol_version": protocol_version
+        "protocol_version": protocol_version,
+        "ai_commands": args.aiCommand,
+        "limits": limits,
+        "observer_port": args.observerPort,
+        "observer_buffer": args.observerBuffer,
+        "observer_policy": args.observerPolicy,
+        "replay_fifo": args.replayFifo,
+        "cpu_affinity": cpu_affinity
     }
+    cache = None
+    if args.cacheDir:
+        if len(args.aiCommand) < player_count:
+            LOG.warning("Result cache is disabled because not every AI is launched by --aiCommand")
+        else:
+            from core.result_cache import ResultCache
+            cache = ResultCache(Path.cwd() / args.cacheDir, args.cacheMaxSize * 1024 * 1024)
+
     LOG.info("Launching local judger with config[%s]", judger_config)
-    summary = Judger(**judger_config).start()
+    if cache is not None:
+        spec = MatchSpec(output_dir.name, str(judger_config["logic_path"]), player_count, args.aiCommand,
+                         str(output_dir), config, protocol_version, args.seed, limits)
+        summary = asyncio.run(run_match(spec, cache, args.forceRerun, **judger_config, handle_signals=True))
+    else:
+        summary = Judger(**judger_config).start()
     LOG.info("Judger existed. Summary:")
     LOG.info("%s", summary)
+
+    if args.resultsDb:
+        from core.results_store import MatchRecord, ResultsStore
+        # Seats waiting for TCP connections are only known by their number
+        players = args.aiCommand + [f"tcp{seat}" for seat in range(len(args.aiCommand), player_count)]
+        store = ResultsStore(Path.cwd() / args.resultsDb)
+        try:
+            store.insert([MatchRecord(output_dir.name, players, summary, str(output_dir.parent),
+                                      str(judger_config["logic_path"]))])
+        finally:
+            store.close()
+
+    if args.compress or retention:
+        # Only imported when needed, it pulls in multiprocessing
+        from core.postprocess import PostGamePipeline, RetentionPolicy
+        policy = RetentionPolicy(args.keepLast, args.keepFailuresOnly,
+                                 args.maxOutputSize * 1024 * 1024 if args.maxOutputSize is not None else None)
+        if retention and output_dir.resolve().parent != output_root.resolve():
+            # Anywhere else the policy could remove directories that are not ours
+            LOG.warning("Retention options only manage outputs directly under %s, no output is removed",
+                        output_root)
+            policy = RetentionPolicy()
+        # judger.log is part of the artifacts
+        close_log_output_file()
+        pipeline = PostGamePipeline(output_root, policy, args.compress, 1)
+        try:
+            asyncio.run(pipeline.process(output_dir, summary))
+        finally:
+            pipeline.close()
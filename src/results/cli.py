@@ -0,0 +1,143 @@
+import argparse
+import json
+import statistics
+import sys
+from pathlib import Path
+from typing import List
+
+from core.results_store import MatchRecord, ResultsStore, percentile
+from core.summary import JudgeSummary
+
+
+def rate(count: int, total: int) -> str:
+    return f"{100 * count / total:.1f}%" if total > 0 else "-"
+
+
+def show_ai(store: ResultsStore, args: argparse.Namespace) -> None:
+    print(f"{'AI':<24}{'Played':>8}{'Win':>8}{'Draw':>8}{'Loss':>8}{'Fail':>8}{'Crash':>8}{'TLE':>8}{'OLE':>8}"
+          f"{'Score':>10}")
+    for s in store.ai_stats(args.source):
+        score = f"{s.mean_score:.2f}" if s.mean_score is not None else "-"
+        print(f"{s.ai:<24}{s.played:>8}{rate(s.wins, s.played):>8}{rate(s.draws, s.played):>8}"
+              f"{rate(s.losses, s.played):>8}{rate(s.failures, s.played):>8}{rate(s.crashes, s.played):>8}"
+              f"{rate(s.tles, s.played):>8}{rate(s.oles, s.played):>8}{score:>10}")
+
+
+def show_scores(store: ResultsStore, args: argparse.Namespace) -> None:
+    print(f"{'AI':<24}{'Games':>8}{'Mean':>10}{'Stdev':>10}{'Min':>10}{'P25':>10}{'Median':>10}{'P75':>10}"
+          f"{'Max':>10}")
+    distributions = store.scores(args.source)
+    for ai, scores in distributions.items():
+        stdev = statistics.pstdev(scores)
+        print(f"{ai:<24}{len(scores):>8}{statistics.mean(scores):>10.2f}{stdev:>10.2f}{scores[0]:>10g}"
+              f"{percentile(scores, 25):>10g}{percentile(scores, 50):>10g}{percentile(scores, 75):>10g}"
+              f"{scores[-1]:>10g}")
+    if args.bins is None:
+        return
+    for ai, scores in distributions.items():
+        low, high = scores[0], scores[-1]
+        width = (high - low) / args.bins or 1
+        counts = [0] * args.bins
+        for score in scores:
+            counts[min(args.bins - 1, int((score - low) / width))] += 1
+        print(f"\n{ai}")
+        for index, count in enumerate(counts):
+            bar = "#" * round(40 * count / max(counts))
+            print(f"  [{low + index * width:>10g}, {low + (index + 1) * width:>10g}) {count:>8} {bar}")
+
+
+def show_rounds(store: ResultsStore, args: argparse.Namespace) -> None:
+    stats = store.round_stats(args.source)
+    print(f"Matches: {stats.matches}, {stats.mean_rounds:.1f} rounds and {stats.mean_match_time:.2f} s on average")
+    print(f"Rounds: {stats.count}")
+    if stats.count == 0:
+        return
+    print(f"Round duration (ms): mean {1000 * stats.mean:.2f}, min {1000 * stats.min:.2f}, "
+          + ", ".join(f"p{q} {1000 * value:.2f}" for q, value in stats.percentiles.items())
+          + f", max {1000 * stats.max:.2f}")
+
+
+def show_timeline(store: ResultsStore, args: argparse.Namespace) -> None:
+    events = store.timeline(args.match, args.source)
+    if len(events) == 0:
+        print(f"Match {args.match} is not stored")
+        sys.exit(1)
+    start = {}
+    for source, seq, type, time, round, ai_id, elapsed_time, comment in events:
+        begin = start.setdefault(source, time)
+        print(f"{source:<24}{seq:>5}{time - begin:>10.3f}s  {type:<16}round {round:<6}ai {ai_id:<4}"
+              f"elapsed {elapsed_time:<10.3f}{comment}")
+
+
+def show_sources(store: ResultsStore, args: argparse.Namespace) -> None:
+    for source, count in store.sources():
+        print(f"{count:>8}  {source}")
+
+
+def load_tournament(directory: Path) -> List[MatchRecord]:
+    """
+    Records of the finished matches of a tournament directory, from its state and the summaries of its matches.
+    Matches whose output was removed by a retention policy have no timeline and are skipped.
+    """
+    state = json.loads((directory / "state.json").read_text())
+    records = []
+    for match in state["matches"]:
+        if match.get("bye") or match["id"] not in state["results"]:
+            continue
+        try:
+            data = json.loads((directory / "matches" / match["id"] / "summary.json").read_text())
+        except (OSError, ValueError):
+            continue
+        records.append(MatchRecord(match["id"], match["players"], JudgeSummary.from_dict(data), str(directory),
+                                   state["roster"]["logic"]))
+    return records
+
+
+def import_tournaments(store: ResultsStore, args: argparse.Namespace) -> None:
+    for name in args.directories:
+        directory = Path.cwd() / name
+        try:
+            records = load_tournament(directory)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"{name}: not a tournament directory ({e})")
+            continue
+        store.insert(records)
+        print(f"{name}: imported {len(records)} matches")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="judger_results",
+                                     description="Query match results stored with --resultsDb.")
+    parser.add_argument("database", type=str, help="Results database file.")
+    parser.add_argument("--source", type=str,
+                        help="Only matches of this source: the tournament directory, or the directory holding the "
+                             "outputs of judger_cli. See the sources command.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("ai", help="Win, draw, loss, failure, crash, TLE and OLE rates and mean score of every AI.")
+    scores = commands.add_parser("scores", help="Final score distribution of every AI, over games that ended "
+                                                "normally.")
+    scores.add_argument("--bins", type=int, help="Also print a histogram with this many bins.")
+    commands.add_parser("rounds", help="Round duration statistics.")
+    timeline = commands.add_parser("timeline", help="Event timeline of a match.")
+    timeline.add_argument("match", type=str, help="Match id.")
+    commands.add_parser("sources", help="Sources and their match counts.")
+    importer = commands.add_parser("import", help="Store the finished matches of existing tournament directories.")
+    importer.add_argument("directories", type=str, nargs="+", help="Tournament directories.")
+    args = parser.parse_args()
+    if args.command != "import" and not Path(args.database).is_file():
+        parser.error(f"{args.database} does not exist")
+    if getattr(args, "bins", None) is not None and args.bins < 1:
+        parser.error("--bins must be at least 1")
+
+    store = ResultsStore(Path.cwd() / args.database)
+    try:
+        {
+            "ai": show_ai,
+            "scores": show_scores,
+            "rounds": show_rounds,
+            "timeline": show_timeline,
+            "sources": show_sources,
+            "import": import_tournaments,
+        }[args.command](store, args)
+    finally:
+        store.close()
@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from json import JSONDecodeError
+from pathlib import Path
+
+from core.logger import LOG, set_console_level, set_log_output_file
+from core.placement import CorePool, available_cores
+from core.postprocess import PostGamePipeline, RetentionPolicy
+from core.result_cache import ResultCache
+from core.results_store import ResultsStore
+from cluster.coordinator import Coordinator
+from .scheduler import Tournament
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="judger_tournament",
+        description="Run a tournament of AIs with SaibloLocalJudger. "
+                    "Run the same command again to resume an interrupted tournament.")
+    parser.add_argument("roster", type=str,
+                        help='Roster JSON file: {"logic": path, "player_count": 2, "config": {}, '
+                             '"format": "round_robin" | "swiss" | "gauntlet", "rounds": 1, "challenger": name, '
+                             '"concurrency": 4, "ais": {name: command}}')
+    parser.add_argument("--dir", type=str, default="tournament", help="Tournament state and output directory.")
+    parser.add_argument("--concurrency", type=int, help="Maximum count of matches running at the same time.")
+    parser.add_argument("--cacheDir", type=str, help="Result cache directory shared between tournaments.")
+    parser.add_argument("--cacheMaxSize", type=int, default=1024, help="Result cache size limit in MiB.")
+    parser.add_argument("--forceRerun", action="store_true", help="Run matches even if their results are cached.")
+    parser.add_argument("--coresPerMatch", type=int,
+                        help="Pin the logic and AIs of every match to this many cores of its own. Matches wait "
+                             "until enough cores are free, so at most cores / N matches run at the same time.")
+    parser.add_argument("--workers", type=str,
+                        help="Listen on host:port for worker nodes (judger_worker) and run every match on them "
+                             "instead of locally. The host defaults to 127.0.0.1, use 0.0.0.0 together with "
+                             "--workersToken to accept workers of other machines.")
+    parser.add_argument("--workersToken", type=str, help="Shared token workers must present to join.")
+    parser.add_argument("--heartbeatTimeout", type=float, default=30,
+                        help="Seconds of silence after which a worker is considered dead.")
+    parser.add_argument("--replayFifo", action="store_true",
+                        help="Hand the logic a named pipe as replay file and gzip the replay while it is written.")
+    parser.add_argument("--compress", action="store_true",
+                        help="Gzip the artifacts of every finished match and describe them in manifest.json.")
+    parser.add_argument("--keepLast", type=int, help="Keep only the outputs of the newest N matches.")
+    parser.add_argument("--keepFailuresOnly", action="store_true",
+                        help="Remove the outputs of matches that ended normally. Results are kept in state.json.")
+    parser.add_argument("--maxOutputSize", type=int,
+                        help="Remove the outputs of the oldest matches above this size in MiB.")
+    parser.add_argument("--resultsDb", type=str,
+                        help="Also store every summary with its event timeline into this SQLite database, "
+                             "see judger_results.")
+    parser.add_argument("--verbose", action="store_true", help="Log every judger message to console.")
+    args = parser.parse_args()
+
+    try:
+        with open(args.roster, "r") as f:
+            roster = json.load(f)
+    except (IOError, JSONDecodeError):
+        LOG.exception("Failed to read roster file %s", args.roster)
+        sys.exit(1)
+
+    directory = Path.cwd() / args.dir
+    directory.mkdir(parents=True, exist_ok=True)
+    set_log_output_file(directory)
+    if not args.verbose:
+        set_console_level(logging.WARNING)
+
+    tournament = Tournament(roster, directory)
+    if args.cacheDir:
+        tournament.cache = ResultCache(Path.cwd() / args.cacheDir, args.cacheMaxSize * 1024 * 1024)
+    tournament.force_rerun = args.forceRerun
+    tournament.on_result = lambda match, summary: print(
+        f"[{len(tournament.results)}/{len(tournament.matches)}] {match['id']} {' vs '.join(match['players'])}: "
+        f"{summary.final_state.name} {summary.final_score}"
+        + (f" on cores {summary.placement}" if summary.placement else ""))
+    if args.coresPerMatch is not None:
+        if not 1 <= args.coresPerMatch <= len(available_cores()):
+            parser.error(f"--coresPerMatch must be between 1 and the {len(available_cores())} available cores")
+        tournament.cores = CorePool(args.coresPerMatch)
+        print(f"Matches are pinned to {args.coresPerMatch} of {len(tournament.cores.cores)} cores, "
+              f"at most {tournament.cores.capacity} run at the same time")
+    if args.workers:
+        host, _, port = args.workers.rpartition(":")
+        tournament.coordinator = Coordinator(host or "127.0.0.1", int(port), args.heartbeatTimeout,
+                                             token=args.workersToken)
+    if args.replayFifo:
+        tournament.judger_options["replay_fifo"] = True
+    policy = RetentionPolicy(args.keepLast, args.keepFailuresOnly,
+                             args.maxOutputSize * 1024 * 1024 if args.maxOutputSize is not None else None)
+    if args.compress or not policy.is_empty():
+        tournament.pipeline = PostGamePipeline(directory / "matches", policy, args.compress)
+    if args.resultsDb:
+        tournament.results_store = ResultsStore(Path.cwd() / args.resultsDb)
+    try:
+        standings = asyncio.run(tournament.run(args.concurrency))
+    finally:
+        if tournament.pipeline is not None:
+            tournament.pipeline.close()
+        if tournament.results_store is not None:
+            tournament.results_store.close()
+    print(f"{'AI':<20}{'Rating':>8}{'Played':>8}{'Win':>6}{'Draw':>6}{'Loss':>6}{'Fail':>6}")
+    for s in sorted(standings.values(), key=lambda s: -s.rating):
+        print(f"{s.name:<20}{s.rating:>8.1f}{s.played:>8}{s.wins:>6}{s.draws:>6}{s.losses:>6}{s.failures:>6}")
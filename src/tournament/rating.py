@@ -0,0 +1,37 @@
+import itertools
+from typing import Dict, List
+
+
+class EloRating:
+    """
+    Elo ratings generalized to games of more than two players:
+    every pair of players in a game is scored as a two-player result and the changes are averaged.
+    """
+    initial: float
+    k: float
+    ratings: Dict[str, float]
+
+    def __init__(self, names: List[str], initial: float = 1500, k: float = 32):
+        self.initial = initial
+        self.k = k
+        self.ratings = {name: initial for name in names}
+
+    def expected(self, a: str, b: str) -> float:
+        return 1 / (1 + 10 ** ((self.ratings[b] - self.ratings[a]) / 400))
+
+    def update(self, players: List[str], scores: List[int]) -> None:
+        """
+        players[i] got scores[i]. A higher score wins.
+        """
+        if len(players) < 2:
+            return
+        delta = {name: 0.0 for name in players}
+        for i, j in itertools.combinations(range(len(players)), 2):
+            a, b = players[i], players[j]
+            actual = 1 if scores[i] > scores[j] else 0 if scores[i] < scores[j] else 0.5
+            change = actual - self.expected(a, b)
+            delta[a] += change
+            delta[b] -= change
+        scale = self.k / (len(players) - 1)
+        for name, value in delta.items():
+            self.ratings[name] += scale * value
@@ -0,0 +1,301 @@
+import asyncio
+import dataclasses
+import itertools
+import json
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+from cluster.coordinator import Coordinator
+from core.exception import JudgerIllegalState
+from core.logger import LOG
+from core.match import MatchSpec
+from core.placement import CorePool
+from core.postprocess import PostGamePipeline
+from core.process import ResourceLimits
+from core.result_cache import ResultCache
+from core.results_store import MatchRecord, ResultsStore
+from core.runtime import JudgerRuntime
+from core.summary import JudgeSummary, JudgeState
+from .rating import EloRating
+
+FORMATS = ("round_robin", "swiss", "gauntlet")
+
+
+@dataclasses.dataclass
+class Standing:
+    name: str
+    rating: float
+    played: int = 0
+    wins: int = 0
+    draws: int = 0
+    losses: int = 0
+    failures: int = 0
+    points: float = 0
+
+
+class Tournament:
+    """
+    Schedules the matches of a tournament, runs them concurrently and keeps ratings up to date.
+    The whole state is persisted in <directory>/state.json after every finished match,
+    so an interrupted tournament continues with the unfinished matches only.
+    Full summaries are written next to the artifacts of each match, the state only keeps the results.
+
+    round_robin: every combination of player_count AIs plays once per round, seats rotate between rounds
+    gauntlet: the challenger plays every combination of the other AIs once per round
+    swiss: two-player only. Each round pairs AIs with similar points that have not met yet.
+    With an odd roster the lowest placed AI without a bye so far gets a bye worth one point
+    """
+    directory: Path
+    roster: dict
+    matches: List[dict]
+    results: Dict[str, dict]
+    finish_order: List[str]
+    on_result: Optional[Callable[[dict, JudgeSummary], None]]
+    cache: Optional[ResultCache]
+    force_rerun: bool
+    coordinator: Optional[Coordinator]
+    pipeline: Optional[PostGamePipeline]
+    results_store: Optional[ResultsStore]
+    cores: Optional[CorePool]
+    judger_options: dict
+    save_lock: Optional[asyncio.Lock]
+
+    def __init__(self, roster: dict, directory: Path):
+        self.directory = directory
+        self.on_result = None
+        self.cache = None
+        self.force_rerun = False
+        self.coordinator = None
+        self.pipeline = None
+        self.results_store = None
+        self.cores = None
+        self.judger_options = {}
+        self.state_path = directory / "state.json"
+        self.matches = []
+        self.results = {}
+        self.finish_order = []
+        if self.state_path.exists():
+            with self.state_path.open("r") as f:
+                state = json.load(f)
+            self.roster = state["roster"]
+            self.matches = state["matches"]
+            self.results = state["results"]
+            self.finish_order = state["finish_order"]
+            LOG.info("Resuming tournament with %d/%d finished matches", len(self.results), len(self.matches))
+        else:
+            self.roster = roster
+        self.names: List[str] = list(self.roster["ais"].keys())
+        self.format: str = self.roster.get("format", "round_robin")
+        self.rounds: int = self.roster.get("rounds", 1)
+        self.player_count: int = self.roster.get("player_count", 2)
+        if self.format not in FORMATS:
+            LOG.error("Unknown tournament format: %s", self.format)
+            raise JudgerIllegalState
+        if self.format == "swiss" and self.player_count != 2:
+            LOG.error("Swiss tournaments only support two-player games")
+            raise JudgerIllegalState
+        if len(self.names) < self.player_count:
+            LOG.error("The roster has %d AIs but a game needs %d", len(self.names), self.player_count)
+            raise JudgerIllegalState
+        self.save_lock = None
+
+    # Scheduling
+    def schedule_round(self, round: int) -> List[List[str]]:
+        if self.format == "round_robin":
+            groups = [list(c) for c in itertools.combinations(self.names, self.player_count)]
+        elif self.format == "gauntlet":
+            challenger = self.roster.get("challenger", self.names[0])
+            others = [name for name in self.names if name != challenger]
+            groups = [[challenger] + list(c) for c in itertools.combinations(others, self.player_count - 1)]
+        else:
+            return self.swiss_pairing()
+        # Rotate seats so every AI plays every seat over the rounds
+        shift = round % self.player_count
+        return [group[shift:] + group[:shift] for group in groups]
+
+    def swiss_pairing(self) -> List[List[str]]:
+        standings = self.standings()
+        games = [m for m in self.matches if not m.get("bye")]
+        met = {(m["players"][0], m["players"][1]) for m in games}
+        met |= {(b, a) for a, b in met}
+        order = sorted(self.names, key=lambda name: (-standings[name].points, -standings[name].rating, name))
+        pairs = []
+        if len(order) % 2 == 1:
+            had_bye = {m["players"][0] for m in self.matches if m.get("bye")}
+            bye = next((name for name in reversed(order) if name not in had_bye), order[-1])
+            order.remove(bye)
+            pairs.append([bye])
+        while len(order) > 1:
+            first = order.pop(0)
+            # The best placed opponent not met yet, or the next one if everybody was met
+            index = next((i for i, name in enumerate(order) if (first, name) not in met), 0)
+            second = order.pop(index)
+            seats = sum(1 for m in games if m["players"][0] == first) <= \
+                sum(1 for m in games if m["players"][0] == second)
+            pairs.append([first, second] if seats else [second, first])
+        return pairs
+
+    def match_spec(self, match: dict) -> MatchSpec:
+        limits = self.roster.get("limits")
+        return MatchSpec(
+            match_id=match["id"],
+            logic_path=self.roster["logic"],
+            player_count=self.player_count,
+            ai_commands=[self.roster["ais"][name] for name in match["players"]],
+            output=str(self.directory / "matches" / match["id"]),
+            config=self.roster.get("config", {}),
+            protocol_version=self.roster.get("protocol_version", 1),
+            limits=ResourceLimits(**limits) if limits is not None else None
+        )
+
+    # Results
+    def standings(self) -> Dict[str, Standing]:
+        """
+        Replays finished results in the order they arrived. Cheap enough to be recomputed when needed.
+        """
+        elo = EloRating(self.names)
+        standings = {name: Standing(name, elo.initial) for name in self.names}
+        matches = {m["id"]: m for m in self.matches}
+        for match_id in self.finish_order:
+            players = matches[match_id]["players"]
+            summary = self.results[match_id]
+            if matches[match_id].get("bye"):
+                standings[players[0]].points += 1
+                continue
+            for name in players:
+                standings[name].played += 1
+            if summary["final_state"] != JudgeState.GAME_OVER.name or len(summary["final_score"]) != len(players):
+                for name in players:
+                    standings[name].failures += 1
+                continue
+            scores = summary["final_score"]
+            elo.update(players, scores)
+            best = max(scores)
+            winners = [name for name, score in zip(players, scores) if score == best]
+            for name in players:
+                if name not in winners:
+                    standings[name].losses += 1
+                elif len(winners) == 1:
+                    standings[name].wins += 1
+                    standings[name].points += 1
+                else:
+                    standings[name].draws += 1
+                    standings[name].points += 1 / len(winners)
+        for name in self.names:
+            standings[name].rating = elo.ratings[name]
+        return standings
+
+    async def record(self, match: dict, summary: JudgeSummary) -> None:
+        summary_path = Path(self.match_spec(match).output) / "summary.json"
+        data = json.dumps(summary.to_dict())
+        await asyncio.get_running_loop().run_in_executor(None, summary_path.write_text, data)
+        self.results[match["id"]] = {
+            "final_state": summary.final_state.name,
+            "final_score": summary.final_score,
+            "total_round": summary.total_round,
+            "total_time": summary.total_time,
+            "placement": summary.placement
+        }
+        self.finish_order.append(match["id"])
+        await self.save()
+        if self.results_store is not None:
+            await self.results_store.add(MatchRecord(match["id"], match["players"], summary, str(self.directory),
+                                                     self.roster["logic"]))
+        LOG.info("Match %s %s finished: %s %s", match["id"], match["players"], summary.final_state.name,
+                 summary.final_score)
+        if self.on_result is not None:
+            self.on_result(match, summary)
+
+    async def save(self) -> None:
+        state = {
+            "roster": self.roster,
+            "matches": self.matches,
+            "results": self.results,
+            "finish_order": self.finish_order
+        }
+        data = json.dumps(state)
+        async with self.save_lock:
+            await asyncio.get_running_loop().run_in_executor(None, self.__write_state, data)
+
+    def __write_state(self, data: str) -> None:
+        tmp_path = self.state_path.with_suffix(".tmp")
+        with tmp_path.open("w") as f:
+            f.write(data)
+        os.replace(tmp_path, self.state_path)
+
+    # Execution
+    async def run(self, concurrency: Optional[int] = None) -> Dict[str, Standing]:
+        """
+        Matches run locally, or on worker nodes when a coordinator is set. Workers bring their own slots,
+        so with a coordinator concurrency only limits the matches waiting in its queue.
+        With cores, every local match is pinned to a core set of its own and waits until one is free.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Created on the running loop, before Python 3.10 a lock is bound to the loop current at its creation
+        self.save_lock = asyncio.Lock()
+        if self.coordinator is not None and self.cores is not None:
+            LOG.warning("Matches run on worker nodes are pinned by the workers, local cores are not used")
+            self.cores = None
+        try:
+            if self.coordinator is not None:
+                semaphore = asyncio.Semaphore(concurrency or 1024)
+                async with self.coordinator:
+                    await self.run_scheduled(self.coordinator, semaphore)
+            else:
+                semaphore = asyncio.Semaphore(concurrency or self.roster.get("concurrency", os.cpu_count() or 1))
+                async with JudgerRuntime(console=True) as runtime:
+                    await self.run_scheduled(runtime, semaphore)
+        finally:
+            # Also the results of an interrupted tournament, they are already in its state
+            if self.results_store is not None:
+                await self.results_store.flush()
+        return self.standings()
+
+    async def run_scheduled(self, runtime: Union[JudgerRuntime, Coordinator], semaphore: asyncio.Semaphore) -> None:
+        async def play(match: dict):
+            async with semaphore:
+                options = dict(self.judger_options)
+                if self.cores is not None:
+                    options["cpu_affinity"] = await self.cores.acquire()
+                LOG.info("Match %s %s started", match["id"], match["players"])
+                try:
+                    summary = await runtime.run(self.match_spec(match), self.cache, self.force_rerun, **options)
+                except Exception:
+                    # Not recorded, so the match runs again when the tournament is resumed
+                    LOG.exception("Match %s failed to run", match["id"])
+                    return
+                finally:
+                    if self.cores is not None:
+                        self.cores.release(options["cpu_affinity"])
+                await self.record(match, summary)
+            # Outside the semaphore, the next match need not wait for this output to be compressed
+            if self.pipeline is not None:
+                await self.pipeline.process(Path(self.match_spec(match).output), summary)
+
+        if self.format == "swiss":
+            # Pairings depend on the previous rounds, so rounds are only scheduled when reached
+            for round in range(self.rounds):
+                scheduled = await self.schedule(round)
+                await asyncio.gather(*(play(m) for m in scheduled if m["id"] not in self.results))
+        else:
+            scheduled = []
+            for round in range(self.rounds):
+                scheduled.extend(await self.schedule(round))
+            await asyncio.gather(*(play(m) for m in scheduled if m["id"] not in self.results))
+
+    async def schedule(self, round: int) -> List[dict]:
+        scheduled = [m for m in self.matches if m["round"] == round]
+        if len(scheduled) == 0:
+            for index, players in enumerate(self.schedule_round(round)):
+                if len(players) == 1:
+                    bye = {"id": f"r{round}-bye", "round": round, "players": players, "bye": True}
+                    self.matches.append(bye)
+                    self.results[bye["id"]] = {}
+                    self.finish_order.append(bye["id"])
+                    LOG.info("%s gets a bye in round %d", players[0], round)
+                else:
+                    scheduled.append({"id": f"r{round}-m{index}", "round": round, "players": players})
+            self.matches.extend(scheduled)
+            await self.save()
+        return [m for m in scheduled if not m.get("bye")]
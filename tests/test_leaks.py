@@ -0,0 +1,13 @@
+import asyncio
+import logging
+
+from core.logger import set_console_level
+from leak_check import check
+
+
+def test_repeated_games_leak_nothing(tmp_path):
+    """
+    Threads, logging handlers, loggers, descriptors and tasks stay flat over repeated games.
+    """
+    set_console_level(logging.WARNING)
+    assert asyncio.run(check(12, 3, tmp_path))
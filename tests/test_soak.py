@@ -0,0 +1,16 @@
+import argparse
+import asyncio
+import logging
+
+from core.logger import set_console_level
+from soak_check import soak
+
+
+def test_fuzzed_games_leak_nothing(tmp_path):
+    """
+    A short soak: misbehaving logic, AIs and TCP clients must neither break the judger nor leave tasks,
+    descriptors, threads or memory behind.
+    """
+    set_console_level(logging.CRITICAL)
+    args = argparse.Namespace(duration=0, games=8, concurrency=4, gameTimeout=4, memoryTolerance=1, seed=1)
+    assert asyncio.run(soak(args, tmp_path))